@@ -25,7 +25,11 @@ def run_pipe(cmds, input, timeout, name):
     """
     procs = []
     for cmd in cmds:
-        if "inline.py optimal" in cmd or "inline.py autotuner" in cmd:
+        if (
+            "inline.py optimal" in cmd
+            or "inline.py autotuner" in cmd
+            or "inline.py pgo" in cmd
+        ):
             cmd += " " + name
         last = len(procs) == len(cmds) - 1
         proc = subprocess.Popen(
@@ -0,0 +1,56 @@
+"""Measure how fast `bril2json` parses the benchmark suite.
+
+Compares the cached LALR parser against building a fresh Earley parser
+for every program, which is how `parse_bril` used to work. Run from the
+repository root:
+
+    $ python bril-txt/bench_parse.py [GLOB]
+"""
+
+import glob
+import sys
+import time
+
+import lark
+
+import briltxt
+
+
+def earley_parse(txt):
+    parser = lark.Lark(briltxt.GRAMMAR, maybe_placeholders=True)
+    return briltxt.JSONTransformer().transform(parser.parse(txt))
+
+
+def lalr_parse(txt):
+    return briltxt.get_parser().parse(txt)
+
+
+def measure(name, parse, texts):
+    start = time.perf_counter()
+    for txt in texts:
+        parse(txt)
+    elapsed = time.perf_counter() - start
+    size = sum(len(txt) for txt in texts)
+    print('{}: {:.2f} s, {:.0f} programs/s, {:.0f} KB/s'.format(
+        name, elapsed, len(texts) / elapsed, size / 1024 / elapsed,
+    ))
+
+
+if __name__ == '__main__':
+    pattern = sys.argv[1] if len(sys.argv) > 1 else 'benchmarks/**/*.bril'
+    texts = []
+    for path in sorted(glob.glob(pattern, recursive=True)):
+        with open(path) as f:
+            texts.append(f.read())
+    print('{} programs, {:.0f} KB'.format(
+        len(texts), sum(len(txt) for txt in texts) / 1024,
+    ))
+
+    start = time.perf_counter()
+    briltxt.get_parser()
+    print('building the LALR parser: {:.3f} s'.format(
+        time.perf_counter() - start,
+    ))
+
+    measure('fresh Earley parser per program', earley_parse, texts)
+    measure('cached LALR parser', lalr_parse, texts)
@@ -10,6 +10,7 @@ format and emits the ordinary JSON representation.
 import lark
 import sys
 import json
+import re
 
 __version__ = '0.0.1'
 
@@ -22,7 +23,7 @@ start: (struct | func)*
 struct: STRUCT IDENT "=" "{" mbr* "}"
 mbr: IDENT ":" type ";"
 
-func: FUNC ["(" arg_list? ")"] [tyann] "{" instr* "}"
+func: FUNC ["(" arg_list ")"] [tyann] "{" instr* "}"
 arg_list: | arg ("," arg)*
 arg: IDENT ":" type
 ?instr: const | vop | eop | label
@@ -230,19 +231,44 @@ class JSONTransformer(lark.Transformer):
         return value
 
 
-def parse_bril(txt, include_pos=False):
+_parsers = {}
+
+
+def get_parser(include_pos=False):
+    """Get the LALR parser for the text format, building it only once.
+
+    The transformer runs while parsing, so no parse tree is built. Lark
+    also caches the parse tables on disk, which makes later runs start
+    faster.
+    """
+    if include_pos not in _parsers:
+        _parsers[include_pos] = lark.Lark(
+            GRAMMAR,
+            parser='lalr',
+            transformer=JSONTransformer(include_pos),
+            maybe_placeholders=True,
+            cache=True,
+        )
+    return _parsers[include_pos]
+
+
+def parse_bril(txt, include_pos=False, compact=False):
     """Parse a Bril program and return a JSON string.
 
-    Optionally include source position information.
+    Optionally include source position information, and print the JSON
+    without indentation or spaces.
     """
-    parser = lark.Lark(GRAMMAR, maybe_placeholders=True)
-    tree = parser.parse(txt)
-    data = JSONTransformer(include_pos).transform(tree)
+    data = get_parser(include_pos).parse(txt)
+    if compact:
+        return json.dumps(data, separators=(',', ':'), sort_keys=True)
     return json.dumps(data, indent=2, sort_keys=True)
 
 
 # Text format pretty-printer.
 
+control_chars_reverse = {y: x for x, y in control_chars.items()}
+
+
 def type_to_str(type):
     if isinstance(type, dict):
         assert len(type) == 1
@@ -254,7 +280,6 @@ def type_to_str(type):
 
 def value_to_str(type, value):
     if not isinstance(type, dict) and type.lower() == "char":
-        control_chars_reverse = {y: x for x, y in control_chars.items()}
         if ord(value) in control_chars_reverse:
             value = control_chars_reverse[ord(value)]
         return "'{}'".format(value)
@@ -295,14 +320,6 @@ def instr_to_string(instr):
             return rhs
 
 
-def print_instr(instr):
-    print('  {};'.format(instr_to_string(instr)))
-
-
-def print_label(label):
-    print('.{}:'.format(label['label']))
-
-
 def args_to_string(args):
     if args:
         return '({})'.format(', '.join(
@@ -313,31 +330,159 @@ def args_to_string(args):
         return ''
 
 
-def print_func(func):
+def func_to_lines(func):
+    """Render a function as a list of lines, without line endings."""
     typ = func.get('type', 'void')
-    print('@{}{}{} {{'.format(
+    lines = ['@{}{}{} {{'.format(
         func['name'],
         args_to_string(func.get('args', [])),
         ': {}'.format(type_to_str(typ)) if typ != 'void' else '',
-    ))
-    for instr_or_label in func['instrs']:
-        if 'label' in instr_or_label:
-            print_label(instr_or_label)
+    )]
+    # Parameterized types are dicts, which can't be dict keys; render each
+    # distinct one once per function.
+    type_strs = {}
+    for instr in func['instrs']:
+        if 'label' in instr:
+            lines.append('.{}:'.format(instr['label']))
+            continue
+        typ = instr.get('type')
+        if isinstance(typ, dict):
+            key = repr(typ)
+            if key not in type_strs:
+                type_strs[key] = type_to_str(typ)
+            typ = type_strs[key]
+        if 'dest' in instr and instr['op'] != 'const':
+            rhs = instr['op']
+            if instr.get('funcs'):
+                rhs += ' @' + ' @'.join(instr['funcs'])
+            if instr.get('args'):
+                rhs += ' ' + ' '.join(instr['args'])
+            if instr.get('labels'):
+                rhs += ' .' + ' .'.join(instr['labels'])
+            if typ is None:
+                lines.append('  {} = {};'.format(instr['dest'], rhs))
+            else:
+                lines.append('  {}: {} = {};'.format(instr['dest'], typ, rhs))
         else:
-            print_instr(instr_or_label)
-    print('}')
+            lines.append('  {};'.format(instr_to_string(instr)))
+    lines.append('}')
+    return lines
+
+
+def write_funcs(funcs, out):
+    """Write functions to `out` as they arrive, one write per function."""
+    for func in funcs:
+        out.write('\n'.join(func_to_lines(func)))
+        out.write('\n')
+
+
+def print_instr(instr):
+    print('  {};'.format(instr_to_string(instr)))
+
+
+def print_label(label):
+    print('.{}:'.format(label['label']))
+
+
+def print_func(func):
+    write_funcs([func], sys.stdout)
 
 
 def print_prog(prog):
-    for func in prog['functions']:
-        print_func(func)
+    write_funcs(prog['functions'], sys.stdout)
+
+
+# Incremental JSON reader.
+
+_WS = re.compile(r'[ \t\n\r]*')
+
+
+class _StreamReader:
+    """Decode JSON values one at a time from a text stream."""
+
+    def __init__(self, stream, chunk_size=1 << 16):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size):
+        chunk = self.stream.read(size)
+        self.eof = not chunk
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+
+    def peek(self):
+        """Skip whitespace and return the next character ('' at EOF)."""
+        while True:
+            self.pos = _WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or self.eof:
+                return self.buf[self.pos:self.pos + 1]
+            self._fill(self.chunk_size)
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError('expected {!r} at offset {} of the JSON input'
+                             .format(char, self.pos))
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A number may continue in the next chunk.
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # Grow reads so a large value is not re-scanned too often.
+            self._fill(size)
+            size *= 2
+
+
+def iter_functions(stream):
+    """Yield the functions of a JSON Bril program from `stream` one at a
+    time, without holding the whole program in memory.
+    """
+    reader = _StreamReader(stream)
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+    while True:
+        key = reader.value()
+        reader.expect(':')
+        if key == 'functions':
+            reader.expect('[')
+            if reader.peek() != ']':
+                while True:
+                    yield reader.value()
+                    if reader.peek() != ',':
+                        break
+                    reader.pos += 1
+            reader.expect(']')
+        else:
+            reader.value()
+        if reader.peek() != ',':
+            break
+        reader.pos += 1
+    reader.expect('}')
 
 
 # Command-line entry points.
 
 def bril2json():
-    print(parse_bril(sys.stdin.read(), '-p' in sys.argv[1:]))
+    print(parse_bril(
+        sys.stdin.read(),
+        '-p' in sys.argv[1:],
+        '-c' in sys.argv[1:],
+    ))
 
 
 def bril2txt():
-    print_prog(json.load(sys.stdin))
+    write_funcs(iter_functions(sys.stdin), sys.stdout)
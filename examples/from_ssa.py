@@ -1,38 +1,208 @@
 import json
 import sys
+from collections import defaultdict
 
-from cfg import block_map, add_terminators, add_entry, reassemble
+from cfg import block_map, add_terminators, add_entry, reassemble, edges
 from form_blocks import form_blocks
+from df import use, gen
+from util import fresh
+
+
+def edge_copies(blocks):
+    """Remove all phi-nodes, returning the parallel copies they stand for.
+
+    The result maps each CFG edge `(pred, succ)` to a dict from
+    destination variables to the variable copied into them on that edge.
+    Also returns a map from phi destinations to their types.
+    """
+    copies = defaultdict(dict)
+    types = {}
+    for name, block in blocks.items():
+        for instr in block:
+            if instr.get('op') == 'phi':
+                types[instr['dest']] = instr['type']
+                for label, arg in zip(instr['labels'], instr['args']):
+                    if arg != '__undefined':
+                        copies[label, name][instr['dest']] = arg
+        block[:] = [i for i in block if i.get('op') != 'phi']
+    return copies, types
+
+
+def liveness(blocks, copies, preds, succs):
+    """Compute live-in and live-out sets for every block, treating the
+    copies on each edge as running between the two blocks.
+    """
+    live_in = {name: set() for name in blocks}
+    live_out = {name: set() for name in blocks}
+    worklist = list(blocks.keys())
+    while worklist:
+        name = worklist.pop()
+        out = set()
+        for succ in succs[name]:
+            copy = copies.get((name, succ), {})
+            out |= (live_in[succ] - copy.keys()) | set(copy.values())
+        live_out[name] = out
+        new_in = use(blocks[name]) | (out - gen(blocks[name]))
+        if new_in != live_in[name]:
+            live_in[name] = new_in
+            worklist += preds[name]
+    return live_in, live_out
+
+
+def interference(func, blocks, copies, live_in, live_out):
+    """Build an interference graph: two variables interfere when one is
+    assigned while the other is live (and holds a different value).
+    """
+    graph = defaultdict(set)
+
+    def add(a, b):
+        if a != b:
+            graph[a].add(b)
+            graph[b].add(a)
+
+    # Arguments are all assigned on entry.
+    args = {a['name'] for a in func.get('args', [])}
+    entry = next(iter(blocks))
+    for a in args:
+        for v in live_in[entry] | args:
+            add(a, v)
+
+    for name, block in blocks.items():
+        live = set(live_out[name])
+        for instr in reversed(block):
+            if 'dest' in instr:
+                src = instr['args'][0] if instr['op'] == 'id' else None
+                for v in live:
+                    if v != src:
+                        add(instr['dest'], v)
+                live.discard(instr['dest'])
+            live.update(instr.get('args', []))
+
+    for (_, succ), copy in copies.items():
+        for dest, src in copy.items():
+            for v in live_in[succ]:
+                # The source still holds the copied value afterward, unless
+                # this same parallel copy overwrites it.
+                if v != src or src in copy:
+                    add(dest, v)
+            for other in copy:
+                add(dest, other)
+
+    return graph
+
+
+def coalesce(func, copies, types, graph):
+    """Merge phi-related variables that do not interfere so the copies
+    between them vanish. Return a function mapping each variable to its
+    new name.
+    """
+    args = {a['name'] for a in func.get('args', [])}
+    parent = {}
+
+    def find(v):
+        while v in parent:
+            v = parent[v]
+        return v
+
+    for copy in copies.values():
+        for dest, src in copy.items():
+            a, b = find(dest), find(src)
+            if a == b or types.get(a) != types.get(b) or b in graph[a]:
+                continue
+            if a in args:
+                if b in args:
+                    continue
+                a, b = b, a  # Keep the argument's name.
+            parent[a] = b
+            for v in graph.pop(a, set()):
+                graph[v].discard(a)
+                graph[v].add(b)
+                graph[b].add(v)
+
+    return find
+
+
+def sequentialize(copy, types, names):
+    """Order a parallel copy as a list of `id` instructions.
+
+    A copy can go as soon as no other pending copy still reads its
+    destination. When none can, the rest are cycles (like a swap), so we
+    save one destination in a fresh temporary to break the cycle.
+    """
+    pending = {d: s for d, s in copy.items() if d != s}
+    out = []
+    while pending:
+        srcs = set(pending.values())
+        ready = [d for d in pending if d not in srcs]
+        if ready:
+            for d in ready:
+                out.append({'op': 'id', 'type': types[d],
+                            'args': [pending.pop(d)], 'dest': d})
+        else:
+            d = next(iter(pending))
+            tmp = fresh(d + '.tmp', names)
+            names.add(tmp)
+            out.append({'op': 'id', 'type': types[d], 'args': [d],
+                        'dest': tmp})
+            pending = {k: tmp if v == d else v for k, v in pending.items()}
+    return out
 
 
 def func_from_ssa(func):
     blocks = block_map(form_blocks(func['instrs']))
     add_entry(blocks)
     add_terminators(blocks)
+    preds, succs = edges(blocks)
+
+    copies, types = edge_copies(blocks)
+    if not copies:
+        func['instrs'] = reassemble(blocks)
+        return
 
-    # Replace each phi-node.
+    for a in func.get('args', []):
+        types[a['name']] = a['type']
     for block in blocks.values():
-        # Insert copies for each phi.
         for instr in block:
-            if instr.get('op') == 'phi':
-                dest = instr['dest']
-                type = instr['type']
-                for i, label in enumerate(instr['labels']):
-                    var = instr['args'][i]
-
-                    # Insert a copy in the predecessor block, before the
-                    # terminator.
-                    pred = blocks[label]
-                    pred.insert(-1, {
-                        'op': 'id',
-                        'type': type,
-                        'args': [var],
-                        'dest': dest,
-                    })
-
-        # Remove all phis.
-        new_block = [i for i in block if i.get('op') != 'phi']
-        block[:] = new_block
+            if 'dest' in instr:
+                types[instr['dest']] = instr['type']
+
+    live_in, live_out = liveness(blocks, copies, preds, succs)
+    graph = interference(func, blocks, copies, live_in, live_out)
+    find = coalesce(func, copies, types, graph)
+
+    # Rename every variable to the representative of its class.
+    for block in blocks.values():
+        for instr in block:
+            if 'args' in instr:
+                instr['args'] = [find(a) for a in instr['args']]
+            if 'dest' in instr:
+                instr['dest'] = find(instr['dest'])
+
+    # Place the remaining copies. When the predecessor has only one
+    # successor, or the successor has only one predecessor, the copies fit
+    # in an existing block; otherwise the edge is critical and we split it.
+    names = set(types) | set(blocks)
+    new_blocks = []
+    for (pred, succ), copy in copies.items():
+        if pred not in blocks:
+            continue
+        copy = {find(d): find(s) for d, s in copy.items() if d in live_in[succ]}
+        instrs = sequentialize(copy, types, names)
+        if not instrs:
+            continue
+        if len(succs[pred]) == 1:
+            blocks[pred][-1:-1] = instrs
+        elif len(preds[succ]) == 1:
+            blocks[succ][0:0] = instrs
+        else:
+            name = fresh(pred + '.split', names)
+            names.add(name)
+            term = blocks[pred][-1]
+            term['labels'] = [name if l == succ else l for l in term['labels']]
+            new_blocks.append((name, instrs + [{'op': 'jmp', 'labels': [succ]}]))
+
+    for name, block in new_blocks:
+        blocks[name] = block
 
     func['instrs'] = reassemble(blocks)
 
@@ -1,7 +1,12 @@
+import glob
 import json
+import os
+import re
 import subprocess
 import sys
-from typing import Dict
+from typing import Dict, List
+
+ARGS = re.compile(r"#\s*ARGS:(.*)")  # also `#ARGS:`, as in lcm.bril
 
 
 def run_pipeline(input):
@@ -65,6 +70,40 @@ def count_executed_instructions(prog: Dict) -> int:
         return 0
 
 
+def read_bril_programs(path: str) -> List[Dict]:
+    progs = []
+    for bril_file in glob.glob(os.path.join(path, "**/*.bril"), recursive=True):
+        try:
+            # Read the file and look for ARGS in any line
+            with open(bril_file) as f:
+                lines = f.readlines()
+                args = ""
+                for line in lines:
+                    match = ARGS.match(line.strip())
+                    if match:
+                        args = match.group(1).strip()
+                        break
+
+                input = "".join(lines)
+
+            # Run bril2json on the .bril file and capture its output
+            result = subprocess.run(
+                ["bril2json"],
+                input=input,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            # Parse the JSON output
+            bril_data = json.loads(result.stdout)
+            bril_data["args"] = args.split()
+            bril_data["name"] = os.path.basename(bril_file)
+            progs.append(bril_data)
+        except (subprocess.CalledProcessError, json.JSONDecodeError) as e:
+            print(f"Warning: Skipping {bril_file} - {str(e)}")
+    return progs
+
+
 if __name__ == "__main__":
     prog = json.load(sys.stdin)
     size = count_program_size(prog)
@@ -3,6 +3,7 @@ import json
 import sys
 from utils.legacy.dataflow import forward_df
 from utils.legacy.form_blocks import form_blocks
+from utils.profiling import pass_span, span
 
 
 def meet(pred_outs):
@@ -68,7 +69,10 @@ def constant_propagation(fn):
                 if all_args_constant:
                     # Fold constants
                     const_args = [instr["state"][arg] for arg in instr["args"]]
-                    if instr["op"] in ["add", "sub", "mul", "div"]:
+                    if instr["op"] == "div" and const_args[1] == 0:
+                        # leave the division to fail at run time, if it runs
+                        pass
+                    elif instr["op"] in ["add", "sub", "mul", "div"]:
                         a, b = const_args[0], const_args[1]
                         if instr["op"] == "add":
                             result = a + b
@@ -77,7 +81,10 @@ def constant_propagation(fn):
                         elif instr["op"] == "mul":
                             result = a * b
                         elif instr["op"] == "div":
-                            result = a // b
+                            # Bril rounds toward zero, Python's // down
+                            result = abs(a) // abs(b)
+                            if (a < 0) != (b < 0):
+                                result = -result
                         instr["op"] = "const"
                         instr["value"] = result
                         del instr["args"]
@@ -126,15 +133,30 @@ def constant_propagation(fn):
     fn["instrs"] = [instr for block in blocks for instr in block["instrs"]]
 
 
+def analyze_constants(fn):
+    # parameters are unknown on entry, not undefined, so a parameter that
+    # is reassigned on one path doesn't look constant after the paths meet
+    params = {arg["name"]: "?" for arg in fn.get("args", [])}
+    forward_df(fn, f, meet, initial_value=params)
+
+
+def propagate_constants(fn):
+    # fold until nothing changes, as folding a branch can make more constant
+    analyze_constants(fn)
+    constant_propagation(fn)
+    while True:
+        old_fn = copy.deepcopy(fn)
+        analyze_constants(fn)
+        constant_propagation(fn)
+        if fn == old_fn:
+            break
+
+
 if __name__ == "__main__":
-    prog = json.load(sys.stdin)
+    with span("read json"):
+        prog = json.load(sys.stdin)
     for fn in prog["functions"]:
-        forward_df(fn, f, meet)
-        constant_propagation(fn)
-        while True:
-            old_fn = copy.deepcopy(fn)
-            forward_df(fn, f, meet)
-            constant_propagation(fn)
-            if fn == old_fn:
-                break
-    json.dump(prog, sys.stdout, indent=2)
+        with pass_span("constant", fn):
+            propagate_constants(fn)
+    with span("write json"):
+        json.dump(prog, sys.stdout, indent=2)
@@ -0,0 +1,130 @@
+import json
+import sys
+from typing import Dict, List, Set, Tuple
+from utils.profiling import span
+
+
+def find_needed_variables(
+    fn: Dict, live_params: Dict[str, List[bool]], live_returns: Set[str]
+) -> Set[str]:
+    """
+    Variables of fn whose values can reach a side effect, without looking
+    at control flow. An instruction with a dest other than a call is pure,
+    so its arguments are needed only if its dest is. Everything else needs
+    its arguments, except that a call needs only those its callee reads
+    and a ret needs its value only if some caller uses it.
+    """
+    needed = set()
+    readers = {}  # dest -> arguments of the pure instructions defining it
+    for instr in fn["instrs"]:
+        args = instr.get("args", [])
+        op = instr.get("op")
+        if op == "call":
+            callee = instr["funcs"][0]
+            if callee in live_params:
+                args = [arg for arg, live in zip(args, live_params[callee]) if live]
+            needed.update(args)
+        elif op == "ret":
+            if fn["name"] in live_returns:
+                needed.update(args)
+        elif "dest" in instr:
+            readers.setdefault(instr["dest"], []).extend(args)
+        else:
+            needed.update(args)
+
+    worklist = list(needed)
+    while worklist:
+        var = worklist.pop()
+        for arg in readers.pop(var, []):
+            if arg not in needed:
+                needed.add(arg)
+                worklist.append(arg)
+    return needed
+
+
+def find_dead_args(
+    prog: Dict,
+) -> Tuple[Dict[str, List[bool]], Set[str], Dict[str, Set[str]]]:
+    """
+    Which parameters each function reads and which functions have their
+    return values used, as the least fixpoint: everything starts dead, so
+    a recursive function that only passes a parameter on to itself, or
+    only returns what its recursive call returned, does not keep it alive.
+    main keeps its signature. Also returns the needed variables of every
+    function at the fixpoint.
+    """
+    functions = {fn["name"]: fn for fn in prog["functions"]}
+    live_params = {
+        name: [name == "main"] * len(fn.get("args", []))
+        for name, fn in functions.items()
+    }
+    live_returns = {"main"}
+
+    while True:
+        needed = {
+            name: find_needed_variables(fn, live_params, live_returns)
+            for name, fn in functions.items()
+        }
+        changed = False
+        for name, fn in functions.items():
+            for i, arg in enumerate(fn.get("args", [])):
+                if not live_params[name][i] and arg["name"] in needed[name]:
+                    live_params[name][i] = True
+                    changed = True
+            for instr in fn["instrs"]:
+                if instr.get("op") != "call" or "dest" not in instr:
+                    continue
+                callee = instr["funcs"][0]
+                if callee not in live_returns and instr["dest"] in needed[name]:
+                    live_returns.add(callee)
+                    changed = True
+        if not changed:
+            return live_params, live_returns, needed
+
+
+def dead_argument_elimination(prog: Dict) -> Dict:
+    live_params, live_returns, needed = find_dead_args(prog)
+    names = {fn["name"] for fn in prog["functions"]}
+
+    for fn in prog["functions"]:
+        name = fn["name"]
+        if "args" in fn:
+            fn["args"] = [
+                arg for arg, live in zip(fn["args"], live_params[name]) if live
+            ]
+        if name not in live_returns:
+            fn.pop("type", None)
+
+        instrs = []
+        for instr in fn["instrs"]:
+            op = instr.get("op")
+            if op == "call":
+                callee = instr["funcs"][0]
+                if callee in live_params:
+                    instr["args"] = [
+                        arg
+                        for arg, live in zip(instr.get("args", []), live_params[callee])
+                        if live
+                    ]
+                if callee in names and callee not in live_returns:
+                    instr.pop("dest", None)
+                    instr.pop("type", None)
+            elif op == "ret":
+                if name not in live_returns:
+                    instr.pop("args", None)
+            elif "dest" in instr and instr["dest"] not in needed[name]:
+                # a pure computation only feeding dropped arguments or values
+                continue
+            instrs.append(instr)
+        fn["instrs"] = instrs
+
+    return prog
+
+
+if __name__ == "__main__":
+    with span("read json"):
+        prog = json.load(sys.stdin)
+    with span("dead argument elimination"):
+        prog = dead_argument_elimination(prog)
+    with span("write json"):
+        print(json.dumps(prog, indent=2))
@@ -5,7 +5,8 @@ import json
 
 from benchmark import count_executed_instructions, count_program_size, run_pipeline
 from generate_optimal_configs import read_bril_programs
-from utils.inline.graph import find_recursive_functions, form_call_graph
+from utils.inline.cost_model import get_cost_model, rank_edges
+from utils.inline.graph import get_call_graph
 from inline import inline
 
 
@@ -13,16 +14,18 @@ def autotuner(
     prog: Dict,
     measure_fn,
     initial_config=None,
+    top_k=None,
+    metric="size",
 ) -> Dict:
-    _, edges = form_call_graph(prog)
-    recursive = find_recursive_functions(edges)
+    """
+    With top_k, only the k edges the cost model predicts to help `metric`
+    ("size" or "dyn") most are measured; the rest keep their initial
+    setting.
+    """
+    graph = get_call_graph(prog)
 
     if initial_config == None:
-        initial_config = {
-            edge: False
-            for edge in edges
-            if edge[0] not in recursive or edge[1] not in recursive
-        }
+        initial_config = {edge: False for edge in graph.inlinable_edges()}
     initial_value = measure_fn(
         run_pipeline(json.dumps(inline(deepcopy(prog), initial_config)))
     )
@@ -30,9 +33,15 @@ def autotuner(
     print(f"Initial value: {initial_value}")
 
     best_config = {}
-    for edge in edges:
-        if edge[0] in recursive and edge[1] in recursive:
-            continue
+    candidates = graph.inlinable_edges()
+    if top_k is not None:
+        model = get_cost_model(deepcopy(prog))
+        candidates = rank_edges(model, candidates, metric)
+        for edge in candidates[top_k:]:
+            best_config[edge] = initial_config.get(edge, False)
+        candidates = candidates[:top_k]
+
+    for edge in candidates:
 
         config = deepcopy(initial_config)
         config[edge] = True
@@ -51,6 +60,9 @@ def autotuner(
 if __name__ == "__main__":
     # Add CSV header
     total_round = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    # with TOP_K, each round measures only the edges the cost model ranks
+    # in the top k
+    top_k = int(sys.argv[2]) if len(sys.argv) > 2 else None
     csv_file = "utils/inline/autotuner_configs.csv"
     with open(csv_file, "w") as f:
         f.write(
@@ -67,12 +79,18 @@ if __name__ == "__main__":
                 print(f"Round {round} of {total_round}")
                 prog = deepcopy(raw_prog)
                 best_program_size_config = autotuner(
-                    prog, count_program_size, current_best_program_size_config
+                    prog,
+                    count_program_size,
+                    current_best_program_size_config,
+                    top_k,
+                    "size",
                 )
                 best_executed_instr_count_config = autotuner(
                     prog,
                     count_executed_instructions,
                     current_best_executed_instr_count_config,
+                    top_k,
+                    "dyn",
                 )
                 best_program_size = count_program_size(
                     run_pipeline(json.dumps(inline(prog, best_program_size_config)))
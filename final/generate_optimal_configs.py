@@ -1,62 +1,26 @@
 from copy import deepcopy
+import sys
 import time
 from typing import Dict, List
 import json
-import glob
-import os
-import subprocess
 from tqdm import tqdm
 
-from benchmark import count_executed_instructions, count_program_size, run_pipeline
-from utils.inline.graph import find_recursive_functions, form_call_graph
+from benchmark import (
+    count_executed_instructions,
+    count_program_size,
+    read_bril_programs,
+    run_pipeline,
+)
+from utils.inline.cost_model import get_cost_model, rank_configs
+from utils.inline.graph import get_call_graph
 from inline import inline
 
 
-def read_bril_programs(path: str) -> List[Dict]:
-    progs = []
-    for bril_file in glob.glob(os.path.join(path, "**/*.bril"), recursive=True):
-        try:
-            # Read the file and look for ARGS in any line
-            with open(bril_file) as f:
-                lines = f.readlines()
-                args = ""
-                for line in lines:
-                    if line.strip().startswith("# ARGS:"):
-                        args = line.replace("# ARGS:", "").strip()
-                        break
-
-                input = "".join(lines)
-
-            # Run bril2json on the .bril file and capture its output
-            result = subprocess.run(
-                ["bril2json"],
-                input=input,
-                capture_output=True,
-                text=True,
-                check=True,
-            )
-            # Parse the JSON output
-            bril_data = json.loads(result.stdout)
-            bril_data["args"] = args.split()
-            bril_data["name"] = os.path.basename(bril_file)
-            progs.append(bril_data)
-        except (subprocess.CalledProcessError, json.JSONDecodeError) as e:
-            print(f"Warning: Skipping {bril_file} - {str(e)}")
-    return progs
-
-
 def generate_all_possible_configs(prog: Dict) -> List[Dict]:
-    _, edges = form_call_graph(prog)
-
-    # Find recursive functions
-    recursive = find_recursive_functions(edges)
+    graph = get_call_graph(prog)
 
     # Filter out recursive edges
-    non_recursive_edges = [
-        (src, dest)
-        for src, dest in edges
-        if src not in recursive or dest not in recursive
-    ]
+    non_recursive_edges = graph.inlinable_edges()
 
     # Safety check - limit maximum edges to prevent memory issues
     MAX_EDGES = 12
@@ -83,9 +47,9 @@ def generate_all_possible_configs(prog: Dict) -> List[Dict]:
             config[(caller, callee)] = binary[edge_idx] == "1"
 
         # Add recursive edges as False
-        for src, dest in edges:
-            if src in recursive and dest in recursive:
-                config[(src, dest)] = False
+        for edge in graph.edges:
+            if graph.is_recursive_edge(edge):
+                config[edge] = False
 
         configs.append(config)
 
@@ -93,6 +57,10 @@ def generate_all_possible_configs(prog: Dict) -> List[Dict]:
 
 
 if __name__ == "__main__":
+    # With TOP_K, only the configs the cost model ranks in the top k for
+    # program size or for executed instructions are measured
+    top_k = int(sys.argv[1]) if len(sys.argv) > 1 else None
+
     # Add CSV header
     csv_file = "utils/inline/optimal_configs.csv"
     with open(csv_file, "w") as f:
@@ -105,6 +73,13 @@ if __name__ == "__main__":
         try:
             time_start = time.time()
             configs = generate_all_possible_configs(raw_prog)
+            if top_k is not None:
+                model = get_cost_model(deepcopy(raw_prog))
+                candidates = rank_configs(model, configs, "size")[:top_k]
+                for config in rank_configs(model, configs, "dyn")[:top_k]:
+                    if config not in candidates:
+                        candidates.append(config)
+                configs = candidates
             print(f"Program: {raw_prog['name']}")
             best_program_size = float("inf")
             best_program_size_config = None
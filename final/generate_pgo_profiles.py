@@ -0,0 +1,19 @@
+from benchmark import read_bril_programs
+from utils.inline.pgo import collect_profile, write_profile
+
+
+if __name__ == "__main__":
+    # Profile every benchmark with its ARGS for `python inline.py pgo`
+    progs = read_bril_programs("../benchmarks")
+    for prog in progs:
+        try:
+            profile = collect_profile(prog)
+            write_profile(profile)
+            hottest = max((call["count"] for call in profile["calls"]), default=0)
+            print(
+                f"{prog['name']}: {len(profile['calls'])} call sites, "
+                f"hottest ran {hottest} times"
+            )
+        except Exception as e:
+            print(f"{prog['name']}: Error: {e}")
+            print("Skipping")
@@ -1,14 +1,15 @@
 import json
 import sys
 from typing import Dict, Set
-from utils.inline.graph import form_call_graph
+from utils.inline.graph import get_call_graph
+from utils.profiling import span
 
 
 def find_reachable_functions(prog: Dict) -> Set[str]:
     """
     Identifies all functions reachable from the main function using DFS.
     """
-    nodes, _ = form_call_graph(prog)
+    nodes = get_call_graph(prog).nodes
 
     # Start from main function
     reachable = set()
@@ -36,6 +37,9 @@ def idce(prog: Dict) -> Dict:
 
 
 if __name__ == "__main__":
-    prog = json.load(sys.stdin)
-    prog = idce(prog)
-    print(json.dumps(prog, indent=2))
+    with span("read json"):
+        prog = json.load(sys.stdin)
+    with span("idce"):
+        prog = idce(prog)
+    with span("write json"):
+        print(json.dumps(prog, indent=2))
@@ -1,6 +1,6 @@
 import json
+import re
 import sys
-import uuid
 
 from utils.inline.arg_constantness import get_arg_constantness_inline_config
 from utils.inline.single_call_site import get_single_call_site_inline_config
@@ -15,6 +15,9 @@ from utils.inline.autotuner import (
     get_autotuner_instruction_count_inline_config,
     get_autotuner_program_size_inline_config,
 )
+from utils.inline.pgo import get_pgo_inline_config
+from utils.inline.graph import get_call_graph
+from utils.profiling import span
 
 get_inline_config = {
     "all": get_all_inline_config,
@@ -26,13 +29,160 @@ get_inline_config = {
     "in_loop": get_in_loop_inline_config,
     "single_call_site": get_single_call_site_inline_config,
     "arg_constantness": get_arg_constantness_inline_config,
+    "pgo": get_pgo_inline_config,
 }
 
 
+SUFFIX = re.compile(r"_in(\d+)$")
+
+
+def first_free_suffix(prog: dict) -> int:
+    """
+    The first counter value whose `_in<n>` suffix no name in the program
+    ends with, so inlining an already inlined program can't clash.
+    """
+    last = -1
+    for fn in prog["functions"]:
+        names = [arg["name"] for arg in fn.get("args", [])]
+        for instr in fn["instrs"]:
+            if "label" in instr:
+                names.append(instr["label"])
+            names.extend(instr.get("labels", []))
+            if "dest" in instr:
+                names.append(instr["dest"])
+        for name in names:
+            match = SUFFIX.search(name)
+            if match:
+                last = max(last, int(match.group(1)))
+    return last + 1
+
+
+def make_template(callee: dict) -> dict:
+    """
+    Analyze a callee once for all of its call sites.
+
+    Returns:
+        A dictionary with:
+            - params: The parameter names, in order
+            - param_types: Parameter name -> type
+            - modified_params: Parameters the callee assigns to
+            - return_count: Number of `ret` instructions
+            - jumps_to_done: Whether a `ret` has to jump past the rest of
+              the body, i.e. there are several or one that isn't last
+            - body: (instruction, variable names, label names) per
+              instruction; the names are the ones to rename, parameters
+              are renamed to the call's arguments and every other
+              variable to a fresh local
+    """
+    params = [param["name"] for param in callee.get("args", [])]
+    body = []
+    return_count = 0
+    modified_params = set()
+    for instr in callee["instrs"]:
+        if "op" not in instr:
+            body.append((instr, [], [instr["label"]]))
+            continue
+        if instr["op"] == "ret":
+            return_count += 1
+        if instr.get("dest") in params:
+            modified_params.add(instr["dest"])
+        names = instr.get("args", [])
+        if "dest" in instr:
+            names = names + [instr["dest"]]
+        body.append((instr, names, instr.get("labels", [])))
+    jumps_to_done = return_count > 1 or (
+        return_count == 1 and callee["instrs"][-1].get("op") != "ret"
+    )
+    return {
+        "params": params,
+        "param_types": {
+            param["name"]: param.get("type") for param in callee.get("args", [])
+        },
+        "modified_params": modified_params,
+        "return_count": return_count,
+        "jumps_to_done": jumps_to_done,
+        "body": body,
+    }
+
+
+def instantiate(template: dict, call: dict, suffix: str) -> list:
+    """
+    Copy a callee's template in place of one call instruction.
+
+    Returns:
+        The instructions replacing the call.
+    """
+    new_instrs = []
+    var_map = {}
+
+    # Map arguments to parameters, creating copies only for modified parameters
+    for arg, param in zip(call.get("args", []), template["params"]):
+        if param in template["modified_params"]:
+            arg_copy = f"inline_{param}_{suffix}"
+            new_instrs.append(
+                {
+                    "op": "id",
+                    "dest": arg_copy,
+                    "type": template["param_types"][param],
+                    "args": [arg],
+                }
+            )
+            var_map[param] = arg_copy
+        else:
+            var_map[param] = arg
+
+    def rename(name):
+        if name not in var_map:
+            var_map[name] = f"inline_{name}_{suffix}"
+        return var_map[name]
+
+    jumps_to_done = template["jumps_to_done"]
+    done_label = f"inline_done_{suffix}"
+
+    for instr, names, labels in template["body"]:
+        for name in names:
+            rename(name)
+
+        if "op" not in instr:
+            new_instrs.append({"label": f"{labels[0]}_{suffix}"})
+            continue
+
+        if instr["op"] == "ret":
+            if "args" in instr and "dest" in call:
+                new_instrs.append(
+                    {
+                        "op": "id",
+                        "dest": call["dest"],
+                        "type": call["type"],
+                        "args": [var_map[instr["args"][0]]],
+                    }
+                )
+            if jumps_to_done:
+                new_instrs.append({"op": "jmp", "labels": [done_label]})
+            continue
+
+        new_instr = instr.copy()
+        if "labels" in instr:
+            new_instr["labels"] = [f"{label}_{suffix}" for label in labels]
+        if "dest" in instr:
+            new_instr["dest"] = var_map[instr["dest"]]
+        if "args" in instr:
+            new_instr["args"] = [var_map[arg] for arg in instr["args"]]
+        new_instrs.append(new_instr)
+
+    if jumps_to_done:
+        new_instrs.append({"label": done_label})
+    return new_instrs
+
+
 def inline(prog: dict, config: dict[tuple[str, str], bool]):
     """
     Inline the program using the given configuration.
 
+    Functions are processed in program order, so a callee that comes
+    earlier is inlined with the calls in it already inlined. Inlined names
+    get `_in<n>` suffixes from a counter, so the output is deterministic.
+
     Args:
         prog: The program to inline.
         config: The configuration to use for inlining. A dictionary where:
@@ -42,156 +192,147 @@ def inline(prog: dict, config: dict[tuple[str, str], bool]):
     Returns:
         The inlined program.
     """
-    # Process each function in the program
+    fns = {fn["name"]: fn for fn in prog["functions"]}
+    templates = {}
+    counter = first_free_suffix(prog)
+
     for fn in prog["functions"]:
         new_instrs = []
+        changed = False
 
-        for i in range(len(fn["instrs"])):
-            instr = fn["instrs"][i]
-
-            # Handle non-call instructions
-            if "op" not in instr or instr["op"] != "call":
+        for instr in fn["instrs"]:
+            if instr.get("op") != "call":
                 new_instrs.append(instr)
                 continue
 
-            # Get the called function name
             callee_name = instr["funcs"][0]
-
-            # Check if this call should be inlined based on config
-            should_inline = config.get((fn["name"], callee_name), False)
-
-            if not should_inline:
+            if not config.get((fn["name"], callee_name), False) or (
+                callee_name not in fns
+            ):
                 new_instrs.append(instr)
                 continue
 
-            # Find the called function
-            callee = None
-            for func in prog["functions"]:
-                if func["name"] == callee_name:
-                    callee = func
-                    break
+            if callee_name not in templates:
+                templates[callee_name] = make_template(fns[callee_name])
+            new_instrs.extend(
+                instantiate(templates[callee_name], instr, f"in{counter}")
+            )
+            counter += 1
+            changed = True
 
-            if not callee:
-                new_instrs.append(instr)
-                continue
+        if changed:
+            fn["instrs"] = new_instrs
+            # later callers inline the new body
+            templates.pop(fn["name"], None)
 
-            # Check if function has multiple returns
-            has_multiple_returns = False
-            return_count = 0
-            for callee_instr in callee["instrs"]:
-                if "op" in callee_instr and callee_instr["op"] == "ret":
-                    return_count += 1
-                    if return_count > 1:
-                        has_multiple_returns = True
-                        break
-
-            # Create unique suffix for this inline instance
-            inline_suffix = str(uuid.uuid4())[:8]
-            var_map = {}
-
-            # Add done label only if multiple returns
-            done_label = None
-            if has_multiple_returns:
-                done_label = f"inline_done_{inline_suffix}"
-
-            # Find parameters that get modified in the callee
-            modified_params = set()
-            for callee_instr in callee["instrs"]:
-                if "dest" in callee_instr:
-                    for param in callee.get("args", []):
-                        if callee_instr["dest"] == param["name"]:
-                            modified_params.add(param["name"])
-
-            # Map arguments to parameters, creating copies only for modified parameters
-            if "args" in instr:
-                for arg, param in zip(instr["args"], callee.get("args", [])):
-                    if param["name"] in modified_params:
-                        # Create a copy only if the parameter gets modified
-                        arg_copy = f"{arg}_{inline_suffix}"
-                        new_instrs.append(
-                            {
-                                "op": "id",
-                                "dest": arg_copy,
-                                "type": param.get("type"),
-                                "args": [arg],
-                            }
-                        )
-                        var_map[param["name"]] = arg_copy
-                    else:
-                        # Use the original argument directly if it's not modified
-                        var_map[param["name"]] = arg
-
-            # Inline the function body
-            for callee_instr in callee["instrs"]:
-                if "op" not in callee_instr:
-                    new_label = {"label": f"{callee_instr['label']}_{inline_suffix}"}
-                    new_instrs.append(new_label)
-                    continue
+    return prog
+
+
+def inline_bottom_up(
+    prog: dict,
+    config: dict[tuple[str, str], bool],
+    caller_growth: float = 32.0,
+    program_growth: float = 8.0,
+):
+    """
+    Inline the program bottom-up over the call graph's SCCs, so a callee
+    is inlined with its own inlinable calls already inlined and whole call
+    chains collapse in one pass. Calls within an SCC are left alone.
 
-                # Create a copy of the instruction
-                new_instr = callee_instr.copy()
-
-                # Update label references in instructions
-                if "labels" in new_instr:
-                    new_instr["labels"] = [
-                        f"{label}_{inline_suffix}" for label in new_instr["labels"]
-                    ]
-
-                # Remap variable names with random suffix
-                if "dest" in new_instr:
-                    if new_instr["dest"] not in var_map:
-                        var_map[new_instr["dest"]] = (
-                            f"inline_{new_instr['dest']}_{inline_suffix}"
-                        )
-                    new_instr["dest"] = var_map[new_instr["dest"]]
-
-                if "args" in new_instr:
-                    new_instr["args"] = [
-                        var_map.get(arg, arg) for arg in new_instr["args"]
-                    ]
-
-                # Handle return value
-                if new_instr["op"] == "ret":
-                    if "args" in new_instr and "dest" in instr:
-                        ret_val = new_instr["args"][0]
-                        new_instrs.append(
-                            {
-                                "op": "id",
-                                "dest": instr["dest"],
-                                "type": instr["type"],
-                                "args": [var_map.get(ret_val, ret_val)],
-                            }
-                        )
-
-                    # Add jump if there are multiple returns
-                    if has_multiple_returns:
-                        new_instrs.append(
-                            {
-                                "op": "jmp",
-                                "labels": [done_label],
-                            }
-                        )
+    A call is only inlined while the caller stays within `caller_growth`
+    times its original size and the program within `program_growth` times
+    its original size.
+
+    Args:
+        prog: The program to inline.
+        config: Which (caller, callee) calls to inline, as for `inline`.
+        caller_growth: Size budget of each caller, relative to its size.
+        program_growth: Size budget of the program, relative to its size.
+
+    Returns:
+        The inlined program.
+    """
+    fns = {fn["name"]: fn for fn in prog["functions"]}
+    graph = get_call_graph(prog)
+    templates = {}
+    counter = first_free_suffix(prog)
+    program_size = sum(len(fn["instrs"]) for fn in prog["functions"])
+    program_budget = program_growth * program_size
+
+    for scc in graph.sccs:
+        for name in scc:
+            fn = fns[name]
+            size = len(fn["instrs"])
+            caller_budget = caller_growth * size
+            new_instrs = []
+
+            for instr in fn["instrs"]:
+                callee_name = instr["funcs"][0] if instr.get("op") == "call" else None
+                if (
+                    callee_name is None
+                    or callee_name in scc
+                    or callee_name not in fns
+                    or not config.get((name, callee_name), False)
+                ):
+                    new_instrs.append(instr)
                     continue
 
-                new_instrs.append(new_instr)
+                # callees come earlier in SCC order, so their bodies are final
+                if callee_name not in templates:
+                    templates[callee_name] = make_template(fns[callee_name])
+                inlined = instantiate(templates[callee_name], instr, f"in{counter}")
+                growth = len(inlined) - 1
+                if (
+                    size + growth > caller_budget
+                    or program_size + growth > program_budget
+                ):
+                    new_instrs.append(instr)
+                    continue
 
-            # Add the done label after inlined instructions if needed
-            if has_multiple_returns:
-                new_instrs.append({"label": done_label})
+                new_instrs.extend(inlined)
+                counter += 1
+                size += growth
+                program_size += growth
 
-        fn["instrs"] = new_instrs
+            fn["instrs"] = new_instrs
 
     return prog
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2 or sys.argv[1] not in get_inline_config:
-        print(f"Usage: {sys.argv[0]} <strategy>")
+    # --bottom-up inlines transitively; --caller-growth=X and
+    # --program-growth=X set its size budgets
+    options = {}
+    args = []
+    for arg in sys.argv[1:]:
+        if arg.startswith("--"):
+            key, _, value = arg[2:].partition("=")
+            options[key.replace("-", "_")] = value
+        else:
+            args.append(arg)
+
+    if len(args) < 1 or args[0] not in get_inline_config:
+        print(
+            f"Usage: {sys.argv[0]} <strategy> [--bottom-up] "
+            "[--caller-growth=X] [--program-growth=X]"
+        )
         print(f"Available strategies: {', '.join(get_inline_config.keys())}")
         sys.exit(1)
 
-    strategy = sys.argv[1]
-    prog = json.load(sys.stdin)
-    config = get_inline_config[strategy](prog, *sys.argv[2:])
-    prog = inline(prog, config)
-    print(json.dumps(prog, indent=2))
+    strategy = args[0]
+    with span("read json"):
+        prog = json.load(sys.stdin)
+    with span("inline config", strategy=strategy):
+        config = get_inline_config[strategy](prog, *args[1:])
+    with span("inline"):
+        if "bottom_up" in options:
+            budgets = {
+                key: float(value)
+                for key, value in options.items()
+                if key in ("caller_growth", "program_growth")
+            }
+            prog = inline_bottom_up(prog, config, **budgets)
+        else:
+            prog = inline(prog, config)
+    with span("write json"):
+        print(json.dumps(prog, indent=2))
@@ -1,53 +1,45 @@
 import json
 import sys
-from utils.legacy.dataflow import backward_df
-from utils.legacy.form_blocks import form_blocks
-from utils.legacy.instr import get_args_set, get_dest
-
-
-def meet(succ_ins):
-    if len(succ_ins) == 0:
-        return set()
-    return succ_ins[0].union(*succ_ins[1:])
+from utils.ir import backward, form_blocks, from_json, to_json
+from utils.profiling import pass_span, span
 
 
 def f(block, out):
     i = set(out)
-    for instr in reversed(block["instrs"]):
-        instr["state"] = i.copy()
-        dest = get_dest(instr)
-        args = get_args_set(instr)
-        if dest is not None:
-            if dest in i:
-                i.discard(dest)
-                i.update(args)
+    for instr in reversed(block.instrs):
+        if instr.dest is not None:
+            if instr.dest in i:
+                i.discard(instr.dest)
+                i.update(instr.uses())
         else:
-            i.update(args)
+            i.update(instr.uses())
     return i
 
 
 def dead_code_elimination(fn):
     blocks = form_blocks(fn)
+    _, outs = backward(blocks, f, exit_value=set())
     instrs = []
     for block in blocks:
-        for instr in block["instrs"]:
-            dest = get_dest(instr)
-            if dest is not None and dest not in instr["state"]:
-                # Remove the instruction
-                pass
-            else:
-                instrs.append(instr)
-
-    for instr in instrs:
-        if "state" in instr:
-            del instr["state"]
-
-    fn["instrs"] = instrs
+        # walk the block backwards, keeping what is live after each instr
+        live = set(outs[block.id])
+        kept = []
+        for instr in reversed(block.instrs):
+            if instr.dest is not None:
+                if instr.dest not in live:
+                    continue
+                live.discard(instr.dest)
+            live.update(instr.uses())
+            kept.append(instr)
+        instrs.extend(reversed(kept))
+    fn.instrs = instrs
 
 
 if __name__ == "__main__":
-    prog = json.load(sys.stdin)
-    for fn in prog["functions"]:
-        backward_df(fn, f, meet, initial_value=set())
-        dead_code_elimination(fn)
-    json.dump(prog, sys.stdout, indent=2)
+    with span("read json"):
+        prog = from_json(json.load(sys.stdin))
+    for fn in prog.functions:
+        with pass_span("liveness_dce", fn):
+            dead_code_elimination(fn)
+    with span("write json"):
+        json.dump(to_json(prog), sys.stdout, indent=2)
@@ -5,6 +5,7 @@ import string
 
 from utils.legacy.form_blocks import form_blocks
 from utils.legacy.instr import is_commutative, get_args_list, get_dest
+from utils.profiling import pass_span, span
 
 
 def check_dest_will_be_used_later(dest, instrs):
@@ -117,7 +118,10 @@ def local_value_numbering(fn):
 
 
 if __name__ == "__main__":
-    prog = json.load(sys.stdin)
+    with span("read json"):
+        prog = json.load(sys.stdin)
     for fn in prog["functions"]:
-        local_value_numbering(fn)
-    json.dump(prog, sys.stdout, indent=2)
+        with pass_span("lvn", fn):
+            local_value_numbering(fn)
+    with span("write json"):
+        json.dump(prog, sys.stdout, indent=2)
@@ -0,0 +1,114 @@
+import json
+import sys
+from typing import Dict, List
+from utils.profiling import span
+
+SELF = "<self>"  # stands for the function's own name in recursive calls
+
+
+def resolve(names: Dict[str, str], name: str) -> str:
+    # a function merged into one that was merged later
+    while name in names:
+        name = names[name]
+    return name
+
+
+def canonical_form(func: Dict, names: Dict[str, str]) -> str:
+    """
+    The function with its arguments, variables and labels renamed in order
+    of first appearance, its own name hidden and its callees replaced by
+    the functions they were merged into. Functions that are the same up
+    to renaming get the same form.
+    """
+    variables = {}
+    labels = {}
+
+    def var(name):
+        if name not in variables:
+            variables[name] = f"v{len(variables)}"
+        return variables[name]
+
+    def label(name):
+        if name not in labels:
+            labels[name] = f"l{len(labels)}"
+        return labels[name]
+
+    def callee(name):
+        name = resolve(names, name)
+        return SELF if name == func["name"] else name
+
+    args = [
+        {"name": var(arg["name"]), "type": arg["type"]}
+        for arg in func.get("args", [])
+    ]
+    instrs = []
+    for instr in func["instrs"]:
+        new_instr = {}
+        for key, value in instr.items():
+            if key == "pos":
+                continue
+            elif key == "dest":
+                value = var(value)
+            elif key == "args":
+                value = [var(arg) for arg in value]
+            elif key == "label":
+                value = label(value)
+            elif key == "labels":
+                value = [label(target) for target in value]
+            elif key == "funcs":
+                value = [callee(name) for name in value]
+            new_instr[key] = value
+        instrs.append(new_instr)
+
+    return json.dumps(
+        {"args": args, "type": func.get("type"), "instrs": instrs}, sort_keys=True
+    )
+
+
+def find_identical_functions(prog: Dict) -> Dict[str, str]:
+    """
+    Maps every function that duplicates an earlier one to that earlier
+    function. Merging callees can make their callers identical, so this
+    repeats until nothing more merges. main is never merged.
+    """
+    names = {}
+    while True:
+        representatives = {}
+        merged = False
+        for func in prog["functions"]:
+            if func["name"] in names or func["name"] == "main":
+                continue
+            form = canonical_form(func, names)
+            if form in representatives:
+                names[func["name"]] = representatives[form]
+                merged = True
+            else:
+                representatives[form] = func["name"]
+        if not merged:
+            return names
+
+
+def merge_functions(prog: Dict) -> Dict:
+    names = find_identical_functions(prog)
+
+    # Keep one function of each group and call it instead of the others
+    functions: List[Dict] = []
+    for func in prog["functions"]:
+        if func["name"] in names:
+            continue
+        for instr in func["instrs"]:
+            if "funcs" in instr:
+                instr["funcs"] = [resolve(names, name) for name in instr["funcs"]]
+        functions.append(func)
+    prog["functions"] = functions
+
+    return prog
+
+
+if __name__ == "__main__":
+    with span("read json"):
+        prog = json.load(sys.stdin)
+    with span("merge functions"):
+        prog = merge_functions(prog)
+    with span("write json"):
+        print(json.dumps(prog, indent=2))
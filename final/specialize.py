@@ -0,0 +1,133 @@
+import json
+import sys
+from copy import deepcopy
+from typing import Dict, List, Tuple
+from constant import analyze_constants, propagate_constants
+from utils.inline.graph import get_call_graph
+from utils.profiling import span
+
+Signature = Tuple[Tuple[int, object], ...]  # (argument position, value)
+
+
+def find_constant_calls(prog: Dict) -> List[Tuple[str, int, str, Signature]]:
+    """
+    (caller, index, callee, signature) for every call that passes at least
+    one constant to a function of the program, skipping calls within a
+    recursive cycle.
+    """
+    graph = get_call_graph(prog)
+    calls = []
+    for func in prog["functions"]:
+        analyze_constants(func)
+        for i, instr in enumerate(func["instrs"]):
+            if instr.get("op") != "call":
+                continue
+            callee = instr["funcs"][0]
+            if (
+                callee not in graph.nodes
+                or callee == "main"
+                or graph.is_recursive_edge((func["name"], callee))
+            ):
+                continue
+            state = instr.get("state", {})
+            signature = tuple(
+                (j, state[arg])
+                for j, arg in enumerate(instr.get("args", []))
+                if arg in state and state[arg] != "?"
+            )
+            if signature:
+                calls.append((func["name"], i, callee, signature))
+        for instr in func["instrs"]:
+            instr.pop("state", None)
+    return calls
+
+
+def make_clone(callee: Dict, signature: Signature, name: str) -> Dict:
+    """
+    A copy of callee named name, with the constant parameters of signature
+    defined at its entry instead of passed in.
+    """
+    clone = deepcopy(callee)
+    clone["name"] = name
+    constants = dict(signature)
+    params = clone.get("args", [])
+    clone["args"] = [param for j, param in enumerate(params) if j not in constants]
+    clone["instrs"] = [
+        {
+            "op": "const",
+            "dest": params[j]["name"],
+            "type": params[j]["type"],
+            "value": value,
+        }
+        for j, value in signature
+    ] + clone["instrs"]
+    return clone
+
+
+def specialize(prog: Dict, budget: int = 8) -> Dict:
+    """
+    Clone callees per distinct signature of constant arguments, most
+    called signatures first, and redirect the calls to the clones. A
+    clone is kept only if folding the constants changed its body, and at
+    most budget clones are made. Clones are analyzed again, so constants
+    passed on by a clone can specialize its callees in turn.
+    """
+    fns = {fn["name"]: fn for fn in prog["functions"]}
+    clones = {}  # (callee, signature) -> clone name, or None if not worth it
+
+    while True:
+        calls = find_constant_calls(prog)
+        sites = {}
+        for caller, i, callee, signature in calls:
+            sites.setdefault((callee, signature), []).append((caller, i))
+
+        redirect = {}  # (caller, index) -> (clone name, signature)
+        for key in sorted(sites, key=lambda key: -len(sites[key])):
+            if key not in clones:
+                if budget == 0:
+                    continue
+                callee, signature = key
+                n = len(clones)
+                while f"{callee}_spec{n}" in fns:
+                    n += 1
+                clone = make_clone(fns[callee], signature, f"{callee}_spec{n}")
+                unfolded = deepcopy(clone)
+                propagate_constants(clone)
+                if clone == unfolded:
+                    clones[key] = None
+                    continue
+                clones[key] = clone["name"]
+                fns[clone["name"]] = clone
+                prog["functions"].append(clone)
+                budget -= 1
+            if clones[key] is not None:
+                for site in sites[key]:
+                    redirect[site] = (clones[key], key[1])
+
+        if not redirect:
+            break
+        for func in prog["functions"]:
+            new_instrs = []
+            for i, instr in enumerate(func["instrs"]):
+                if (func["name"], i) in redirect:
+                    name, signature = redirect[(func["name"], i)]
+                    constants = dict(signature)
+                    instr = dict(instr)
+                    instr["funcs"] = [name]
+                    instr["args"] = [
+                        arg for j, arg in enumerate(instr["args"]) if j not in constants
+                    ]
+                new_instrs.append(instr)
+            func["instrs"] = new_instrs
+
+    return prog
+
+
+if __name__ == "__main__":
+    budget = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    with span("read json"):
+        prog = json.load(sys.stdin)
+    with span("specialize"):
+        prog = specialize(prog, budget)
+    with span("write json"):
+        print(json.dumps(prog, indent=2))
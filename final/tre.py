@@ -0,0 +1,147 @@
+import json
+import sys
+from typing import Dict, List, Optional, Set
+from utils.profiling import span
+
+
+def fresh(name: str, used: Set[str]) -> str:
+    new_name = name
+    n = 0
+    while new_name in used:
+        n += 1
+        new_name = f"{name}.{n}"
+    used.add(new_name)
+    return new_name
+
+
+def find_tail_end(instrs: List[Dict], i: int) -> Optional[int]:
+    """
+    If the call at i is in tail position, the index just past the
+    instructions after it that only the call reaches, else None. The
+    call's result may be copied through `id` instructions on the way to
+    the `ret`, as the benchmarks' front end does, and a void call may also
+    be followed by the end of the function. Labels on the way are skipped;
+    other paths still jump to them, so what follows the first one is kept.
+    """
+    call = instrs[i]
+    value = call.get("dest")
+    end = None  # the first label, where other paths join
+    for j in range(i + 1, len(instrs)):
+        instr = instrs[j]
+        op = instr.get("op")
+        if "label" in instr:
+            if end is None:
+                end = j
+            continue
+        if op == "nop":
+            continue
+        if op == "id" and value is not None and instr["args"] == [value]:
+            value = instr["dest"]
+            continue
+        if op == "ret":
+            if instr.get("args", []) == ([value] if value is not None else []):
+                return j + 1 if end is None else end
+        return None
+    if value is not None:
+        return None
+    return len(instrs) if end is None else end
+
+
+def sequentialize(
+    moves: Dict[str, str], types: Dict[str, str], used: Set[str]
+) -> List[Dict]:
+    """
+    `id` instructions performing the parallel assignment moves (parameter
+    -> argument). A parameter is assigned once no other pending move reads
+    it; a cycle of moves is broken by saving one parameter in a temporary.
+    """
+    instrs = []
+    moves = dict(moves)
+    while moves:
+        read = set(moves.values())
+        ready = [dest for dest in moves if dest not in read]
+        if ready:
+            dest = ready[0]
+            arg = moves.pop(dest)
+            instrs.append(
+                {"op": "id", "dest": dest, "type": types[dest], "args": [arg]}
+            )
+            continue
+        dest = next(iter(moves))
+        temp = fresh(f"{dest}.tre", used)
+        instrs.append({"op": "id", "dest": temp, "type": types[dest], "args": [dest]})
+        moves = {d: temp if arg == dest else arg for d, arg in moves.items()}
+    return instrs
+
+
+def eliminate_tail_calls(fn: Dict) -> bool:
+    """
+    Turn fn's calls to itself in tail position into assignments to its
+    parameters and a jump back to a loop header at its entry, after the
+    constants the entry defines. Returns whether any call was rewritten.
+    """
+    params = fn.get("args", [])
+    types = {param["name"]: param["type"] for param in params}
+    used = set(types)
+    for instr in fn["instrs"]:
+        if "dest" in instr:
+            used.add(instr["dest"])
+        if "label" in instr:
+            used.add(instr["label"])
+    header = None
+
+    instrs = []
+    i = 0
+    while i < len(fn["instrs"]):
+        instr = fn["instrs"][i]
+        end = None
+        if instr.get("op") == "call" and instr["funcs"] == [fn["name"]]:
+            end = find_tail_end(fn["instrs"], i)
+        if end is None:
+            instrs.append(instr)
+            i += 1
+            continue
+
+        if header is None:
+            header = fresh("tre.header", used)
+        moves = {
+            param["name"]: arg
+            for param, arg in zip(params, instr.get("args", []))
+            if arg != param["name"]
+        }
+        instrs += sequentialize(moves, types, used)
+        instrs.append({"op": "jmp", "labels": [header]})
+        i = end
+
+    if header is None:
+        return False
+
+    # constants set up at entry and never reassigned stay out of the loop
+    defs = {}
+    for instr in instrs:
+        if "dest" in instr:
+            defs[instr["dest"]] = defs.get(instr["dest"], 0) + 1
+    start = 0
+    while (
+        start < len(instrs)
+        and instrs[start].get("op") == "const"
+        and defs[instrs[start]["dest"]] == 1
+    ):
+        start += 1
+    fn["instrs"] = instrs[:start] + [{"label": header}] + instrs[start:]
+    return True
+
+
+def tail_recursion_elimination(prog: Dict) -> Dict:
+    for fn in prog["functions"]:
+        eliminate_tail_calls(fn)
+    return prog
+
+
+if __name__ == "__main__":
+    with span("read json"):
+        prog = json.load(sys.stdin)
+    with span("tail recursion elimination"):
+        prog = tail_recursion_elimination(prog)
+    with span("write json"):
+        print(json.dumps(prog, indent=2))
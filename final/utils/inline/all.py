@@ -1,19 +1,12 @@
 from typing import Dict
 
-from utils.inline.graph import find_recursive_functions, form_call_graph
+from utils.inline.graph import get_call_graph
 
 
 def get_all_inline_config(prog: Dict) -> Dict:
-    _, edges = form_call_graph(prog)
-
-    # Find recursive functions
-    recursive = find_recursive_functions(edges)
+    graph = get_call_graph(prog)
 
     # Only inline non-recursive function calls
-    config = {
-        (src, dest): True
-        for src, dest in edges
-        if src not in recursive or dest not in recursive
-    }
+    config = {edge: True for edge in graph.inlinable_edges()}
 
     return config
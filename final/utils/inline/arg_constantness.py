@@ -1,11 +1,10 @@
 from typing import Dict
-from utils.inline.graph import find_recursive_functions, form_call_graph
+from utils.inline.graph import get_call_graph
 from constant import forward_df, f, meet
 
 
 def get_arg_constantness_inline_config(prog: Dict) -> Dict:
-    _, edges = form_call_graph(prog)
-    recursive = find_recursive_functions(edges)
+    graph = get_call_graph(prog)
 
     # Run constant propagation on all functions
     for func in prog["functions"]:
@@ -19,7 +18,7 @@ def get_arg_constantness_inline_config(prog: Dict) -> Dict:
                 callee = instr["funcs"][0]
 
                 # Skip recursive calls
-                if func["name"] in recursive and callee in recursive:
+                if graph.is_recursive_edge((func["name"], callee)):
                     continue
 
                 # Check if any arguments are constant
@@ -0,0 +1,312 @@
+"""
+A static cost model for inlining decisions.
+
+Estimates how an inlining configuration changes program size and the
+number of executed instructions, without running the pipeline. The
+estimate is built from:
+- function sizes and the exact size of each inlined copy;
+- the loop depth of each call site, assuming LOOP_TRIPS iterations per
+  loop level;
+- how often each function is called per run, propagated from main;
+- which arguments are constant at each call site, and how much of the
+  callee folds away when they are.
+
+The searches use it to rank candidates and measure only the best few.
+
+Run `python -m utils.inline.cost_model [--top-k K] [--measure]` from the
+final directory for an accuracy report against optimal_configs.csv.
+"""
+
+import ast
+import csv
+import itertools
+import json
+import os
+import sys
+from copy import deepcopy
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from constant import f, forward_df, meet
+from utils.inline.graph import get_call_graph
+from utils.legacy.cfg import form_blocks
+from utils.legacy.loop import get_loop_depths, get_loop_forest
+
+LOOP_TRIPS = 10  # assumed iterations of a loop
+RECURSION_DEPTH = 10  # assumed depth of a recursive call chain
+CALL_COST = 2  # dynamic instructions of the call and the callee's ret
+FOLDABLE_OPS = {"add", "sub", "mul", "div", "eq", "lt", "gt", "le", "ge", "id"}
+
+csv_path = Path(__file__).parent / "optimal_configs.csv"
+
+
+def get_weights(fn: Dict) -> List[float]:
+    """The estimated executions per call of each instruction of fn."""
+    cfg, blocks = form_blocks(fn)
+    depths = get_loop_depths(blocks, get_loop_forest(cfg, blocks))
+    weight = {}
+    for block in blocks:
+        for instr in block["instrs"]:
+            weight[id(instr)] = LOOP_TRIPS ** depths[block["name"]]
+    return [weight.get(id(instr), 1) for instr in fn["instrs"]]
+
+
+def get_folded(callee: Dict, weights: List[float], constant_params: set):
+    """
+    How many instructions of callee fold to constants when the given
+    parameters are constant, and how many executions of them per call.
+    Only variables with a single definition are followed.
+    """
+    defs = {}
+    for instr in callee["instrs"]:
+        if "dest" in instr:
+            defs[instr["dest"]] = defs.get(instr["dest"], 0) + 1
+
+    constants = {param for param in constant_params if param not in defs}
+    size, dyn = 0, 0
+    for instr, weight in zip(callee["instrs"], weights):
+        args = instr.get("args", [])
+        if instr.get("op") == "const" and defs.get(instr["dest"]) == 1:
+            constants.add(instr["dest"])
+        elif args and all(arg in constants for arg in args):
+            if instr.get("op") in FOLDABLE_OPS and defs.get(instr["dest"]) == 1:
+                constants.add(instr["dest"])
+                size += 1
+                dyn += weight
+            elif instr.get("op") == "br":
+                size += 1
+                dyn += weight
+    return size, dyn
+
+
+def get_cost_model(prog: Dict) -> Dict:
+    """
+    Analyze a program once, so that `predict` is cheap for every config.
+
+    Returns:
+        A dictionary with:
+            - order: Function names in program order
+            - sizes: Function name -> number of instructions
+            - callees: Function name -> names of the functions it calls
+            - frequency: Function name -> estimated calls per run
+            - sites: (caller, callee) -> list of call sites, each with the
+              size of the inlined copy ("size"), its executions per run
+              ("weight"), the change in executed instructions per
+              execution ("dyn"), and what constant arguments fold away
+              ("folded_size", "folded_dyn")
+    """
+    # inline.py imports the strategies, some of which use this model
+    from inline import instantiate, make_template
+
+    fns = {fn["name"]: fn for fn in prog["functions"]}
+    graph = get_call_graph(prog)
+    nodes = graph.nodes
+    weights = {name: get_weights(fn) for name, fn in fns.items()}
+    templates = {}
+
+    sites = {}
+    for fn in prog["functions"]:
+        # constant propagation annotates a copy with the state before each
+        # instruction
+        analyzed = deepcopy(fn)
+        forward_df(analyzed, f, meet)
+        for instr, weight in zip(analyzed["instrs"], weights[fn["name"]]):
+            if instr.get("op") != "call" or instr["funcs"][0] not in fns:
+                continue
+            callee_name = instr["funcs"][0]
+            callee = fns[callee_name]
+            if callee_name not in templates:
+                templates[callee_name] = make_template(callee)
+            template = templates[callee_name]
+
+            copy = instantiate(template, instr, "cost")
+            # per execution, param copies, the ret's id and a jmp to the
+            # done label replace the call and the ret
+            executed = len(template["modified_params"])
+            executed += "dest" in instr
+            executed += template["jumps_to_done"]
+            state = instr.get("state", {})
+            constant_params = {
+                param
+                for arg, param in zip(instr.get("args", []), template["params"])
+                if arg in state and state[arg] != "?"
+            }
+            folded_size, folded_dyn = get_folded(
+                callee, weights[callee_name], constant_params
+            )
+            sites.setdefault((fn["name"], callee_name), []).append(
+                {
+                    "size": len(copy) - 1,
+                    "weight": weight,
+                    "dyn": executed - CALL_COST,
+                    "folded_size": folded_size,
+                    "folded_dyn": folded_dyn,
+                }
+            )
+
+    # calls per run, callers before callees
+    frequency = {name: 0 for name in fns}
+    if "main" in frequency:
+        frequency["main"] = 1
+    for scc in reversed(graph.sccs):
+        if scc[0] in graph.recursive:
+            for name in scc:
+                frequency[name] *= RECURSION_DEPTH
+        for name in scc:
+            for (caller, callee), edge_sites in sites.items():
+                if caller == name and callee not in scc:
+                    for site in edge_sites:
+                        frequency[callee] += frequency[name] * site["weight"]
+
+    return {
+        "order": [fn["name"] for fn in prog["functions"]],
+        "sizes": dict(graph.sizes),
+        "callees": {name: set(node["edges"]) for name, node in nodes.items()},
+        "frequency": frequency,
+        "sites": sites,
+    }
+
+
+def predict(model: Dict, config: Dict[Tuple[str, str], bool]) -> Dict:
+    """
+    Estimate how inlining with config changes the program.
+
+    Returns:
+        {"size": change in program size, "dyn": change in executed
+        instructions}, both relative to inlining nothing.
+    """
+    order = model["order"]
+    position = {name: i for i, name in enumerate(order)}
+    eff_size = dict(model["sizes"])
+    remaining = {name: set(callees) for name, callees in model["callees"].items()}
+    dyn = 0
+
+    # inline processes functions in program order, so a callee that comes
+    # earlier is copied with its own inlined calls
+    for name in order:
+        for callee in sorted(model["callees"][name]):
+            edge = (name, callee)
+            if not config.get(edge, False) or edge not in model["sites"]:
+                continue
+            earlier = position[callee] < position[name]
+            growth = eff_size[callee] - model["sizes"][callee] if earlier else 0
+            remaining[name].discard(callee)
+            remaining[name] |= (
+                remaining[callee] if earlier else model["callees"][callee]
+            )
+            for site in model["sites"][edge]:
+                eff_size[name] += site["size"] + growth - site["folded_size"]
+                per_run = model["frequency"][name] * site["weight"]
+                dyn += per_run * (site["dyn"] - site["folded_dyn"])
+
+    # interprocedural DCE drops functions main no longer reaches
+    live = set()
+    stack = ["main"] if "main" in remaining else list(order)
+    while stack:
+        name = stack.pop()
+        if name in live or name not in remaining:
+            continue
+        live.add(name)
+        stack.extend(remaining[name])
+    originally_live = set()
+    stack = ["main"] if "main" in remaining else list(order)
+    while stack:
+        name = stack.pop()
+        if name in originally_live or name not in model["callees"]:
+            continue
+        originally_live.add(name)
+        stack.extend(model["callees"][name])
+
+    size = sum(eff_size[name] for name in live) - sum(
+        model["sizes"][name] for name in originally_live
+    )
+    return {"size": size, "dyn": dyn}
+
+
+def rank_configs(model: Dict, configs: List[Dict], metric: str) -> List[Dict]:
+    """Configs sorted by predicted `metric` ("size" or "dyn"), best first."""
+    return sorted(configs, key=lambda config: predict(model, config)[metric])
+
+
+def rank_edges(model: Dict, edges: List[Tuple[str, str]], metric: str):
+    """Edges sorted by the predicted effect of inlining only them."""
+    return sorted(edges, key=lambda edge: predict(model, {edge: True})[metric])
+
+
+def all_configs(edges: List[Tuple[str, str]]) -> List[Dict]:
+    return [
+        dict(zip(edges, values))
+        for values in itertools.product([False, True], repeat=len(edges))
+    ]
+
+
+if __name__ == "__main__":
+    # usage: python -m utils.inline.cost_model [--top-k K] [--measure]
+    from benchmark import (
+        count_executed_instructions,
+        count_program_size,
+        read_bril_programs,
+        run_pipeline,
+    )
+    from inline import inline
+
+    top_k = 3
+    if "--top-k" in sys.argv:
+        top_k = int(sys.argv[sys.argv.index("--top-k") + 1])
+    measure = "--measure" in sys.argv
+
+    progs = {
+        prog["name"]: prog
+        for prog in read_bril_programs(os.path.join("..", "benchmarks"))
+    }
+    metrics = [
+        ("size", "best_program_size", "best_program_size_config", count_program_size),
+        (
+            "dyn",
+            "best_executed_instructions",
+            "best_executed_instr_count_config",
+            count_executed_instructions,
+        ),
+    ]
+    hits = {metric: [0, 0] for metric, *_ in metrics}  # top-1, top-k
+    achieved = {metric: [0, 0] for metric, *_ in metrics}  # model, optimal
+    total = 0
+
+    with open(csv_path) as csv_file:
+        for row in csv.DictReader(csv_file):
+            if row["best_program_size"] == "-1" or row["program_name"] not in progs:
+                continue
+            prog = progs[row["program_name"]]
+            model = get_cost_model(deepcopy(prog))
+            total += 1
+            report = []
+            for metric, best_column, config_column, count in metrics:
+                best_config = ast.literal_eval(row[config_column])
+                ranked = rank_configs(model, all_configs(list(best_config)), metric)
+                rank = ranked.index(best_config) + 1
+                hits[metric][0] += rank == 1
+                hits[metric][1] += rank <= top_k
+                report.append(f"{metric} rank {rank}/{len(ranked)}")
+                if measure:
+                    # the best of the model's top k, measured
+                    value = min(
+                        count(run_pipeline(json.dumps(inline(deepcopy(prog), config))))
+                        for config in ranked[:top_k]
+                    )
+                    achieved[metric][0] += value
+                    achieved[metric][1] += int(row[best_column])
+                    report.append(f"{value} vs {row[best_column]}")
+            print(f"{row['program_name']}: {', '.join(report)}")
+
+    print()
+    for metric, (top1, topk) in hits.items():
+        print(
+            f"{metric}: optimal config ranked first for {top1}/{total} programs, "
+            f"in the top {top_k} for {topk}/{total}"
+        )
+        if measure:
+            model_total, optimal_total = achieved[metric]
+            print(
+                f"{metric}: best of the top {top_k} totals {model_total}, "
+                f"optimal totals {optimal_total}"
+            )
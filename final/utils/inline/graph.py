@@ -1,3 +1,5 @@
+from collections import OrderedDict
+from dataclasses import dataclass
 from typing import Dict, List, Set, Tuple
 
 
@@ -24,35 +26,172 @@ def form_call_graph(prog: Dict) -> Tuple[Dict, List[Tuple[str, str]]]:
     return nodes, edges
 
 
+def find_sccs(nodes: Dict) -> List[List[str]]:
+    # Tarjan's algorithm, with an explicit stack so that long call chains
+    # don't hit the recursion limit. SCCs come out callees first, so
+    # walking the list in order visits every function after the functions
+    # it calls.
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    sccs = []
+
+    for root in nodes:
+        if root in index:
+            continue
+        # each frame is a node and the iterator over its remaining callees
+        frames = []
+
+        def visit(node):
+            index[node] = lowlink[node] = len(index)
+            stack.append(node)
+            on_stack.add(node)
+            frames.append((node, iter(sorted(nodes[node]["edges"]))))
+
+        visit(root)
+        while frames:
+            node, neighbors = frames[-1]
+            for neighbor in neighbors:
+                if neighbor not in nodes:
+                    continue
+                if neighbor not in index:
+                    visit(neighbor)
+                    break
+                elif neighbor in on_stack:
+                    lowlink[node] = min(lowlink[node], index[neighbor])
+            else:
+                frames.pop()
+                if frames:
+                    parent = frames[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    scc = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.remove(member)
+                        scc.append(member)
+                        if member == node:
+                            break
+                    sccs.append(scc)
+
+    return sccs
+
+
 def find_recursive_functions(edges: List[tuple]) -> Set[str]:
-    # Build adjacency list
-    graph = {}
+    """The functions on a cycle of calls, including self-recursive ones."""
+    nodes = {}
     for src, dest in edges:
-        if src not in graph:
-            graph[src] = set()
-        graph[src].add(dest)
+        nodes.setdefault(src, {"edges": []})["edges"].append(dest)
+        nodes.setdefault(dest, {"edges": []})
 
-    # Find functions that are part of cycles (recursive)
     recursive = set()
-    visited = set()
-    path = set()
+    for scc in find_sccs(nodes):
+        if len(scc) > 1 or scc[0] in nodes[scc[0]]["edges"]:
+            recursive.update(scc)
+    return recursive
 
-    def dfs(node):
-        if node in path:
-            recursive.add(node)
-            return
-        if node in visited:
-            return
 
-        visited.add(node)
-        path.add(node)
+@dataclass
+class CallGraph:
+    """
+    The call graph of a program, from `get_call_graph`.
 
-        for neighbor in graph.get(node, []):
-            dfs(neighbor)
+    - nodes, edges: as returned by form_call_graph
+    - sites: (caller, callee) -> positions of the calls in caller's instrs
+    - sizes: function name -> number of instructions
+    - sccs: strongly connected components, callees first
+    - scc_index: function name -> index of its SCC in sccs
+    - dag: SCC index -> indices of the SCCs it calls; reversed(sccs) is a
+      topological order of this DAG
+    - recursive: the functions on a cycle of calls
+    """
 
-        path.remove(node)
+    nodes: Dict
+    edges: List[Tuple[str, str]]
+    sites: Dict[Tuple[str, str], List[int]]
+    sizes: Dict[str, int]
+    sccs: List[List[str]]
+    scc_index: Dict[str, int]
+    dag: List[Set[int]]
+    recursive: Set[str]
 
-    for node in graph:
-        dfs(node)
+    def is_recursive_edge(self, edge: Tuple[str, str]) -> bool:
+        """Whether the callee can call back into the caller."""
+        src, dest = edge
+        if src not in self.recursive or dest not in self.scc_index:
+            return False
+        return self.scc_index[src] == self.scc_index[dest]
 
-    return recursive
+    def inlinable_edges(self) -> List[Tuple[str, str]]:
+        return [edge for edge in self.edges if not self.is_recursive_edge(edge)]
+
+
+def build_call_graph(prog: Dict) -> CallGraph:
+    nodes, edges = form_call_graph(prog)
+    sites = {}
+    for fn in prog["functions"]:
+        for i, instr in enumerate(fn["instrs"]):
+            if "op" in instr and instr["op"] == "call":
+                sites.setdefault((fn["name"], instr["funcs"][0]), []).append(i)
+
+    sccs = find_sccs(nodes)
+    scc_index = {name: i for i, scc in enumerate(sccs) for name in scc}
+    dag = [set() for _ in sccs]
+    recursive = set()
+    for i, scc in enumerate(sccs):
+        for name in scc:
+            for callee in nodes[name]["edges"]:
+                if callee in scc_index and scc_index[callee] != i:
+                    dag[i].add(scc_index[callee])
+        if len(scc) > 1 or scc[0] in nodes[scc[0]]["edges"]:
+            recursive.update(scc)
+
+    return CallGraph(
+        nodes=nodes,
+        edges=edges,
+        sites=sites,
+        sizes={fn["name"]: len(fn["instrs"]) for fn in prog["functions"]},
+        sccs=sccs,
+        scc_index=scc_index,
+        dag=dag,
+        recursive=recursive,
+    )
+
+
+# program id -> (functions it was built from, graph), most recent last
+_cache = OrderedDict()
+CACHE_SIZE = 8
+
+
+def get_call_graph(prog: Dict) -> CallGraph:
+    """
+    The call graph of prog, built once and reused until prog's functions
+    or their instruction lists change. Callers must not modify it.
+    """
+    key = id(prog)
+    # the instruction lists are kept, so their ids can't be reused
+    functions = [
+        (fn["name"], fn["instrs"], len(fn["instrs"])) for fn in prog["functions"]
+    ]
+    if key in _cache:
+        cached_prog, cached_functions, graph = _cache[key]
+        if (
+            cached_prog is prog
+            and len(cached_functions) == len(functions)
+            and all(
+                name == cached_name and instrs is cached_instrs and n == cached_n
+                for (name, instrs, n), (cached_name, cached_instrs, cached_n) in zip(
+                    functions, cached_functions
+                )
+            )
+        ):
+            _cache.move_to_end(key)
+            return graph
+
+    graph = build_call_graph(prog)
+    _cache[key] = (prog, functions, graph)
+    _cache.move_to_end(key)
+    if len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return graph
@@ -1,5 +1,10 @@
 import unittest
-from utils.inline.graph import form_call_graph
+from utils.inline.graph import (
+    find_recursive_functions,
+    find_sccs,
+    form_call_graph,
+    get_call_graph,
+)
 
 
 class TestFormCallGraph(unittest.TestCase):
@@ -94,3 +99,112 @@ class TestFormCallGraph(unittest.TestCase):
         self.assertCountEqual(nodes["A"]["edges"], ["B"])
         self.assertCountEqual(nodes["C"]["edges"], ["A", "W"])
         self.assertIn(("C", "W"), edges)
+
+
+class TestFindSccs(unittest.TestCase):
+    def test_callees_come_first(self):
+        # A calls B, B calls C, C calls A and W, W calls X
+        prog = {
+            "functions": [
+                {"name": "A", "instrs": [{"op": "call", "funcs": ["B"]}]},
+                {"name": "B", "instrs": [{"op": "call", "funcs": ["C"]}]},
+                {
+                    "name": "C",
+                    "instrs": [
+                        {"op": "call", "funcs": ["A"]},
+                        {"op": "call", "funcs": ["W"]},
+                    ],
+                },
+                {"name": "W", "instrs": [{"op": "call", "funcs": ["X"]}]},
+                {"name": "X", "instrs": []},
+            ]
+        }
+        nodes, _ = form_call_graph(prog)
+        sccs = find_sccs(nodes)
+        self.assertEqual([sorted(scc) for scc in sccs], [["X"], ["W"], ["A", "B", "C"]])
+
+    def test_self_recursion_and_unknown_callee(self):
+        prog = {
+            "functions": [
+                {
+                    "name": "A",
+                    "instrs": [
+                        {"op": "call", "funcs": ["A"]},
+                        {"op": "call", "funcs": ["missing"]},
+                    ],
+                },
+            ]
+        }
+        nodes, _ = form_call_graph(prog)
+        self.assertEqual(find_sccs(nodes), [["A"]])
+
+    def test_long_chain(self):
+        # deeper than the recursion limit
+        n = 5000
+        nodes = {f"f{i}": {"edges": [f"f{i + 1}"]} for i in range(n)}
+        nodes[f"f{n}"] = {"edges": []}
+        sccs = find_sccs(nodes)
+        self.assertEqual(sccs[0], [f"f{n}"])
+        self.assertEqual(sccs[-1], ["f0"])
+
+
+class TestFindRecursiveFunctions(unittest.TestCase):
+    def test_whole_cycle_is_recursive(self):
+        edges = [("main", "A"), ("A", "B"), ("B", "A"), ("B", "C"), ("D", "D")]
+        self.assertEqual(find_recursive_functions(edges), {"A", "B", "D"})
+
+
+class TestGetCallGraph(unittest.TestCase):
+    def make_prog(self):
+        # main calls A twice and B; A and B call each other; B calls C
+        return {
+            "functions": [
+                {
+                    "name": "main",
+                    "instrs": [
+                        {"op": "call", "funcs": ["A"]},
+                        {"op": "nop"},
+                        {"op": "call", "funcs": ["A"]},
+                        {"op": "call", "funcs": ["B"]},
+                    ],
+                },
+                {"name": "A", "instrs": [{"op": "call", "funcs": ["B"]}]},
+                {
+                    "name": "B",
+                    "instrs": [
+                        {"op": "call", "funcs": ["A"]},
+                        {"op": "call", "funcs": ["C"]},
+                    ],
+                },
+                {"name": "C", "instrs": []},
+            ]
+        }
+
+    def test_sites_and_sizes(self):
+        graph = get_call_graph(self.make_prog())
+        self.assertEqual(graph.sites[("main", "A")], [0, 2])
+        self.assertEqual(graph.sites[("B", "C")], [1])
+        self.assertEqual(graph.sizes, {"main": 4, "A": 1, "B": 2, "C": 0})
+
+    def test_scc_dag(self):
+        graph = get_call_graph(self.make_prog())
+        self.assertEqual([sorted(scc) for scc in graph.sccs], [["C"], ["A", "B"], ["main"]])
+        self.assertEqual(graph.dag, [set(), {0}, {1}])
+        self.assertEqual(graph.recursive, {"A", "B"})
+
+    def test_recursive_edges(self):
+        graph = get_call_graph(self.make_prog())
+        self.assertTrue(graph.is_recursive_edge(("A", "B")))
+        self.assertFalse(graph.is_recursive_edge(("main", "A")))
+        self.assertFalse(graph.is_recursive_edge(("B", "C")))
+        self.assertCountEqual(
+            graph.inlinable_edges(), [("main", "A"), ("main", "B"), ("B", "C")]
+        )
+
+    def test_cache(self):
+        prog = self.make_prog()
+        graph = get_call_graph(prog)
+        self.assertIs(get_call_graph(prog), graph)
+        prog["functions"][3]["instrs"] = [{"op": "call", "funcs": ["main"]}]
+        graph = get_call_graph(prog)
+        self.assertEqual(graph.recursive, {"main", "A", "B", "C"})
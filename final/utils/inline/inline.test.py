@@ -0,0 +1,49 @@
+import unittest
+from inline import inline
+
+
+def g():
+    # @g(a: int, b: int): int, reassigning both parameters
+    return {
+        "name": "g",
+        "args": [{"name": "a", "type": "int"}, {"name": "b", "type": "int"}],
+        "type": "int",
+        "instrs": [
+            {"op": "const", "dest": "one", "type": "int", "value": 1},
+            {"op": "const", "dest": "two", "type": "int", "value": 2},
+            {"op": "add", "dest": "a", "type": "int", "args": ["a", "one"]},
+            {"op": "mul", "dest": "b", "type": "int", "args": ["b", "two"]},
+            {"op": "sub", "dest": "r", "type": "int", "args": ["a", "b"]},
+            {"op": "ret", "args": ["r"]},
+        ],
+    }
+
+
+class TestInline(unittest.TestCase):
+    def test_same_argument_for_modified_params(self):
+        main = {
+            "name": "main",
+            "instrs": [
+                {"op": "const", "dest": "x", "type": "int", "value": 5},
+                {
+                    "op": "call",
+                    "dest": "y",
+                    "type": "int",
+                    "funcs": ["g"],
+                    "args": ["x", "x"],
+                },
+                {"op": "print", "args": ["y"]},
+            ],
+        }
+        prog = inline({"functions": [main, g()]}, {("main", "g"): True})
+        instrs = prog["functions"][0]["instrs"]
+        copies = [instr for instr in instrs if instr.get("args") == ["x"]]
+        self.assertEqual(len(copies), 2)
+        a, b = (copy["dest"] for copy in copies)
+        self.assertNotEqual(a, b)
+        sub = next(instr for instr in instrs if instr.get("op") == "sub")
+        self.assertEqual(sub["args"], [a, b])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,6 @@
-import copy
 from collections import defaultdict
 from dataclasses import dataclass
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, FrozenSet, Iterator, Tuple, Optional
 import ast
 from pathlib import Path
 import csv
@@ -77,6 +76,7 @@ def find_bridges(nodes: Dict, edges: List[Tuple[str, str]]) -> List[Tuple[str, s
     for u, v in edges:
         undirected_adj[u].add(v)
         undirected_adj[v].add(u)
+    edge_set = set(edges)
 
     disc = {}
     low = {}
@@ -87,20 +87,22 @@ def find_bridges(nodes: Dict, edges: List[Tuple[str, str]]) -> List[Tuple[str, s
         disc[u] = low[u] = time[0]
         time[0] += 1
 
-        for v in undirected_adj[u]:
+        # sorted, so that which way a two-way call is reported doesn't
+        # depend on set order
+        for v in sorted(undirected_adj[u]):
             if v not in disc:
                 dfs(v, u)
                 low[u] = min(low[u], low[v])
                 if low[v] > disc[u]:
                     # Add bridge if it matches direction in original edges
-                    if (u, v) in edges:
+                    if (u, v) in edge_set:
                         bridges.append((u, v))
-                    elif (v, u) in edges:
+                    elif (v, u) in edge_set:
                         bridges.append((v, u))
             elif v != parent:
                 low[u] = min(low[u], disc[v])
 
-    for node in nodes:
+    for node in sorted(nodes):
         if node not in disc:
             dfs(node)
 
@@ -118,6 +120,10 @@ def find_connected_components(nodes, edges):
         # If no root nodes, use all nodes as potential starts
         root_nodes = set(nodes.keys())
 
+    callers = defaultdict(set)
+    for u, v in edges:
+        callers[v].add(u)
+
     # BFS or DFS helper
     def dfs(start, visited):
         stack = [start]
@@ -128,9 +134,9 @@ def find_connected_components(nodes, edges):
                 visited.add(node)
                 component.add(node)
                 # For connected components, treat graph undirected:
-                neighbors = set(nodes[node]["edges"]) | {
-                    u for (u, v) in edges if v == node
-                }  # add incoming as neighbors
+                neighbors = (
+                    set(nodes[node]["edges"]) | callers[node]
+                )  # add incoming as neighbors
                 for neigh in neighbors:
                     if neigh not in visited:
                         stack.append(neigh)
@@ -236,18 +242,138 @@ def select_partition_edge(
         return (first_node, selected_target)
 
 
+class PersistentGraph:
+    """
+    A call graph that is never changed in place. `remove` and `inline`
+    return new graphs that share the callee sets of every node they don't
+    touch, so a path through the inlining tree costs one dict of
+    references per level instead of a deep copy.
+
+    succs maps each node to the frozenset of nodes it calls; edges is the
+    frozenset of (caller, callee) pairs. As with the list form used by
+    remove_edge and inline_edge, the two are updated by the same rules but
+    not forced to agree.
+
+    Graphs with the same nodes and edges are equal and hash alike, however
+    they were reached, so they can key a memo of subproblems.
+    """
+
+    __slots__ = ("succs", "edges", "_key")
+
+    def __init__(self, succs: Dict[str, FrozenSet[str]], edges: FrozenSet):
+        self.succs = succs
+        self.edges = edges
+        self._key = None
+
+    def key(self):
+        # the canonical form: node order and construction history are
+        # forgotten, names are kept since configs are keyed by them
+        if self._key is None:
+            self._key = (frozenset(self.succs.items()), self.edges)
+        return self._key
+
+    def __eq__(self, other):
+        return isinstance(other, PersistentGraph) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    @staticmethod
+    def from_lists(nodes: Dict, edges: List[Tuple[str, str]]) -> "PersistentGraph":
+        return PersistentGraph(
+            {name: frozenset(node["edges"]) for name, node in nodes.items()},
+            frozenset(edges),
+        )
+
+    def to_lists(self) -> Tuple[Dict, List[Tuple[str, str]]]:
+        """The nodes and edges in the list form, with sorted lists."""
+        return self.nodes(), sorted(self.edges)
+
+    def nodes(self) -> Dict[str, Dict]:
+        return {name: {"edges": sorted(succs)} for name, succs in self.succs.items()}
+
+    def view(self) -> Dict[str, Dict]:
+        # what the list-based helpers read, without copying the sets
+        return {name: {"edges": succs} for name, succs in self.succs.items()}
+
+    def remove(self, edge: Tuple[str, str]) -> "PersistentGraph":
+        src, dst = edge
+        succs = dict(self.succs)
+        succs[src] = self.succs[src] - {dst}
+        return PersistentGraph(succs, self.edges - {edge})
+
+    def inline(self, edge: Tuple[str, str]) -> "PersistentGraph":
+        """Inline an edge by merging the destination node into the source node."""
+        src, dst = edge
+
+        # Verify that the edge exists in the graph
+        if edge not in self.edges:
+            return self
+
+        # Detect recursive calls (self-loops)
+        if src == dst:
+            raise ValueError(f"Cannot inline a self-loop: {edge}")
+
+        succs = dict(self.succs)
+        new_edges = []
+
+        if sum(1 for _, v in self.edges if v == dst) > 1:
+            # Clone the destination (dst) for the specific caller (src)
+            clone_name = f"{src}_{dst}"  # Use deterministic clone naming
+            succs[clone_name] = self.succs[dst]
+            for node, callees in succs.items():
+                if src in callees:
+                    succs[node] = (callees - {src}) | {clone_name}
+            del succs[src]
+
+            for u, v in self.edges:
+                if u == src and v == dst:
+                    pass
+                elif v == src:
+                    new_edges.append((u, clone_name))
+                else:
+                    if u == dst:
+                        new_edges.append((clone_name, v))
+                    new_edges.append((u, v))
+        else:
+            # Merge the destination (dst) into the source (src), leaving out
+            # dst's self-loop
+            succs[src] = (self.succs[src] | self.succs[dst]) - {dst}
+
+            for u, v in self.edges:
+                if (u, v) == edge:
+                    continue  # Remove the inlined edge
+                if u == dst:
+                    u = src  # Redirect edges from dst to src
+                new_edges.append((u, v))
+
+            # Remove the destination node
+            del succs[dst]
+
+        # Deduplicate and remove self-loops
+        return PersistentGraph(
+            succs, frozenset((u, v) for u, v in new_edges if u != v)
+        )
+
+    def components(self) -> List["PersistentGraph"]:
+        return [
+            PersistentGraph(
+                {name: node["edges"] for name, node in component_nodes.items()},
+                frozenset(component_edges),
+            )
+            for component_nodes, component_edges in find_connected_components(
+                self.view(), self.edges
+            )
+        ]
+
+    def partition_edge(self) -> Optional[Tuple[str, str]]:
+        return select_partition_edge(self.view(), self.edges)
+
+
 def remove_edge(
     nodes: Dict, edges: List[Tuple[str, str]], edge: Tuple[str, str]
 ) -> Tuple[Dict, List[Tuple[str, str]]]:
-    src, dst = edge
-    new_nodes = copy.deepcopy(nodes)
-    new_edges = [e for e in edges if e != edge]
-
-    # Remove dst from src's edges
-    if dst in new_nodes[src]["edges"]:
-        new_nodes[src]["edges"].remove(dst)
-
-    return new_nodes, new_edges
+    return PersistentGraph.from_lists(nodes, edges).remove(edge).to_lists()
 
 
 def inline_edge(
@@ -261,101 +387,81 @@ def inline_edge(
         edge: A tuple representing the edge to inline (src, dst).
 
     Returns:
-        Updated nodes and edges after inlining the specified edge.
+        Updated nodes and edges after inlining the specified edge, with
+        the edge lists sorted.
     """
-    src, dst = edge
-
-    # Verify that the edge exists in the graph
-    if edge not in edges:
-        return copy.deepcopy(nodes), edges[:]  # Return unchanged
-
-    # Detect recursive calls (self-loops)
-    if src == dst:
-        raise ValueError(f"Cannot inline a self-loop: {edge}")
-
-    # Make deep copies of nodes and edges
-    new_nodes = copy.deepcopy(nodes)
-    new_edges = []
-
-    # Find incoming edges to dst
-    incoming_edges = [u for u, v in edges if v == dst]
-
-    if len(incoming_edges) > 1:
-        # Clone the destination (dst) for the specific caller (src)
-        clone_name = f"{src}_{dst}"  # Use deterministic clone naming
-        new_nodes[clone_name] = {"edges": new_nodes[dst]["edges"][:]}  # Copy edges
-        for node in new_nodes:
-            for i, v in enumerate(new_nodes[node]["edges"]):
-                if v == src:
-                    new_nodes[node]["edges"][i] = clone_name
-        del new_nodes[src]
-
-        for u, v in edges:
-            if u == src and v == dst:
-                pass
-            elif v == src:
-                new_edges.append((u, clone_name))
-            else:
-                if u == dst:
-                    new_edges.append((clone_name, v))
-                new_edges.append((u, v))
-    else:
-        # Merge the destination (dst) into the source (src)
-        dst_edges = [
-            e for e in new_nodes[dst]["edges"] if e != dst
-        ]  # Exclude self-loops
-        new_nodes[src]["edges"] = list(
-            set(new_nodes[src]["edges"] + dst_edges)
-            - {dst}  # Remove dst from src's edges
-        )
-
-        for u, v in edges:
-            if (u, v) == edge:
-                continue  # Remove the inlined edge
-            if u == dst:
-                u = src  # Redirect edges from dst to src
-            new_edges.append((u, v))
-
-        # Remove the destination node
-        del new_nodes[dst]
+    return PersistentGraph.from_lists(nodes, edges).inline(edge).to_lists()
 
-    # Deduplicate and remove self-loops
-    new_edges = list(set(new_edges))
-    new_edges = [(u, v) for (u, v) in new_edges if u != v]
-
-    return new_nodes, new_edges
 
+@dataclass
+class SharingStats:
+    """How much of the inlining tree memoization shared."""
+
+    visits: int = 0  # subproblems asked for, memo hits included
+    unique: int = 0  # distinct subproblems, the nodes of the DAG
+    tree_nodes: int = 0  # nodes the tree would have without sharing
+
+    def __str__(self) -> str:
+        shared = self.visits - self.unique
+        saved = 1 - self.unique / self.tree_nodes if self.tree_nodes else 0
+        return (
+            f"{self.unique} distinct subproblems for {self.tree_nodes} tree "
+            f"nodes ({saved:.1%} removed), {shared} memo hits"
+        )
 
-def build_inlining_tree(nodes: Dict, edges: List[Tuple[str, str]]) -> InliningTreeNode:
-    """Main entry point for building the inlining tree."""
-    if not edges:
-        return InliningTreeLeaf(nodes, edges)
 
-    components = find_connected_components(nodes, edges)
-    if len(components) > 1:
+def build_inlining_tree(
+    nodes: Dict,
+    edges: List[Tuple[str, str]],
+    stats: Optional[SharingStats] = None,
+) -> InliningTreeNode:
+    """
+    Main entry point for building the inlining tree. Equal residual graphs
+    share one subtree, so the result is a DAG. It is still exponential in
+    the number of edges; use iter_configurations to only walk it.
+    """
+    memo = {}
+    sizes = {}
+    root = _build_inlining_tree(
+        PersistentGraph.from_lists(nodes, edges), memo, sizes, stats
+    )
+    if stats is not None:
+        stats.unique += len(memo)
+        stats.tree_nodes += sizes[id(root)]
+    return root
+
+
+def _build_inlining_tree(
+    graph: PersistentGraph,
+    memo: Dict,
+    sizes: Dict[int, int],
+    stats: Optional[SharingStats],
+) -> InliningTreeNode:
+    if stats is not None:
+        stats.visits += 1
+    if graph in memo:
+        return memo[graph]
+
+    nodes, edges = graph.to_lists()
+    children = []
+    if not graph.edges:
+        tree = InliningTreeLeaf(nodes, edges)
+    elif len(components := graph.components()) > 1:
         # Multiple components: build a ComponentsNode
-        component_trees = []
-        for component_nodes, component_edges in components:
-            subtree = build_inlining_tree(component_nodes, component_edges)
-            component_trees.append(subtree)
-        return InliningTreeComponentsNode(nodes, edges, component_trees)
-
-    # Single component: find partition edge
-    partition_edge = select_partition_edge(nodes, edges)
-    if not partition_edge:
-        return InliningTreeLeaf(nodes, edges)
-
-    # Not inlined subtree
-    not_inlined_nodes, not_inlined_edges = remove_edge(nodes, edges, partition_edge)
-    not_inlined_tree = build_inlining_tree(not_inlined_nodes, not_inlined_edges)
-
-    # Inlined subtree
-    inlined_nodes, inlined_edges = inline_edge(nodes, edges, partition_edge)
-    inlined_tree = build_inlining_tree(inlined_nodes, inlined_edges)
+        children = [_build_inlining_tree(c, memo, sizes, stats) for c in components]
+        tree = InliningTreeComponentsNode(nodes, edges, children)
+    elif not (partition_edge := graph.partition_edge()):
+        tree = InliningTreeLeaf(nodes, edges)
+    else:
+        children = [
+            _build_inlining_tree(graph.remove(partition_edge), memo, sizes, stats),
+            _build_inlining_tree(graph.inline(partition_edge), memo, sizes, stats),
+        ]
+        tree = InliningTreeBinaryNode(nodes, edges, partition_edge, *children)
 
-    return InliningTreeBinaryNode(
-        nodes, edges, partition_edge, not_inlined_tree, inlined_tree
-    )
+    memo[graph] = tree
+    sizes[id(tree)] = 1 + sum(sizes[id(child)] for child in children)
+    return tree
 
 
 def print_inlining_tree(
@@ -387,86 +493,196 @@ def print_inlining_tree(
         print(f"{prefix}{'└── ' if is_last else '├── '}Leaf ({edges_str})")
 
 
-def collect_all_configurations_iterative(
-    root: InliningTreeNode,
-) -> List[Dict]:
+class EdgeIds:
+    """Gives every edge seen during a walk its own bit."""
+
+    def __init__(self):
+        self.bits = {}
+
+    def bit(self, edge: Tuple[str, str]) -> int:
+        if edge not in self.bits:
+            self.bits[edge] = 1 << len(self.bits)
+        return self.bits[edge]
+
+
+class _Options:
     """
-    Traverse the inlining tree iteratively and collect all possible inlining configurations.
-    Each configuration includes a decision for every edge in the original graph.
-    Duplicate configurations are eliminated.
+    The distinct decisions at the leaves of a component, walked lazily and
+    remembered, so they can be replayed for every leaf of the components
+    before it.
     """
-    # Get all edges from the root node to ensure we include all in each config
-    all_edges = root.edges
-    all_configs = set()  # Use a set instead of list to eliminate duplicates
-    stack = [(root, {})]
-
-    while stack:
-        current_node, current_decisions = stack.pop()
-
-        if isinstance(current_node, InliningTreeLeaf):
-            # Create a complete configuration with all edges
-            config = []
-            for edge in sorted(all_edges):  # Sort edges for consistent ordering
-                decision = current_decisions.get(edge, "no-inline")
-                config.append(
-                    {"src": edge[0], "dest": edge[1], "inlined": decision == "inline"}
-                )
-            # Convert config to hashable format (tuple of tuples)
-            hashable_config = tuple((d["src"], d["dest"], d["inlined"]) for d in config)
-            all_configs.add(hashable_config)
-            continue
 
-        elif isinstance(current_node, InliningTreeBinaryNode):
-            partition_edge = current_node.partition_edge
-
-            decisions_not_inlined = copy.deepcopy(current_decisions)
-            decisions_not_inlined[partition_edge] = "no-inline"
-            stack.append((current_node.not_inlined, decisions_not_inlined))
-
-            decisions_inlined = copy.deepcopy(current_decisions)
-            decisions_inlined[partition_edge] = "inline"
-            stack.append((current_node.inlined, decisions_inlined))
-
-        elif isinstance(current_node, InliningTreeComponentsNode):
-            component_configs = []
-            for component in current_node.components:
-                sub_configs = collect_all_configurations_iterative(component)
-                component_configs.append(sub_configs)
-
-            from itertools import product
-
-            for config_tuple in product(*component_configs):
-                # Merge decisions from all components
-                merged_decisions = {}
-                for component_config in config_tuple:
-                    for decision in component_config:
-                        edge = (decision["src"], decision["dest"])
-                        merged_decisions[edge] = (
-                            "inline" if decision["inlined"] else "no-inline"
-                        )
-
-                # Create complete configuration with all edges
-                config = []
-                for edge in all_edges:
-                    decision = merged_decisions.get(edge, "no-inline")
-                    config.append(
-                        {
-                            "src": edge[0],
-                            "dest": edge[1],
-                            "inlined": decision == "inline",
-                        }
-                    )
-                all_configs.add(
-                    tuple((d["src"], d["dest"], d["inlined"]) for d in config)
-                )
+    def __init__(self, graph: PersistentGraph, ids: EdgeIds, keep: int):
+        self.leaves = _walk(graph, ids, 0, 0, keep)
+        self.masks = []
+        self.seen = set()
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        i = 0
+        while True:
+            if i == len(self.masks):
+                if self.leaves is None:
+                    return
+                masks = next(self.leaves, None)
+                if masks is None:
+                    self.leaves = None
+                    return
+                if masks in self.seen:
+                    continue
+                self.seen.add(masks)
+                self.masks.append(masks)
+            yield self.masks[i]
+            i += 1
+
+
+def _walk(
+    graph: PersistentGraph, ids: EdgeIds, decided: int, inlined: int, keep: int
+) -> Iterator[Tuple[int, int]]:
+    # Yields the (decided, inlined) masks on the edges in `keep` at every
+    # leaf under graph. Only the current path is held, plus the distinct
+    # decisions of each component of a split graph that were reached so far.
+    if not graph.edges:
+        yield decided & keep, inlined & keep
+        return
+
+    components = graph.components()
+    if len(components) > 1:
+        options = [_Options(component, ids, keep) for component in components]
+        yield from _combine(options, decided & keep, inlined & keep)
+        return
+
+    partition_edge = graph.partition_edge()
+    if not partition_edge:
+        yield decided & keep, inlined & keep
+        return
+
+    bit = ids.bit(partition_edge)
+    yield from _walk(
+        graph.remove(partition_edge), ids, decided | bit, inlined & ~bit, keep
+    )
+    yield from _walk(
+        graph.inline(partition_edge), ids, decided | bit, inlined | bit, keep
+    )
 
-    # Convert hashable configs back to the original format
+
+def _combine(
+    options: List[_Options], decided: int, inlined: int
+) -> Iterator[Tuple[int, int]]:
+    # the components are independent, so every combination of their
+    # decisions is a leaf; decisions further down override earlier ones
+    if not options:
+        yield decided, inlined
+        return
+    for d, i in options[0]:
+        yield from _combine(options[1:], decided | d, (inlined & ~d) | i)
+
+
+def iter_configurations(
+    nodes: Dict, edges: List[Tuple[str, str]]
+) -> Iterator[Dict[Tuple[str, str], bool]]:
+    """
+    Lazily yield every distinct inlining configuration of the inlining
+    tree of (nodes, edges), as {edge: inlined} over the given edges.
+
+    The tree is never built: each leaf is reached by walking down from the
+    root over persistent graphs, and a configuration is an int bitmask
+    until it is yielded. Only the masks already yielded are remembered, to
+    skip leaves that decide the same original edges the same way.
+    """
+    graph = PersistentGraph.from_lists(nodes, edges)
+    ids = EdgeIds()
+    all_edges = sorted(graph.edges)  # Sort edges for consistent ordering
+    root_bits = [(edge, ids.bit(edge)) for edge in all_edges]
+    root_mask = sum(bit for _, bit in root_bits)
+
+    seen = set()
+    for _, mask in _walk(graph, ids, 0, 0, root_mask):
+        if mask in seen:
+            continue
+        seen.add(mask)
+        yield {edge: bool(mask & bit) for edge, bit in root_bits}
+
+
+def _leaves(
+    graph: PersistentGraph,
+    ids: EdgeIds,
+    keep: int,
+    memo: Dict,
+    sizes: Dict,
+    stats: Optional[SharingStats],
+) -> FrozenSet[Tuple[int, int]]:
+    # The (decided, inlined) masks on the edges in `keep` at every leaf
+    # under graph, for the decisions made below it. They don't depend on
+    # the path to graph, so equal graphs share one result.
+    if stats is not None:
+        stats.visits += 1
+    if graph in memo:
+        return memo[graph]
+
+    children = []
+    if not graph.edges:
+        leaves = frozenset([(0, 0)])
+    elif len(components := graph.components()) > 1:
+        leaves = {(0, 0)}
+        for component in components:
+            children.append(component)
+            options = _leaves(component, ids, keep, memo, sizes, stats)
+            leaves = {
+                (decided | d, inlined | i)
+                for decided, inlined in leaves
+                for d, i in options
+            }
+        leaves = frozenset(leaves)
+    elif not (partition_edge := graph.partition_edge()):
+        leaves = frozenset([(0, 0)])
+    else:
+        bit = ids.bit(partition_edge) & keep
+        leaves = set()
+        for child, value in (
+            (graph.remove(partition_edge), 0),
+            (graph.inline(partition_edge), bit),
+        ):
+            children.append(child)
+            for decided, inlined in _leaves(child, ids, keep, memo, sizes, stats):
+                # decisions further down override this one
+                if not decided & bit:
+                    decided, inlined = decided | bit, inlined | value
+                leaves.add((decided, inlined))
+        leaves = frozenset(leaves)
+
+    memo[graph] = leaves
+    sizes[graph] = 1 + sum(sizes[child] for child in children)
+    return leaves
+
+
+def collect_configurations(
+    nodes: Dict,
+    edges: List[Tuple[str, str]],
+    stats: Optional[SharingStats] = None,
+) -> List[Dict[Tuple[str, str], bool]]:
+    """
+    Every distinct inlining configuration of the inlining tree of (nodes,
+    edges), the same ones iter_configurations yields.
+
+    Each distinct residual graph is solved once and its result shared, so
+    this is much faster when decision orders meet again, at the cost of
+    keeping one result per distinct graph in memory.
+    """
+    graph = PersistentGraph.from_lists(nodes, edges)
+    ids = EdgeIds()
+    all_edges = sorted(graph.edges)  # Sort edges for consistent ordering
+    root_bits = [(edge, ids.bit(edge)) for edge in all_edges]
+    root_mask = sum(bit for _, bit in root_bits)
+
+    memo = {}
+    sizes = {}
+    leaves = _leaves(graph, ids, root_mask, memo, sizes, stats)
+    if stats is not None:
+        stats.unique += len(memo)
+        stats.tree_nodes += sizes[graph]
     return [
-        [
-            {"src": src, "dest": dest, "inlined": inlined}
-            for src, dest, inlined in config
-        ]
-        for config in all_configs
+        {edge: bool(inlined & bit) for edge, bit in root_bits}
+        for inlined in sorted({inlined for _, inlined in leaves})
     ]
 
 
@@ -493,3 +709,35 @@ def get_optimal_instruction_count_inline_config(
             if row["program_name"] == name:
                 return ast.literal_eval(row["best_executed_instr_count_config"])
     return {}
+
+
+if __name__ == "__main__":
+    # usage: python -m utils.inline.optimal
+    # reports how much of each benchmark's inlining tree is shared
+    import os
+
+    from benchmark import read_bril_programs
+    from utils.inline.graph import get_call_graph
+
+    total = SharingStats()
+    for prog in read_bril_programs(os.path.join("..", "benchmarks")):
+        graph = get_call_graph(prog)
+        edges = graph.inlinable_edges()
+        nodes = {
+            name: {"edges": [dest for dest in node["edges"] if (name, dest) in edges]}
+            for name, node in graph.nodes.items()
+        }
+        stats = SharingStats()
+        try:
+            configs = collect_configurations(nodes, edges, stats)
+        except (KeyError, RecursionError) as e:
+            # the clone rule can leave edges to removed nodes, or keep
+            # cloning around a cycle
+            print(f"{prog['name']}: {e.__class__.__name__}")
+            continue
+        total.visits += stats.visits
+        total.unique += stats.unique
+        total.tree_nodes += stats.tree_nodes
+        print(f"{prog['name']}: {len(configs)} configs, {stats}")
+    print()
+    print(f"total: {total}")
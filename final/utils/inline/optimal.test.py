@@ -9,6 +9,9 @@ from utils.inline.optimal import (
     build_inlining_tree,
     InliningTreeLeaf,
     InliningTreeBinaryNode,
+    iter_configurations,
+    collect_configurations,
+    SharingStats,
 )
 
 
@@ -720,5 +723,72 @@ class TestBuildInliningTree(unittest.TestCase):
         self.assertEqual(tree.partition_edge, ("A", "B"))
 
 
+class TestIterConfigurations(unittest.TestCase):
+    def test_no_edges(self):
+        self.assertEqual(list(iter_configurations({"A": {"edges": []}}, [])), [{}])
+
+    def test_line_graph(self):
+        # A->B->C; once A->B is inlined, A->C is a new edge of A
+        nodes = {"A": {"edges": ["B"]}, "B": {"edges": ["C"]}, "C": {"edges": []}}
+        edges = [("A", "B"), ("B", "C")]
+        configs = list(iter_configurations(nodes, edges))
+        self.assertCountEqual(
+            configs,
+            [
+                {("A", "B"): False, ("B", "C"): False},
+                {("A", "B"): False, ("B", "C"): True},
+                {("A", "B"): True, ("B", "C"): False},
+            ],
+        )
+
+    def test_components_combine(self):
+        # A->B and C->D separate
+        nodes = {
+            "A": {"edges": ["B"]},
+            "B": {"edges": []},
+            "C": {"edges": ["D"]},
+            "D": {"edges": []},
+        }
+        edges = [("A", "B"), ("C", "D")]
+        configs = list(iter_configurations(nodes, edges))
+        self.assertEqual(len(configs), 4)
+        self.assertEqual(len({tuple(config.items()) for config in configs}), 4)
+
+    def test_is_lazy(self):
+        # a long chain has a deep tree, but the first config comes at once
+        nodes = {f"f{i}": {"edges": [f"f{i + 1}"]} for i in range(40)}
+        nodes["f40"] = {"edges": []}
+        edges = [(f"f{i}", f"f{i + 1}") for i in range(40)]
+        self.assertEqual(len(next(iter_configurations(nodes, edges))), 40)
+
+
+class TestSharing(unittest.TestCase):
+    def make_graph(self):
+        # A calls B and C, D calls E: inlining A->B then removing D->E
+        # reaches the same graph as the other order
+        nodes = {
+            "A": {"edges": ["B", "C"]},
+            "B": {"edges": ["C"]},
+            "C": {"edges": []},
+            "D": {"edges": ["E"]},
+            "E": {"edges": ["C"]},
+        }
+        edges = [("A", "B"), ("A", "C"), ("B", "C"), ("D", "E"), ("E", "C")]
+        return nodes, edges
+
+    def test_tree_shares_equal_subtrees(self):
+        stats = SharingStats()
+        build_inlining_tree(*self.make_graph(), stats)
+        self.assertLess(stats.unique, stats.tree_nodes)
+        self.assertGreater(stats.visits, stats.unique)
+
+    def test_collect_matches_iter(self):
+        nodes, edges = self.make_graph()
+        stats = SharingStats()
+        collected = collect_configurations(nodes, edges, stats)
+        self.assertCountEqual(collected, list(iter_configurations(nodes, edges)))
+        self.assertGreater(stats.visits, stats.unique)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,173 @@
+"""
+Profile-guided inlining.
+
+`instrument` adds a probe to the start of every basic block that prints a
+tag and the block's number, so running the instrumented program with
+brili counts how often each block, and so each call site, executes.
+`collect_profile` does that for a program and its `# ARGS:`.
+
+Profiles are stored as utils/inline/profiles/<program>.json:
+    {
+        "program": "fib.bril",
+        "args": ["10"],
+        "blocks": {"main": {"b0": 1, "for.cond": 11, ...}, ...},
+        "calls": [{"caller": "main", "callee": "fib", "index": 7,
+                   "count": 10}, ...],
+    }
+where "index" is the call's position in the caller's instrs.
+
+Run `python generate_pgo_profiles.py` from the final directory to profile
+every benchmark, then `python inline.py pgo GROWTH` inlines the hottest
+call edges first while the program stays under GROWTH times its size.
+"""
+
+import json
+import subprocess
+from copy import deepcopy
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from utils.inline.cost_model import get_cost_model, predict
+from utils.inline.graph import get_call_graph
+
+TERMINATORS = ["jmp", "br", "ret"]
+PROBE_TAG = 7340087205  # printed before the block number by every probe
+
+profiles_path = Path(__file__).parent / "profiles"
+
+
+def get_block_starts(fn: Dict) -> List[Tuple[int, str]]:
+    """
+    (index, name) of each basic block of fn, where index is the position
+    of its first instruction after any label. Blocks without a label are
+    named b<i>, as in utils.legacy.cfg.
+    """
+    starts = []
+    start_of_block = True
+    for i, instr in enumerate(fn["instrs"]):
+        if "label" in instr:
+            starts.append((i + 1, instr["label"]))
+            start_of_block = False
+            continue
+        if start_of_block:
+            starts.append((i, f"b{len(starts)}"))
+            start_of_block = False
+        if instr.get("op") in TERMINATORS:
+            start_of_block = True
+    if not starts:
+        starts.append((0, "b0"))
+    return starts
+
+
+def instrument(prog: Dict) -> Tuple[Dict, List[Tuple[str, str, int, int]]]:
+    """
+    Returns the instrumented program and, for every probe, the function,
+    block name, index of its first instruction and index after its last.
+    """
+    prog = deepcopy(prog)
+    probes = []
+    for fn in prog["functions"]:
+        starts = get_block_starts(fn)
+        ends = [i for i, _ in starts[1:]] + [len(fn["instrs"])]
+        instrs = fn["instrs"]
+        new_instrs = instrs[: starts[0][0]]
+        for (start, name), end in zip(starts, ends):
+            new_instrs += [
+                {"op": "const", "dest": "__pgo_tag", "type": "int", "value": PROBE_TAG},
+                {"op": "const", "dest": "__pgo_block", "type": "int", "value": len(probes)},
+                {"op": "print", "args": ["__pgo_tag", "__pgo_block"]},
+            ]  # fmt: skip
+            new_instrs += instrs[start:end]
+            probes.append((fn["name"], name, start, end))
+        fn["instrs"] = new_instrs
+    return prog, probes
+
+
+def collect_profile(prog: Dict) -> Dict:
+    """Run prog with its "args" and count block and call site executions."""
+    instrumented, probes = instrument(prog)
+    result = subprocess.run(
+        ["brili"] + prog.get("args", []),
+        input=json.dumps(instrumented),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    counts = [0] * len(probes)
+    tag = str(PROBE_TAG)
+    for line in result.stdout.splitlines():
+        fields = line.split()
+        if len(fields) == 2 and fields[0] == tag:
+            counts[int(fields[1])] += 1
+
+    blocks = {fn["name"]: {} for fn in prog["functions"]}
+    calls = []
+    instrs = {fn["name"]: fn["instrs"] for fn in prog["functions"]}
+    for (fn_name, name, start, end), n in zip(probes, counts):
+        blocks[fn_name][name] = n
+        for i in range(start, end):
+            instr = instrs[fn_name][i]
+            if instr.get("op") == "call":
+                calls.append(
+                    {
+                        "caller": fn_name,
+                        "callee": instr["funcs"][0],
+                        "index": i,
+                        "count": n,
+                    }
+                )
+
+    return {
+        "program": prog.get("name"),
+        "args": prog.get("args", []),
+        "blocks": blocks,
+        "calls": calls,
+    }
+
+
+def read_profile(name: str) -> Optional[Dict]:
+    """The stored profile of the program, or None if it was never profiled."""
+    path = profiles_path / f"{name}.json"
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_profile(profile: Dict):
+    profiles_path.mkdir(exist_ok=True)
+    with open(profiles_path / f"{profile['program']}.json", "w") as f:
+        json.dump(profile, f, indent=2)
+
+
+def get_pgo_inline_config(
+    prog: Dict, growth: str, name: str
+) -> Dict[Tuple[str, str], bool]:
+    """
+    Inline call edges from the most to the least executed, skipping edges
+    that never ran, as long as the cost model predicts the program stays
+    under growth times its size. Without a profile nothing is inlined.
+    """
+    profile = read_profile(name)
+    if profile is None:
+        return {}
+    graph = get_call_graph(prog)
+
+    edge_counts = {}
+    for call in profile["calls"]:
+        edge = (call["caller"], call["callee"])
+        edge_counts[edge] = edge_counts.get(edge, 0) + call["count"]
+
+    model = get_cost_model(deepcopy(prog))
+    budget = (float(growth) - 1) * sum(model["sizes"].values())
+
+    config = {}
+    hot = sorted(
+        (edge for edge in graph.inlinable_edges() if edge_counts.get(edge, 0) > 0),
+        key=lambda edge: (-edge_counts[edge], edge),
+    )
+    for edge in hot:
+        config[edge] = True
+        if predict(model, config)["size"] > budget:
+            del config[edge]
+    return config
@@ -0,0 +1,83 @@
+import unittest
+from utils.inline.pgo import (
+    PROBE_TAG,
+    get_block_starts,
+    get_pgo_inline_config,
+    instrument,
+)
+
+
+def probe_blocks(instrs):
+    # the block number printed by each probe, in order
+    return [
+        instr["value"] for instr in instrs if instr.get("dest") == "__pgo_block"
+    ]
+
+
+class TestGetBlockStarts(unittest.TestCase):
+    def test_empty_function(self):
+        self.assertEqual(get_block_starts({"instrs": []}), [(0, "b0")])
+
+    def test_labels_and_terminators(self):
+        fn = {
+            "instrs": [
+                {"op": "const", "dest": "c", "type": "bool", "value": True},
+                {"op": "br", "args": ["c"], "labels": ["then", "else"]},
+                {"label": "then"},
+                {"op": "jmp", "labels": ["else"]},
+                {"op": "nop"},
+                {"label": "else"},
+                {"op": "ret"},
+            ]
+        }
+        self.assertEqual(
+            get_block_starts(fn), [(0, "b0"), (3, "then"), (4, "b2"), (6, "else")]
+        )
+
+    def test_entry_label(self):
+        fn = {"instrs": [{"label": "loop"}, {"op": "jmp", "labels": ["loop"]}]}
+        self.assertEqual(get_block_starts(fn), [(1, "loop")])
+
+
+class TestInstrument(unittest.TestCase):
+    def test_probes_follow_labels(self):
+        prog = {
+            "functions": [
+                {
+                    "name": "main",
+                    "instrs": [
+                        {"label": "start"},
+                        {"op": "call", "funcs": ["f"]},
+                        {"label": "end"},
+                    ],
+                },
+                {"name": "f", "instrs": []},
+            ]
+        }
+        instrumented, probes = instrument(prog)
+        main, f = instrumented["functions"]
+        self.assertEqual(main["instrs"][0], {"label": "start"})
+        self.assertEqual(main["instrs"][1]["value"], PROBE_TAG)
+        self.assertEqual(main["instrs"][-4], {"label": "end"})
+        self.assertEqual(probe_blocks(main["instrs"]), [0, 1])
+        self.assertEqual(probe_blocks(f["instrs"]), [2])
+        self.assertEqual(
+            probes, [("main", "start", 1, 3), ("main", "end", 3, 3), ("f", "b0", 0, 0)]
+        )
+        # the original program is left alone
+        self.assertEqual(len(prog["functions"][0]["instrs"]), 3)
+
+
+class TestGetPgoInlineConfig(unittest.TestCase):
+    def test_missing_profile(self):
+        prog = {
+            "functions": [
+                {"name": "main", "instrs": [{"op": "call", "funcs": ["f"]}]},
+                {"name": "f", "instrs": []},
+            ]
+        }
+        self.assertEqual(get_pgo_inline_config(prog, "1.5", "missing.bril"), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
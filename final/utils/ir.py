@@ -0,0 +1,315 @@
+"""
+A compact in-memory form of Bril programs.
+
+Instructions are `__slots__` objects with an integer opcode and interned
+variable names, grouped into functions and, on demand, blocks. `from_json`
+and `to_json` convert losslessly (keys, key order and unknown fields are
+kept, so dumping the result gives the same text).
+
+Instr also answers the dict operations passes use on JSON instructions
+(`instr["op"]`, `"dest" in instr`, `instr.get("args", [])`, item
+assignment), so a pass written against JSON can run on IR instructions
+unchanged while it is migrated.
+"""
+
+import sys
+from enum import IntEnum
+
+from utils.profiling import count, traced
+
+OPCODES = [
+    # core
+    "const", "add", "mul", "sub", "div",
+    "eq", "lt", "gt", "le", "ge",
+    "not", "and", "or",
+    "jmp", "br", "call", "ret",
+    "id", "print", "nop",
+    # ssa
+    "phi", "set", "get", "undef",
+    # memory
+    "alloc", "free", "store", "load", "ptradd",
+    # float
+    "fadd", "fmul", "fsub", "fdiv",
+    "feq", "flt", "fle", "fgt", "fge",
+    # char
+    "ceq", "clt", "cle", "cgt", "cge", "char2int", "int2char",
+    # bit casts
+    "float2bits", "bits2float",
+    # speculation
+    "speculate", "commit", "guard",
+]  # fmt: skip
+
+# opcodes outside OPCODES (e.g. from extensions) are kept as their names
+Op = IntEnum("Op", {name.upper(): i for i, name in enumerate(OPCODES)})
+OP_BY_NAME = {name: Op(i) for i, name in enumerate(OPCODES)}
+
+TERMINATORS = {Op.JMP, Op.BR, Op.RET}
+
+MISSING = object()  # a field that is absent from the JSON
+
+FIELDS = ("label", "op", "dest", "type", "args", "funcs", "labels", "value")
+LIST_FIELDS = {"args", "funcs", "labels"}
+
+_key_orders = {}
+
+
+def _shared_order(keys):
+    # instructions mostly share a handful of key orders; keep one copy each
+    keys = tuple(keys)
+    return _key_orders.setdefault(keys, keys)
+
+
+class Instr:
+    __slots__ = FIELDS + ("extra", "order")
+
+    def __init__(self, op=None, dest=None, type=MISSING, args=(), **fields):
+        self.order = ()
+        self.label = fields.pop("label", None)
+        self.op = op
+        self.dest = dest
+        self.type = type
+        self.args = tuple(args) or None
+        self.funcs = tuple(fields.pop("funcs", ())) or None
+        self.labels = tuple(fields.pop("labels", ())) or None
+        self.value = fields.pop("value", MISSING)
+        self.extra = fields or None
+        keys = ["label"] if self.label is not None else ["op"]
+        keys += [k for k in FIELDS[2:] if self._has(k)]
+        self.order = _shared_order(keys + list(fields))
+
+    @staticmethod
+    def from_json(instr):
+        new = Instr.__new__(Instr)
+        new.label = new.op = new.dest = None
+        new.type = new.value = MISSING
+        new.args = new.funcs = new.labels = None
+        extra = None
+        for key, value in instr.items():
+            if key == "op":
+                new.op = OP_BY_NAME.get(value, value)
+            elif key in ("dest", "label"):
+                setattr(new, key, sys.intern(value))
+            elif key in LIST_FIELDS:
+                setattr(new, key, tuple(sys.intern(v) for v in value))
+            elif key == "type":
+                new.type = sys.intern(value) if isinstance(value, str) else value
+            elif key == "value":
+                new.value = value
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        new.extra = extra
+        new.order = _shared_order(instr.keys())
+        return new
+
+    def to_json(self):
+        return {key: self[key] for key in self.order}
+
+    def is_label(self):
+        return self.label is not None
+
+    def is_terminator(self):
+        return self.op in TERMINATORS
+
+    def uses(self):
+        return self.args or ()
+
+    # dict-style access, for passes that still expect JSON instructions.
+    # List fields come back as fresh lists, so change them by assigning.
+
+    def _has(self, key):
+        if key in LIST_FIELDS:
+            return getattr(self, key) is not None
+        if key in ("type", "value"):
+            return getattr(self, key) is not MISSING
+        if key in ("op", "dest", "label"):
+            return getattr(self, key) is not None
+        return self.extra is not None and key in self.extra
+
+    def __contains__(self, key):
+        return self._has(key)
+
+    def __getitem__(self, key):
+        if not self._has(key):
+            raise KeyError(key)
+        if key == "op":
+            return OPCODES[self.op] if isinstance(self.op, Op) else self.op
+        if key in LIST_FIELDS:
+            return list(getattr(self, key))
+        if key in FIELDS:
+            return getattr(self, key)
+        return self.extra[key]
+
+    def get(self, key, default=None):
+        return self[key] if self._has(key) else default
+
+    def __setitem__(self, key, value):
+        if key == "op":
+            value = OP_BY_NAME.get(value, value)
+        elif key in ("dest", "label"):
+            value = sys.intern(value)
+        elif key in LIST_FIELDS:
+            value = tuple(sys.intern(v) for v in value)
+        if key in FIELDS:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+        if key not in self.order:
+            self.order = _shared_order(self.order + (key,))
+
+    def __delitem__(self, key):
+        if not self._has(key):
+            raise KeyError(key)
+        if key in LIST_FIELDS:
+            setattr(self, key, None)
+        elif key in ("type", "value"):
+            setattr(self, key, MISSING)
+        elif key in FIELDS:
+            setattr(self, key, None)
+        else:
+            del self.extra[key]
+        self.order = _shared_order(k for k in self.order if k != key)
+
+    def __repr__(self):
+        return f"Instr({self.to_json()!r})"
+
+
+class Function:
+    __slots__ = ("name", "args", "type", "instrs", "extra", "order")
+
+    @staticmethod
+    def from_json(fn):
+        new = Function.__new__(Function)
+        new.name = fn["name"]
+        new.args = fn.get("args", MISSING)
+        new.type = fn.get("type", MISSING)
+        new.instrs = [Instr.from_json(instr) for instr in fn.get("instrs", [])]
+        known = ("name", "args", "type", "instrs")
+        new.extra = {k: v for k, v in fn.items() if k not in known} or None
+        new.order = tuple(fn.keys())
+        return new
+
+    def to_json(self):
+        fn = {}
+        for key in self.order:
+            if key == "instrs":
+                fn[key] = [instr.to_json() for instr in self.instrs]
+            elif key in ("name", "args", "type"):
+                fn[key] = getattr(self, key)
+            else:
+                fn[key] = self.extra[key]
+        return fn
+
+
+class Program:
+    __slots__ = ("functions", "extra", "order")
+
+    def to_json(self):
+        prog = {}
+        for key in self.order:
+            if key == "functions":
+                prog[key] = [fn.to_json() for fn in self.functions]
+            else:
+                prog[key] = self.extra[key]
+        return prog
+
+
+def from_json(prog):
+    new = Program.__new__(Program)
+    new.functions = [Function.from_json(fn) for fn in prog["functions"]]
+    new.extra = {k: v for k, v in prog.items() if k != "functions"} or None
+    new.order = tuple(prog.keys())
+    return new
+
+
+def to_json(prog):
+    return prog.to_json()
+
+
+class Block:
+    __slots__ = ("id", "label", "instrs", "preds", "succs")
+
+    def __init__(self, id, label, instrs):
+        self.id = id
+        self.label = label
+        self.instrs = instrs
+        self.preds = []
+        self.succs = []
+
+
+@traced("form_blocks")
+def form_blocks(fn):
+    """
+    Split a Function into Blocks, with `preds` and `succs` as lists of
+    block ids, the same way utils.legacy.form_blocks splits JSON functions.
+    """
+    blocks = []
+    cur_instrs = []
+    label = None
+    for instr in fn.instrs:
+        if instr.label is not None:
+            if cur_instrs:
+                blocks.append(Block(len(blocks), label, cur_instrs))
+            cur_instrs = [instr]
+            label = instr.label
+        else:
+            cur_instrs.append(instr)
+            if instr.op in TERMINATORS:
+                blocks.append(Block(len(blocks), label, cur_instrs))
+                cur_instrs = []
+                label = None
+    if cur_instrs:
+        blocks.append(Block(len(blocks), label, cur_instrs))
+
+    by_label = {}
+    for block in blocks:
+        if block.label is not None:
+            by_label.setdefault(block.label, block.id)
+
+    for block in blocks:
+        last = block.instrs[-1]
+        if last.op in (Op.JMP, Op.BR):
+            targets = [by_label[l] for l in last.labels or () if l in by_label]
+        elif last.op == Op.RET or block.id + 1 == len(blocks):
+            targets = []
+        else:
+            targets = [block.id + 1]
+        for target in targets:
+            block.succs.append(target)
+            blocks[target].preds.append(block.id)
+    return blocks
+
+
+@traced("backward dataflow")
+def backward(blocks, transfer, exit_value):
+    """
+    Solve a backward dataflow problem whose meet is set union. `transfer`
+    maps (block, out) to the block's in value. Returns (ins, outs).
+    """
+    ins = [set() for _ in blocks]
+    outs = [set() for _ in blocks]
+    worklist = list(range(len(blocks)))
+    queued = set(worklist)
+    while worklist:
+        count("worklist iterations")
+        i = worklist.pop()
+        queued.discard(i)
+        block = blocks[i]
+        if block.succs:
+            out = set()
+            for succ in block.succs:
+                out |= ins[succ]
+        else:
+            out = set(exit_value)
+        outs[i] = out
+        new_in = transfer(block, out)
+        if new_in != ins[i]:
+            ins[i] = new_in
+            for pred in block.preds:
+                if pred not in queued:
+                    queued.add(pred)
+                    worklist.append(pred)
+    return ins, outs
@@ -0,0 +1,73 @@
+import json
+import unittest
+from utils.ir import Instr, Op, form_blocks, from_json, to_json
+
+
+def program(instrs, **fields):
+    return {"functions": [{"name": "main", "instrs": instrs, **fields}]}
+
+
+class TestRoundTrip(unittest.TestCase):
+    def test_keeps_key_order_and_unknown_fields(self):
+        prog = program(
+            [
+                {"dest": "a", "op": "const", "type": "int", "value": 1},
+                {"label": "l", "pos": {"row": 3, "col": 1}},
+                {"op": "print", "args": ["a"]},
+                {"op": "ret", "args": []},
+            ],
+            args=[],
+        )
+        self.assertEqual(json.dumps(to_json(from_json(prog))), json.dumps(prog))
+
+    def test_keeps_unknown_opcodes(self):
+        prog = program([{"op": "getmbr", "dest": "x", "args": ["s", "f"]}])
+        new = from_json(prog)
+        self.assertEqual(new.functions[0].instrs[0].op, "getmbr")
+        self.assertEqual(to_json(new), prog)
+
+
+class TestDictAccess(unittest.TestCase):
+    def test_reads_like_json(self):
+        instr = Instr.from_json(
+            {"op": "add", "dest": "c", "type": "int", "args": ["a", "b"]}
+        )
+        self.assertEqual(instr.op, Op.ADD)
+        self.assertEqual(instr["op"], "add")
+        self.assertEqual(instr.get("args", []), ["a", "b"])
+        self.assertNotIn("value", instr)
+        self.assertIsNone(instr.get("labels"))
+
+    def test_writes_like_json(self):
+        instr = Instr.from_json(
+            {"op": "add", "dest": "c", "type": "int", "args": ["a", "b"]}
+        )
+        instr["op"] = "id"
+        instr["args"] = ["a"]
+        instr["state"] = 1
+        del instr["type"]
+        self.assertEqual(
+            instr.to_json(), {"op": "id", "dest": "c", "args": ["a"], "state": 1}
+        )
+
+
+class TestFormBlocks(unittest.TestCase):
+    def test_edges(self):
+        prog = from_json(
+            program(
+                [
+                    {"op": "br", "args": ["c"], "labels": ["then", "end"]},
+                    {"label": "then"},
+                    {"op": "jmp", "labels": ["end"]},
+                    {"label": "end"},
+                    {"op": "ret"},
+                ]
+            )
+        )
+        blocks = form_blocks(prog.functions[0])
+        self.assertEqual([b.succs for b in blocks], [[1, 2], [2], []])
+        self.assertEqual([b.preds for b in blocks], [[], [0], [0, 1]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,5 @@
 from utils.legacy.form_blocks import form_blocks
+from utils.profiling import count, span
 
 
 def print_df(blocks, ins, outs):
@@ -19,15 +20,21 @@ def forward_df(fn, f, meet, initial_value={}, print_result=False):
         ins.append(initial_value)
         outs.append(initial_value)
 
-    while len(q) > 0:
-        id = q.pop()
-        block = blocks[id]
-        ins[id] = meet([outs[p] for p in block["predecessors"]])
-        original_outs = outs[id].copy()
-        outs[id] = f(block, ins[id])
-        if outs[id] != original_outs:
-            for succ in block["successors"]:
-                q.add(succ)
+    with span("forward dataflow"):
+        while len(q) > 0:
+            count("worklist iterations")
+            id = q.pop()
+            block = blocks[id]
+            preds = [outs[p] for p in block["predecessors"]]
+            if id == 0:
+                # the entry block is also reached from the function's callers
+                preds.append(initial_value)
+            ins[id] = meet(preds)
+            original_outs = outs[id].copy()
+            outs[id] = f(block, ins[id])
+            if outs[id] != original_outs:
+                for succ in block["successors"]:
+                    q.add(succ)
 
     if print_result:
         print_df(blocks, ins, outs)
@@ -42,15 +49,17 @@ def backward_df(fn, f, meet, initial_value={}, print_result=False):
         ins.append(initial_value)
         outs.append(initial_value)
 
-    while len(q) > 0:
-        id = q.pop()
-        block = blocks[id]
-        outs[id] = meet([ins[p] for p in block["successors"]])
-        original_ins = ins[id].copy()
-        ins[id] = f(block, outs[id])
-        if ins[id] != original_ins:
-            for pred in block["predecessors"]:
-                q.add(pred)
+    with span("backward dataflow"):
+        while len(q) > 0:
+            count("worklist iterations")
+            id = q.pop()
+            block = blocks[id]
+            outs[id] = meet([ins[p] for p in block["successors"]])
+            original_ins = ins[id].copy()
+            ins[id] = f(block, outs[id])
+            if ins[id] != original_ins:
+                for pred in block["predecessors"]:
+                    q.add(pred)
 
     if print_result:
         print_df(blocks, ins, outs)
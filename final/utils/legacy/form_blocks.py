@@ -1,9 +1,12 @@
 import uuid
 
+from utils.profiling import traced
+
 
 TERMINATORS = {"br", "jmp", "ret"}
 
 
+@traced("form_blocks")
 def form_blocks(fn):
     blocks = []
     cur_instrs = []
@@ -10,19 +10,20 @@ def is_br(instr):
     return "op" in instr and instr["op"] == "br"
 
 
-def postorder_rec(cfg, block, visited, result):
-    if block["name"] in visited:
-        return
-    visited.add(block["name"])
-
-    for succ in block["succs"]:
-        postorder_rec(cfg, cfg[succ], visited, result)
-    result.append(block)
-
-
 def postorder(cfg, block):
     out = []
-    postorder_rec(cfg, block, set(), out)
+    visited = {block["name"]}
+    stack = [(block, iter(block["succs"]))]
+    while stack:
+        current, succs = stack[-1]
+        for succ in succs:
+            if succ not in visited:
+                visited.add(succ)
+                stack.append((cfg[succ], iter(cfg[succ]["succs"])))
+                break
+        else:
+            stack.pop()
+            out.append(current)
     return out
 
 
@@ -30,7 +31,7 @@ def get_dominators(cfg, blocks, strict=False):
     if len(blocks) == 0:
         return {}
     dom = {}
-    iter_blocks = reversed(postorder(cfg, blocks[0]))
+    iter_blocks = list(reversed(postorder(cfg, blocks[0])))
     while True:
         has_changed = False
         for block in iter_blocks:
@@ -68,8 +69,48 @@ def get_dominators(cfg, blocks, strict=False):
     return dom
 
 
-def get_backedges(cfg, blocks):
-    doms = get_dominators(cfg, blocks)
+def get_immediate_dominators(cfg, blocks):
+    """
+    Compute immediate dominators with the Cooper-Harvey-Kennedy algorithm.
+    Returns a dict mapping each reachable block to its immediate dominator,
+    with None for the entry.
+    """
+    if len(blocks) == 0:
+        return {}
+    rpo = [block["name"] for block in reversed(postorder(cfg, blocks[0]))]
+    index = {name: i for i, name in enumerate(rpo)}
+    idom = {rpo[0]: rpo[0]}
+
+    def intersect(a, b):
+        while a != b:
+            while index[a] > index[b]:
+                a = idom[a]
+            while index[b] > index[a]:
+                b = idom[b]
+        return a
+
+    changed = True
+    while changed:
+        changed = False
+        for block_name in rpo[1:]:
+            new_idom = None
+            for pred_name in cfg[block_name]["preds"]:
+                if pred_name in idom:
+                    if new_idom is None:
+                        new_idom = pred_name
+                    else:
+                        new_idom = intersect(pred_name, new_idom)
+            if idom.get(block_name) != new_idom:
+                idom[block_name] = new_idom
+                changed = True
+
+    idom[rpo[0]] = None
+    return idom
+
+
+def get_backedges(cfg, blocks, doms=None):
+    if doms is None:
+        doms = get_dominators(cfg, blocks)
     backedges = []
     for block in blocks:
         block_name = block["name"]
@@ -79,44 +120,102 @@ def get_backedges(cfg, blocks):
     return backedges
 
 
-def can_reach_latch_without_header(cfg, blocks, current, visited, latch, header):
-    if current == header:
-        return False
-    if current == latch:
-        return True
-    visited.add(current)
-    for succ in cfg[current]["succs"]:
-        if succ not in visited:
-            if can_reach_latch_without_header(
-                cfg, blocks, succ, visited, latch, header
-            ):
-                return True
-    return False
+def get_loop_body(cfg, header, latches, doms):
+    # walk backwards from the latches; the header stops the walk since it
+    # dominates every block of the loop
+    body = {header}
+    worklist = []
+    for latch in latches:
+        if latch not in body:
+            body.add(latch)
+            worklist.append(latch)
+    while worklist:
+        block_name = worklist.pop()
+        for pred_name in cfg[block_name]["preds"]:
+            # skip blocks that are unreachable from the entry
+            if pred_name not in body and len(doms[pred_name]) > 0:
+                body.add(pred_name)
+                worklist.append(pred_name)
+    return body
+
+
+def get_loop_forest(cfg, blocks, doms=None):
+    """
+    Find the natural loops of a CFG and arrange them in a nesting forest.
+
+    Back edges sharing a header are merged into a single loop. Each loop is a
+    dict with the keys "header", "latches", "latch" (the latch if there is
+    only one, otherwise None), "blocks" (header first, then function order),
+    "exits" (blocks outside the loop reached from inside it), "preheader",
+    "parent" (header of the enclosing loop or None), "children" (headers of
+    the directly nested loops) and "depth" (1 for outermost loops).
+
+    Returns a dict mapping each loop header to its loop, in function order.
+    """
+    if doms is None:
+        doms = get_dominators(cfg, blocks)
+    order = {block["name"]: i for i, block in enumerate(blocks)}
+
+    latches = {}  # key: header, value: list of latches
+    for latch, header in get_backedges(cfg, blocks, doms):
+        latches.setdefault(header, []).append(latch)
+
+    loops = {}
+    for header in sorted(latches, key=order.get):
+        body = get_loop_body(cfg, header, latches[header], doms)
+        exits = {
+            succ
+            for block_name in body
+            for succ in cfg[block_name]["succs"]
+            if succ not in body
+        }
+        outside_preds = [
+            pred for pred in cfg[header]["preds"] if pred not in body
+        ]
+        preheader = None
+        if len(outside_preds) == 1 and cfg[outside_preds[0]]["succs"] == [header]:
+            preheader = outside_preds[0]
+
+        loops[header] = {
+            "header": header,
+            "latches": latches[header],
+            "latch": latches[header][0] if len(latches[header]) == 1 else None,
+            "blocks": [header]
+            + sorted((b for b in body if b != header), key=order.get),
+            "exits": sorted(exits, key=order.get),
+            "preheader": preheader,
+            "parent": None,
+            "children": [],
+            "depth": 1,
+        }
+
+    # visit loops from the largest to the smallest, so the last loop that
+    # claimed a header is the innermost loop enclosing it
+    innermost = {}  # key: block name, value: header of innermost loop
+    for loop in sorted(loops.values(), key=lambda loop: -len(loop["blocks"])):
+        parent = innermost.get(loop["header"])
+        if parent is not None:
+            loop["parent"] = parent
+            loop["depth"] = loops[parent]["depth"] + 1
+            loops[parent]["children"].append(loop["header"])
+        for block_name in loop["blocks"]:
+            innermost[block_name] = loop["header"]
+
+    return loops
+
+
+def innermost_first(loops):
+    return sorted(loops.values(), key=lambda loop: -loop["depth"])
+
+
+def get_loop_depths(blocks, loops):
+    depths = {block["name"]: 0 for block in blocks}
+    for loop in sorted(loops.values(), key=lambda loop: loop["depth"]):
+        for block_name in loop["blocks"]:
+            depths[block_name] = loop["depth"]
+    return depths
 
 
 def get_natural_loops(fn):
     cfg, blocks = form_blocks(fn)
-    backedges = get_backedges(cfg, blocks)
-
-    loops = []
-    for latch, header in backedges:
-        loop = {
-            "header": header,
-            "latch": latch,
-            "blocks": [header],
-            "preheader": None,
-        }
-        for block in blocks:
-            if can_reach_latch_without_header(
-                cfg, blocks, block["name"], set(), latch, header
-            ):
-                loop["blocks"].append(block["name"])
-
-        header_block = cfg[header]
-        if len(header_block["preds"]) == 2:  # latch and preheader
-            loop["preheader"] = next(
-                pred for pred in header_block["preds"] if pred != latch
-            )
-
-        loops.append(loop)
-    return loops
+    return list(get_loop_forest(cfg, blocks).values())
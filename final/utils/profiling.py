@@ -0,0 +1,179 @@
+"""
+Profiling hooks for the pass scripts, off unless BRIL_PROFILE is set.
+
+BRIL_PROFILE names a trace file. Every process appends its events to it
+in Chrome's trace array format, so the file from a whole brench sweep can
+be opened directly in chrome://tracing or https://ui.perfetto.dev. With
+BRIL_PROFILE_MEMORY=1 each event also records the bytes allocated and the
+peak traced memory inside it (tracemalloc makes everything slower, so
+wall times from such runs are not comparable).
+
+    with span("read json"): ...          # time a region
+    with pass_span("lvn", fn): ...        # also count fn's instructions
+    @traced("form_blocks")                # time every call of a function
+    count("worklist iterations")          # add to the innermost span
+
+`python utils/profiling.py TRACE` prints the totals per event name.
+"""
+
+import atexit
+import json
+import os
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+TRACE_FILE = os.environ.get("BRIL_PROFILE")
+TRACE_MEMORY = os.environ.get("BRIL_PROFILE_MEMORY") == "1" and TRACE_FILE is not None
+
+_events = None  # None when profiling is off
+_frames = []  # open spans, innermost last
+
+
+def enabled():
+    return _events is not None
+
+
+def count(name, n=1):
+    if _frames:
+        counters = _frames[-1]["counters"]
+        counters[name] = counters.get(name, 0) + n
+
+
+@contextmanager
+def span(name, **args):
+    if _events is None:
+        yield
+        return
+
+    frame = {"counters": {}, "peak": 0}
+    if TRACE_MEMORY:
+        # the peak is reset for this span; hand the old one to the parent
+        if _frames:
+            parent = _frames[-1]
+            parent["peak"] = max(parent["peak"], tracemalloc.get_traced_memory()[1])
+        frame["memory"] = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    _frames.append(frame)
+    ts = time.time_ns() // 1000
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        dur = (time.perf_counter_ns() - start) / 1000
+        _frames.pop()
+        args.update(frame["counters"])
+        if _frames:
+            # counters also add up in the enclosing spans
+            for counter, n in frame["counters"].items():
+                count(counter, n)
+        if TRACE_MEMORY:
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, frame["peak"])
+            args["allocated bytes"] = current - frame["memory"]
+            args["peak bytes"] = peak - frame["memory"]
+            if _frames:
+                _frames[-1]["peak"] = max(_frames[-1]["peak"], peak)
+        _events.append(
+            {
+                "name": name,
+                "ph": "X",
+                "ts": ts,
+                "dur": dur,
+                "pid": os.getpid(),
+                "tid": 0,
+                "args": args,
+            }
+        )
+
+
+def _size(fn):
+    # JSON functions and utils.ir Functions
+    return len(fn.instrs) if hasattr(fn, "instrs") else len(fn.get("instrs", []))
+
+
+@contextmanager
+def pass_span(name, fn):
+    """A span for running one pass on one function."""
+    if _events is None:
+        yield
+        return
+
+    fn_name = fn.name if hasattr(fn, "name") else fn["name"]
+    with span(name, function=fn_name, **{"instrs before": _size(fn)}):
+        yield
+    # the span's own event is the last one recorded
+    _events[-1]["args"]["instrs after"] = _size(fn)
+
+
+def traced(name):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _events is None:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _flush():
+    process = {
+        "name": "process_name",
+        "ph": "M",
+        "pid": os.getpid(),
+        "args": {"name": " ".join(sys.argv)},
+    }
+    lines = [json.dumps(event) for event in [process] + _events]
+    # one write per process, so concurrent processes append whole lines
+    fd = os.open(TRACE_FILE, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        head = "[\n" if os.fstat(fd).st_size == 0 else ""
+        os.write(fd, (head + ",\n".join(lines) + ",\n").encode())
+    finally:
+        os.close(fd)
+
+
+if TRACE_FILE is not None:
+    _events = []
+    if TRACE_MEMORY:
+        tracemalloc.start()
+    atexit.register(_flush)
+
+
+def load_trace(path):
+    # the array may be left open and end with a comma
+    with open(path) as f:
+        text = f.read().rstrip().rstrip(",")
+    if not text.endswith("]"):
+        text += "]"
+    return json.loads(text)
+
+
+if __name__ == "__main__":
+    # usage: python utils/profiling.py TRACE
+    totals = defaultdict(lambda: defaultdict(float))
+    for event in load_trace(sys.argv[1]):
+        if event["ph"] != "X":
+            continue
+        total = totals[event["name"]]
+        total["calls"] += 1
+        total["ms"] += event["dur"] / 1000
+        for key, value in event["args"].items():
+            if isinstance(value, (int, float)):
+                total[key] += value
+
+    for name, total in sorted(totals.items(), key=lambda item: -item[1]["ms"]):
+        rest = ", ".join(
+            f"{key}: {value:g}"
+            for key, value in total.items()
+            if key not in ("calls", "ms")
+        )
+        line = f"{name}: {total['calls']:g} calls, {total['ms']:.1f} ms"
+        print(f"{line}, {rest}" if rest else line)
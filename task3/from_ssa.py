@@ -1,44 +1,266 @@
 from collections import defaultdict
 import json
 import sys
-from utils.cfg import convert_blocks_to_fn, form_blocks
+from utils.analysis import AnalysisManager, cfg_analysis, loop_forest_analysis
+from utils.cfg import convert_blocks_to_fn
+from utils.loop import get_loop_depths
 
 TERMINATORS = {"br", "jmp", "ret"}
 
 
-def from_ssa(fn):
-    _, blocks = form_blocks(fn)
+def get_edge_copies(blocks):
+    """
+    Remove the phis and return the parallel copies they stand for, keyed by
+    (pred, block). Each value maps a dest to its source on that edge.
+    """
+    copies = defaultdict(dict)
+    types = {}
+    for block in blocks:
+        instrs = []
+        for instr in block["instrs"]:
+            if instr.get("op") != "phi":
+                instrs.append(instr)
+                continue
+            dest = instr["dest"]
+            types[dest] = instr["type"]
+            for label, arg in zip(instr["labels"], instr["args"]):
+                if arg != "__undefined":
+                    copies[(label, block["name"])][dest] = arg
+        block["instrs"] = instrs
+    return copies, types
+
+
+def get_type_of_vars(fn, phi_types):
+    var_types = {arg["name"]: arg["type"] for arg in fn.get("args", [])}
+    var_types.update(phi_types)
+    for instr in fn["instrs"]:
+        if "dest" in instr:
+            var_types[instr["dest"]] = instr["type"]
+    return var_types
 
-    phis = {block["name"]: [] for block in blocks}
+
+def get_liveness(cfg, blocks, copies):
+    # the copies on an edge run after the pred's terminator and before the
+    # successor's first instruction
+    uses, defs = {}, {}
     for block in blocks:
-        remove_phis = []
+        use, define = set(), set()
         for instr in block["instrs"]:
-            if "op" in instr and "dest" in instr and instr["op"] == "phi":
-                dest = instr["dest"]
-                for label, arg in zip(instr["labels"], instr["args"]):
-                    phis[label].append((dest, arg, instr["type"]))
-                remove_phis.append(instr)
-        for instr in remove_phis:
-            block["instrs"].remove(instr)
-    
+            for arg in instr.get("args", []):
+                if arg not in define:
+                    use.add(arg)
+            if "dest" in instr:
+                define.add(instr["dest"])
+        uses[block["name"]], defs[block["name"]] = use, define
+
+    def live_before_edge(pred, succ):
+        edge_copies = copies.get((pred, succ), {})
+        return (live_in[succ] - edge_copies.keys()) | set(edge_copies.values())
+
+    live_in = {block["name"]: set() for block in blocks}
+    live_out = {block["name"]: set() for block in blocks}
+    worklist = [block["name"] for block in blocks]
+    queued = set(worklist)
+    while worklist:
+        block_name = worklist.pop()
+        queued.discard(block_name)
+        out = set()
+        for succ in cfg[block_name]["succs"]:
+            out |= live_before_edge(block_name, succ)
+        live_out[block_name] = out
+        new_live_in = uses[block_name] | (out - defs[block_name])
+        if new_live_in != live_in[block_name]:
+            live_in[block_name] = new_live_in
+            for pred in cfg[block_name]["preds"]:
+                if pred not in queued:
+                    queued.add(pred)
+                    worklist.append(pred)
+    return live_in, live_out
+
+
+def get_interference(fn, blocks, copies, live_in, live_out):
+    graph = defaultdict(set)
+
+    def interfere(a, b):
+        if a != b:
+            graph[a].add(b)
+            graph[b].add(a)
+
+    # arguments are all defined on entry
+    fn_args = [arg["name"] for arg in fn.get("args", [])]
+    if blocks:
+        for arg in fn_args:
+            for var in live_in[blocks[0]["name"]] | set(fn_args):
+                interfere(arg, var)
+
     for block in blocks:
-        for dest, arg, type in phis[block["name"]]:
-            if arg == "__undefined":
+        live = set(live_out[block["name"]])
+        for instr in reversed(block["instrs"]):
+            dest = instr.get("dest")
+            if dest is not None:
+                # a copy does not interfere with its source
+                src = instr["args"][0] if instr.get("op") == "id" else None
+                for var in live:
+                    if var != src:
+                        interfere(dest, var)
+                live.discard(dest)
+            live.update(instr.get("args", []))
+
+    for (_, succ), edge_copies in copies.items():
+        for dest, src in edge_copies.items():
+            for var in live_in[succ]:
+                # the source keeps its value unless the same copy overwrites it
+                if var != src or src in edge_copies:
+                    interfere(dest, var)
+            for other in edge_copies:
+                interfere(dest, other)
+    return graph
+
+
+def coalesce(fn, copies, var_types, graph, depths):
+    """
+    Merge phi-related variables whose live ranges do not interfere, so the
+    copies between them disappear. Returns a map from each variable to the
+    name of its class.
+    """
+    fn_args = {arg["name"] for arg in fn.get("args", [])}
+    parent = {}
+
+    def find(var):
+        root = var
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while var != root:
+            parent[var], var = root, parent[var]
+        return root
+
+    # copies in deeper loops are removed first, since they run more often
+    for (pred, _), edge_copies in sorted(
+        copies.items(), key=lambda item: -depths.get(item[0][0], 0)
+    ):
+        for dest, src in edge_copies.items():
+            a, b = find(dest), find(src)
+            if a == b or var_types.get(a) != var_types.get(b):
                 continue
-            insert_index = len(block["instrs"])
-            if len(block["instrs"]) > 0 and block["instrs"][-1]["op"] in TERMINATORS:
-                insert_index = len(block["instrs"]) - 1
-            block["instrs"].insert(
-                insert_index,
+            if b in graph[a] or (a in fn_args and b in fn_args):
+                continue
+            if a in fn_args:
+                a, b = b, a  # arguments can't be renamed
+            parent[a] = b
+            for var in graph.pop(a, set()):
+                graph[var].discard(a)
+                graph[var].add(b)
+                graph[b].add(var)
+
+    return find
+
+
+def sequentialize(edge_copies, var_types, fresh_name):
+    """
+    Turn a parallel copy into a list of id instructions. Copies whose dest
+    is not read by any other pending copy go first; what is left is made of
+    cycles, which are broken with a temporary.
+    """
+    pending = {dest: src for dest, src in edge_copies.items() if dest != src}
+    instrs = []
+
+    def copy(dest, src, type):
+        instrs.append({"op": "id", "dest": dest, "type": type, "args": [src]})
+
+    while pending:
+        srcs = set(pending.values())
+        ready = [dest for dest in pending if dest not in srcs]
+        if ready:
+            for dest in ready:
+                copy(dest, pending.pop(dest), var_types[dest])
+            continue
+        dest = next(iter(pending))
+        temp = fresh_name(dest)
+        copy(temp, dest, var_types[dest])
+        pending = {d: temp if s == dest else s for d, s in pending.items()}
+    return instrs
+
+
+def from_ssa(fn, am=None):
+    if am is None:
+        am = AnalysisManager()
+    cfg, blocks = am.get(cfg_analysis, fn)
+    copies, phi_types = get_edge_copies(blocks)
+    if not copies:
+        return convert_blocks_to_fn(blocks, fn)
+
+    var_types = get_type_of_vars(fn, phi_types)
+    live_in, live_out = get_liveness(cfg, blocks, copies)
+    graph = get_interference(fn, blocks, copies, live_in, live_out)
+    depths = get_loop_depths(blocks, am.get(loop_forest_analysis, fn))
+    find = coalesce(fn, copies, var_types, graph, depths)
+
+    for block in blocks:
+        for instr in block["instrs"]:
+            if "args" in instr:
+                instr["args"] = [find(arg) for arg in instr["args"]]
+            if "dest" in instr:
+                instr["dest"] = find(instr["dest"])
+
+    names = set(var_types) | {block["name"] for block in blocks}
+    counters = defaultdict(int)
+
+    def fresh_name(base):
+        while True:
+            name = f"{base}.{counters[base]}"
+            counters[base] += 1
+            if name not in names:
+                names.add(name)
+                return name
+
+    split_blocks = defaultdict(list)  # key: pred, value: blocks placed after it
+    for (pred, succ), edge_copies in copies.items():
+        if pred not in cfg:
+            continue
+        live_copies = {}
+        for dest, src in edge_copies.items():
+            if dest in live_in[succ]:
+                live_copies.setdefault(find(dest), find(src))
+        instrs = sequentialize(live_copies, var_types, fresh_name)
+        if not instrs:
+            continue
+
+        pred_instrs = cfg[pred]["instrs"]
+        succ_instrs = cfg[succ]["instrs"]
+        if len(cfg[pred]["succs"]) == 1:
+            # the pred only goes to succ: copy at its end
+            insert_index = len(pred_instrs)
+            if pred_instrs[-1].get("op") in TERMINATORS:
+                insert_index -= 1
+            pred_instrs[insert_index:insert_index] = instrs
+        elif len(cfg[succ]["preds"]) == 1:
+            # succ is only reached from pred: copy at its start
+            succ_instrs[1:1] = instrs
+        else:
+            # critical edge: copy in a new block on the edge
+            split_name = fresh_name(f"{pred}.split")
+            terminator = pred_instrs[-1]
+            pred_instrs[-1] = {
+                **terminator,
+                "labels": [
+                    split_name if label == succ else label
+                    for label in terminator["labels"]
+                ],
+            }
+            split_blocks[pred].append(
                 {
-                    "op": "id",
-                    "dest": dest,
-                    "type": type,
-                    "args": [arg],
-                },
+                    "name": split_name,
+                    "instrs": [{"label": split_name}]
+                    + instrs
+                    + [{"op": "jmp", "labels": [succ]}],
+                }
             )
 
-    return convert_blocks_to_fn(blocks, fn)
+    new_blocks = []
+    for block in blocks:
+        new_blocks.append(block)
+        new_blocks.extend(split_blocks[block["name"]])
+    return convert_blocks_to_fn(new_blocks, fn)
 
 
 if __name__ == "__main__":
@@ -46,4 +268,4 @@ if __name__ == "__main__":
     for fn in prog["functions"]:
         new_fn = from_ssa(fn)
         fn["instrs"] = new_fn["instrs"]
-    print(json.dumps(prog, indent=2))
\ No newline at end of file
+    print(json.dumps(prog, indent=2))
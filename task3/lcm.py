@@ -1,163 +1,367 @@
 import json
 import sys
 from utils.legacy.instr import is_commutative
-from utils.legacy.dataflow import backward_df, forward_df
 from utils.legacy.form_blocks import form_blocks
 
-
-def union(succ_ins):
-    if len(succ_ins) == 0:
-        return set()
-    return succ_ins[0].union(*succ_ins[1:])
-
-
-def inter(succ_ins):
-    if len(succ_ins) == 0:
-        return set()
-    return succ_ins[0].intersection(*succ_ins[1:])
+# ops whose result is not a pure function of their arguments
+NON_EXPR_OPS = {
+    "const",
+    "id",
+    "phi",
+    "call",
+    "load",
+    "alloc",
+    "jmp",
+    "br",
+    "ret",
+    "print",
+    "nop",
+    "store",
+    "free",
+    "speculate",
+    "commit",
+    "guard",
+}
 
 
 def get_expr(instr):
-    if "op" in instr and instr["op"] == "const":
+    if "dest" not in instr or instr["op"] in NON_EXPR_OPS:
         return None
-        return f"const {instr['value']}"
-    elif "args" not in instr or len(instr["args"]) != 2:
+    args = instr.get("args", [])
+    if len(args) == 0:
         return None
     if is_commutative(instr):
-        instr["args"] = sorted(instr["args"])
-    return instr["op"] + " " + " ".join([str(x) for x in instr["args"]])
+        args = sorted(args)
+    return (instr["op"], str(instr["type"]), *args)
 
 
-def get_used_exprs(block):
-    used = set()
-    for instr in block["instrs"]:
-        expr = get_expr(instr)
-        if expr is not None:
-            used.add(expr)
-    return used
+class ExprUniverse:
+    """Interns expressions to bit positions."""
 
+    def __init__(self):
+        self.expr2id = {}
+        self.instrs = []  # a representative instruction for each expression
+        self.var2exprs = {}  # key: variable, value: bitset of exprs using it
 
-def get_killed_dests(block):
-    killed_dest = set()
-    for instr in block["instrs"]:
-        if "dest" in instr:
-            killed_dest.add(instr["dest"])
-    return killed_dest
+    def intern(self, expr, instr):
+        if expr not in self.expr2id:
+            eid = len(self.instrs)
+            self.expr2id[expr] = eid
+            self.instrs.append(instr)
+            for arg in expr[2:]:
+                self.var2exprs[arg] = self.var2exprs.get(arg, 0) | (1 << eid)
+        return self.expr2id[expr]
 
+    def killed_by(self, var):
+        return self.var2exprs.get(var, 0)
 
-def get_killed_exprs(original_exprs, killed_dests):
-    killed_exprs = set()
-    for expr in original_exprs:
-        for killed_dest in killed_dests:
-            if killed_dest in expr.split():
-                killed_exprs.add(expr)
-    return killed_exprs
 
+def get_local_sets(blocks, universe):
+    # intern every expression first, so kills see the whole universe
+    for block in blocks:
+        for instr in block["instrs"]:
+            expr = get_expr(instr) if "op" in instr else None
+            if expr is not None:
+                universe.intern(expr, instr)
 
-def anticipated_expr_f(block, x):
-    used = get_used_exprs(block)
-    killed_dests = get_killed_dests(block)
-    killed_exprs = get_killed_exprs(x, killed_dests)
-    result = used.union(x.copy() - killed_exprs)
-    return result
+    # e_use: exprs computed in the block before any of their args is
+    # redefined; e_kill: exprs with an arg defined in the block
+    uses, kills = [], []
+    for block in blocks:
+        use, kill = 0, 0
+        for instr in block["instrs"]:
+            if "op" not in instr:
+                continue
+            expr = get_expr(instr)
+            if expr is not None:
+                use |= (1 << universe.expr2id[expr]) & ~kill
+            if "dest" in instr:
+                kill |= universe.killed_by(instr["dest"])
+        uses.append(use)
+        kills.append(kill)
+    return uses, kills
 
 
-def available_expr_f(block, x):
-    block["earliest"] = block["anticipated"]["in"] - x
-    killed_dests = get_killed_dests(block)
-    killed_exprs = get_killed_exprs(
-        x.copy().union(block["anticipated"]["in"]), killed_dests
-    )
-    result = x.copy().union(block["anticipated"]["in"]) - killed_exprs
-    return result
+def solve(blocks, transfer, forward, meet_all, full):
+    """
+    Solve a bit-vector dataflow problem. `transfer(i, x)` maps the value on
+    the incoming side of block i to the other side; the meet is intersection
+    if `meet_all` is set and union otherwise. Returns (ins, outs).
+    """
+    n = len(blocks)
+    init = full if meet_all else 0
+    befores = [init] * n
+    afters = [init] * n
+    if forward:
+        edges_in = [block["predecessors"] for block in blocks]
+        edges_out = [block["successors"] for block in blocks]
+    else:
+        edges_in = [block["successors"] for block in blocks]
+        edges_out = [block["predecessors"] for block in blocks]
 
+    order = list(range(n)) if forward else list(reversed(range(n)))
+    worklist = list(reversed(order))
+    queued = set(order)
+    while worklist:
+        i = worklist.pop()
+        queued.discard(i)
+        if forward and i == 0 or len(edges_in[i]) == 0:
+            before = 0  # the entry or exit
+        else:
+            before = full if meet_all else 0
+            for j in edges_in[i]:
+                before = before & afters[j] if meet_all else before | afters[j]
+        befores[i] = before
+        after = transfer(i, before)
+        if after != afters[i]:
+            afters[i] = after
+            for j in edges_out[i]:
+                if j not in queued:
+                    queued.add(j)
+                    worklist.append(j)
 
-def postponable_expr_f(block, x):
-    used = get_used_exprs(block)
-    result = x.copy().union(block["earliest"]) - used
-    return result
+    return (befores, afters) if forward else (afters, befores)
 
 
-def liveness_expr_f(block, x):
-    used = get_used_exprs(block)
-    result = used.union(x.copy()) - block["latest"]
-    return result
+def get_temp_names(fn, universe):
+    names = {arg["name"] for arg in fn.get("args", [])}
+    names.update(instr["dest"] for instr in fn["instrs"] if "dest" in instr)
+    temps = []
+    for eid in range(len(universe.instrs)):
+        temp = f"lcm.{eid}"
+        while temp in names:
+            temp = "_" + temp
+        temps.append(temp)
+    return temps
 
 
-def calculate_earliest(blocks):
-    for block in blocks:
-        block["earliest"] = block["anticipated"]["in"] - block["available"]["in"]
+def remove_empty_blocks(blocks):
+    # drop blocks that only jump elsewhere, unless something falls into them
+    targets = {}
+    kept = []
+    for i, block in enumerate(blocks):
+        instrs = block["instrs"]
+        is_empty = (
+            i > 0
+            and len(instrs) == 2
+            and "label" in instrs[0]
+            and instrs[1].get("op") == "jmp"
+            and instrs[1]["labels"][0] != block["label"]
+        )
+        if is_empty:
+            prev_last = kept[-1]["instrs"][-1]
+            next_label = blocks[i + 1]["label"] if i + 1 < len(blocks) else None
+            falls_in = prev_last.get("op") not in ["jmp", "br", "ret"]
+            if not falls_in or next_label == instrs[1]["labels"][0]:
+                targets[block["label"]] = instrs[1]["labels"][0]
+                continue
+        kept.append(block)
+
+    def resolve(label):
+        seen = set()
+        while label in targets and label not in seen:
+            seen.add(label)
+            label = targets[label]
+        return label
+
+    for block in kept:
+        last_instr = block["instrs"][-1]
+        if last_instr.get("op") in ["jmp", "br"]:
+            block["instrs"][-1] = {
+                **last_instr,
+                "labels": [resolve(label) for label in last_instr["labels"]],
+            }
+    return kept
+
+
+def propagate_copies(blocks, copies):
+    """
+    Replace uses of the dest of each copy with its source wherever the copy
+    is available, then drop copies whose dest is no longer used.
+    """
+    copy_ids = {id(copy): cid for cid, copy in enumerate(copies)}
+    dest_copies = {}  # key: variable, value: bitset of copies defining it
+    var_copies = {}  # key: variable, value: bitset of copies reading or defining it
+    for cid, copy in enumerate(copies):
+        bit = 1 << cid
+        dest_copies[copy["dest"]] = dest_copies.get(copy["dest"], 0) | bit
+        for var in [copy["dest"], copy["args"][0]]:
+            var_copies[var] = var_copies.get(var, 0) | bit
+
+    def step(available, instr):
+        if "dest" in instr:
+            available &= ~var_copies.get(instr["dest"], 0)
+        if id(instr) in copy_ids:
+            available |= 1 << copy_ids[id(instr)]
+        return available
+
+    def transfer(i, available):
+        for instr in blocks[i]["instrs"]:
+            available = step(available, instr)
+        return available
+
+    full = (1 << len(copies)) - 1
+    available_in, _ = solve(blocks, transfer, forward=True, meet_all=True, full=full)
 
+    for i, block in enumerate(blocks):
+        available = available_in[i]
+        for instr in block["instrs"]:
+            if "args" in instr and available:
+                new_args = []
+                for arg in instr["args"]:
+                    copy_bits = available & dest_copies.get(arg, 0)
+                    if copy_bits:
+                        arg = copies[copy_bits.bit_length() - 1]["args"][0]
+                    new_args.append(arg)
+                instr["args"] = new_args
+            available = step(available, instr)
 
-def calculate_latest(blocks):
+    # a copy is dead if its dest is never read, or is redefined in the same
+    # block before being read
+    used = {
+        arg
+        for block in blocks
+        for instr in block["instrs"]
+        for arg in instr.get("args", [])
+    }
     for block in blocks:
-        # Calculate the intersection over all successors
-        if block["successors"]:
-            succ_exprs = set()
-            for s in block["successors"]:
-                succ_set = blocks[s]["earliest"].union(blocks[s]["postponable"]["in"])
-                if not succ_exprs:
-                    succ_exprs = succ_set
-                else:
-                    succ_exprs = succ_exprs.intersection(succ_set)
-        else:
-            succ_exprs = set()
+        dead = set()
+        pending = {}  # key: variable, value: copy not read since it was made
+        for instr in block["instrs"]:
+            for arg in instr.get("args", []):
+                pending.pop(arg, None)
+            if "dest" in instr:
+                if instr["dest"] in pending:
+                    dead.add(id(pending.pop(instr["dest"])))
+                if id(instr) in copy_ids:
+                    pending[instr["dest"]] = instr
+        block["instrs"] = [
+            instr
+            for instr in block["instrs"]
+            if id(instr) not in dead
+            and (id(instr) not in copy_ids or instr["dest"] in used)
+        ]
+
+
+def sink_into_predecessors(blocks, inserted):
+    """
+    Move code inserted into an otherwise empty block to the end of its
+    predecessor when that edge is not critical, so the block can be removed.
+    """
+    for i, block in enumerate(blocks):
+        if not inserted[i] or len(block["predecessors"]) != 1:
+            continue
+        instrs = block["instrs"]
+        body = instrs[1:-1] if "label" in instrs[0] else instrs[:-1]
+        if len(body) != len(inserted[i]) or instrs[-1].get("op") != "jmp":
+            continue
+        pred = blocks[block["predecessors"][0]]
+        if pred["successors"] != [i]:
+            continue
+        pred_instrs = pred["instrs"]
+        insert_index = len(pred_instrs)
+        if pred_instrs[-1].get("op") in ["jmp", "br"]:
+            insert_index -= 1
+        pred_instrs[insert_index:insert_index] = body
+        block["instrs"] = instrs[: len(instrs) - len(body) - 1] + [instrs[-1]]
 
-        current_exprs = block["earliest"].union(block["postponable"]["in"])
-        negated_succ_exprs = current_exprs.difference(succ_exprs)
-        # Get used expressions (EUse_b) in the current block
-        used_exprs = get_used_exprs(block)
 
-        latest = (block["earliest"].union(block["postponable"]["in"])).intersection(
-            used_exprs.union(negated_succ_exprs)
+def lazy_code_motion(fn):
+    blocks = form_blocks(fn, add_empty_blocks=True)
+    if len(blocks) == 0:
+        return
+    universe = ExprUniverse()
+    uses, kills = get_local_sets(blocks, universe)
+    full = (1 << len(universe.instrs)) - 1
+    if full == 0:
+        return
+
+    anticipated_in, _ = solve(
+        blocks,
+        lambda i, out: uses[i] | (out & ~kills[i]),
+        forward=False,
+        meet_all=True,
+        full=full,
+    )
+    available_in, _ = solve(
+        blocks,
+        lambda i, x: (anticipated_in[i] | x) & ~kills[i],
+        forward=True,
+        meet_all=True,
+        full=full,
+    )
+    earliest = [anticipated_in[i] & ~available_in[i] for i in range(len(blocks))]
+    postponable_in, _ = solve(
+        blocks,
+        lambda i, x: (earliest[i] | x) & ~uses[i],
+        forward=True,
+        meet_all=True,
+        full=full,
+    )
+    latest = []
+    for i, block in enumerate(blocks):
+        succ_postponable = full
+        for s in block["successors"]:
+            succ_postponable &= earliest[s] | postponable_in[s]
+        latest.append(
+            (earliest[i] | postponable_in[i]) & (uses[i] | (full & ~succ_postponable))
         )
-        block["latest"] = latest
+    _, used_out = solve(
+        blocks,
+        lambda i, out: (uses[i] | out) & ~latest[i],
+        forward=False,
+        meet_all=False,
+        full=full,
+    )
+
+    # insert temporaries at the latest points and replace redundant
+    # computations with copies of them
+    temps = get_temp_names(fn, universe)
+    copies = []
+    inserted = [[] for _ in blocks]
+    for i, block in enumerate(blocks):
+        insert = latest[i] & used_out[i]
+        replace = uses[i] & (~latest[i] | used_out[i])
+        if insert == 0 and replace == 0:
+            continue
+
+        instrs = block["instrs"]
+        new_instrs = []
+        if "label" in instrs[0]:
+            new_instrs.append(instrs[0])
+            instrs = instrs[1:]
+        for eid, instr in enumerate(universe.instrs):
+            if insert >> eid & 1:
+                inserted[i].append({**instr, "dest": temps[eid]})
+        new_instrs.extend(inserted[i])
+
+        killed = 0
+        for instr in instrs:
+            expr = get_expr(instr) if "op" in instr else None
+            if expr is not None:
+                eid = universe.expr2id[expr]
+                if replace >> eid & 1 and not killed >> eid & 1:
+                    instr = {
+                        "op": "id",
+                        "dest": instr["dest"],
+                        "type": instr["type"],
+                        "args": [temps[eid]],
+                    }
+                    copies.append(instr)
+            if "dest" in instr:
+                killed |= universe.killed_by(instr["dest"])
+            new_instrs.append(instr)
+        block["instrs"] = new_instrs
+
+    sink_into_predecessors(blocks, inserted)
+    if copies:
+        propagate_copies(blocks, copies)
+    blocks = remove_empty_blocks(blocks)
+    fn["instrs"] = [instr for block in blocks for instr in block["instrs"]]
 
 
 if __name__ == "__main__":
     prog = json.load(sys.stdin)
     for fn in prog["functions"]:
-        print("ANTICIPATED")
-        blocks = form_blocks(fn, add_empty_blocks=True)
-        blocks = backward_df(
-            anticipated_expr_f,
-            inter,
-            name="anticipated",
-            blocks=blocks,
-            initial_value=set(),
-            print_result=True,
-        )
-        print()
-        print("AVAILABLE")
-        blocks = forward_df(
-            available_expr_f,
-            inter,
-            name="available",
-            blocks=blocks,
-            initial_value=set(),
-            print_result=True,
-        )
-
-        print("EARLIEST")
-        calculate_earliest(blocks)
-        for block in blocks:
-            print(block["label"])
-            print(block["earliest"])
-            print()
-
-        print("POSTPONABLE")
-        blocks = forward_df(
-            postponable_expr_f,
-            inter,
-            name="postponable",
-            blocks=blocks,
-            initial_value=set(),
-            print_result=True,
-        )
-
-        print("LATEST")
-        calculate_latest(blocks)
-        for block in blocks:
-            print(block["label"])
-            print(block["latest"])
-            print()
+        lazy_code_motion(fn)
+    json.dump(prog, sys.stdout, indent=2)
@@ -1,8 +1,20 @@
 import json
 import sys
-from copy import deepcopy
-from utils.loop import get_natural_loops
-from utils.cfg import convert_blocks_to_fn, form_blocks
+from utils.alias import alias_analysis
+from utils.analysis import (
+    AnalysisManager,
+    cfg_analysis,
+    dominators_analysis,
+    loop_forest_analysis,
+)
+from utils.loop import innermost_first
+from utils.cfg import convert_blocks_to_fn
+
+TERMINATORS = {"jmp", "br", "ret"}
+
+# ops that may abort the program, so they are only hoisted when they are
+# guaranteed to execute whenever the loop is entered
+TRAPPING_OPS = {"div", "load"}
 
 
 def is_deterministic(instr):
@@ -20,75 +32,127 @@ def is_deterministic(instr):
         "guard",
         "phi",
         "alloc",
-        "ptradd",
         "load",
     ]
     return "op" in instr and instr["op"] and instr["op"] not in non_deterministic_ops
 
 
-def licm(fn):
-    cfg, blocks = form_blocks(fn)
-    cfg, blocks = deepcopy(cfg), deepcopy(blocks)
-    loops = get_natural_loops(fn)
+def get_def_counts(fn):
+    def_counts = {arg["name"]: 1 for arg in fn.get("args", [])}
+    for instr in fn["instrs"]:
+        if "dest" in instr:
+            def_counts[instr["dest"]] = def_counts.get(instr["dest"], 0) + 1
+    return def_counts
+
+
+def get_written_locations(cfg, loop, alias):
+    # returns None when the loop may write to any location
+    written = 0
+    for block_name in loop["blocks"]:
+        for instr in cfg[block_name]["instrs"]:
+            op = instr.get("op")
+            if op in ["call", "free"]:
+                return None
+            if op == "store":
+                written |= alias.points_to(instr["args"][0], instr)
+    return written
+
 
-    for loop in loops:
-        if loop["preheader"] is None:
+def licm(fn, am=None):
+    if am is None:
+        am = AnalysisManager()
+    cfg, blocks = am.get(cfg_analysis, fn)
+    loops = am.get(loop_forest_analysis, fn)
+    doms = {
+        name: set(dom) for name, dom in am.get(dominators_analysis, fn).items()
+    }
+    def_counts = get_def_counts(fn)
+
+    def_blocks = {}  # key: variable, value: set of blocks defining it
+    for block in blocks:
+        for instr in block["instrs"]:
+            if "dest" in instr:
+                def_blocks.setdefault(instr["dest"], set()).add(block["name"])
+
+    alias = None
+    if any(instr.get("op") == "load" for instr in fn["instrs"]):
+        alias = alias_analysis(fn)
+
+    # inner loops first, so instructions hoisted into an inner preheader can
+    # be hoisted again out of the enclosing loops
+    for loop in innermost_first(loops):
+        preheader = loop["preheader"]
+        if preheader is None:
             continue
 
         loop_blocks = set(loop["blocks"])
-        invariant_args = set()
-
-        # find dest defined outside the loop
-        for block in blocks:
-            if block["name"] not in loop_blocks:
-                for instr in block["instrs"]:
-                    if "dest" in instr:
-                        invariant_args.add(instr["dest"])
-        if "args" in fn:
-            for arg in fn["args"]:
-                invariant_args.add(arg["name"])
-
-        # find loop-invariant instructions inside the loop
-        changed = True
+        exiting_blocks = [
+            block_name
+            for block_name in loop["blocks"]
+            if not cfg[block_name]["succs"]
+            or any(succ not in loop_blocks for succ in cfg[block_name]["succs"])
+        ]
+        written = None
+        if alias is not None:
+            written = get_written_locations(cfg, loop, alias)
+
+        invariant_dests = set()
+
+        def is_invariant_arg(arg):
+            if def_blocks.get(arg, set()).isdisjoint(loop_blocks):
+                return True  # only defined outside the loop
+            return arg in invariant_dests
+
+        def can_hoist(block_name, instr):
+            dest = instr.get("dest")
+            if dest is None or dest in invariant_dests or def_counts[dest] != 1:
+                return False
+            if instr["op"] == "load":
+                if written is None:
+                    return False
+                if written & alias.points_to(instr["args"][0], instr):
+                    return False
+            elif not is_deterministic(instr):
+                return False
+            if not all(is_invariant_arg(arg) for arg in instr.get("args", [])):
+                return False
+            if instr["op"] in TRAPPING_OPS:
+                return all(block_name in doms[b] for b in exiting_blocks)
+            return True
+
+        # find loop-invariant instructions, in an order that respects their
+        # dependencies
         invariant_instrs = []
+        changed = True
         while changed:
             changed = False
-            for block_name in loop_blocks:
-                block = cfg[block_name]
-                for instr in block["instrs"]:
-                    if "dest" in instr and instr["dest"] not in invariant_args:
-                        if all(arg in invariant_args for arg in instr.get("args", [])):
-                            if is_deterministic(instr):
-                                invariant_args.add(instr["dest"])
-                                invariant_instrs.append(instr)
-                                changed = True
+            for block_name in loop["blocks"]:
+                for instr in cfg[block_name]["instrs"]:
+                    if can_hoist(block_name, instr):
+                        invariant_dests.add(instr["dest"])
+                        invariant_instrs.append(instr)
+                        changed = True
 
         if len(invariant_instrs) == 0:
             continue
 
-        # move invariant instructions to the preheader
-        preheader = loop["preheader"]
-        preheader_block = cfg[preheader]
-        preheader_block["instrs"] = (
-            [preheader_block["instrs"][0]]  # label
-            + invariant_instrs
-            + preheader_block["instrs"][1:]  # rest of the instructions
-        )
-        preheader_index = next(
-            i for i, block in enumerate(blocks) if block["name"] == preheader
-        )
-        blocks[preheader_index] = preheader_block
-
-        # remove invariant instructions from loop blocks
-        for block_name in loop_blocks:
+        # remove invariant instructions from loop blocks by identity, since
+        # equal instructions may appear more than once
+        hoisted = {id(instr) for instr in invariant_instrs}
+        for block_name in loop["blocks"]:
             block = cfg[block_name]
-            for invariant_instr in invariant_instrs:
-                if invariant_instr in block["instrs"]:
-                    block["instrs"].remove(invariant_instr)
-            block_index = next(
-                i for i, block in enumerate(blocks) if block["name"] == block_name
-            )
-            blocks[block_index] = block
+            block["instrs"] = [
+                instr for instr in block["instrs"] if id(instr) not in hoisted
+            ]
+
+        # move invariant instructions to the end of the preheader
+        preheader_instrs = cfg[preheader]["instrs"]
+        insert_index = len(preheader_instrs)
+        if preheader_instrs and preheader_instrs[-1].get("op") in TERMINATORS:
+            insert_index -= 1
+        preheader_instrs[insert_index:insert_index] = invariant_instrs
+        for instr in invariant_instrs:
+            def_blocks[instr["dest"]] = {preheader}
 
     return convert_blocks_to_fn(blocks, fn)
 
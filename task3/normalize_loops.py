@@ -9,18 +9,12 @@ def normalize_shared_loops(fn, loops):
     cfg, blocks = form_blocks(fn)
     cfg, blocks = deepcopy(cfg), deepcopy(blocks)
 
-    # group loops by header
-    headers2loops = {}  # key: header, value: loop
-    for loop in loops:
-        if loop["header"] not in headers2loops:
-            headers2loops[loop["header"]] = []
-        headers2loops[loop["header"]].append(loop)
-
     new_loops = []
-    for header, shared_loops in headers2loops.items():
-        if len(shared_loops) > 1:
+    for loop in loops:
+        header = loop["header"]
+        if len(loop["latches"]) > 1:
             # insert a new latch block
-            original_latches = [loop["latch"] for loop in shared_loops]
+            original_latches = loop["latches"]
             new_latch = f"{header}_new_latch"
             new_latch_block = {
                 "name": new_latch,
@@ -83,23 +77,16 @@ def normalize_shared_loops(fn, loops):
             blocks[header_block_index] = header_block
 
             # modify loop informations
-            new_loop = {
-                "header": header,
-                "latch": new_latch,
-                "blocks": [header, new_latch],
-            }
-            for loop in shared_loops:
-                new_loop["blocks"].extend(
-                    [
-                        block
-                        for block in loop["blocks"]
-                        if block not in new_loop["blocks"]
-                    ]
-                )
-            new_loops.append(new_loop)
+            new_loops.append(
+                {
+                    **loop,
+                    "latches": [new_latch],
+                    "latch": new_latch,
+                    "blocks": [header, new_latch] + loop["blocks"][1:],
+                }
+            )
         else:
-            for loop in shared_loops:
-                new_loops.append(loop)
+            new_loops.append(loop)
 
     return convert_blocks_to_fn(blocks, fn), new_loops
 
@@ -0,0 +1,116 @@
+import copy
+import json
+import sys
+
+import constant
+import liveness_dce
+from from_ssa import from_ssa
+from lcm import lazy_code_motion
+from licm import licm
+from lvn import local_value_numbering
+from normalize_loops import insert_preheaders, normalize_shared_loops
+from to_ssa import convert_to_ssa, ensure_entry_block_has_no_preds
+from utils.analysis import (
+    CFG_SHAPE_ANALYSES,
+    AnalysisManager,
+    loop_forest_analysis,
+)
+from utils.cfg import form_blocks
+
+# Each pass takes (fn, manager), updates fn in place and returns the
+# analyses it preserves.
+
+
+def run_lcm(fn, am):
+    lazy_code_motion(fn)
+    return set()
+
+
+def run_normalize_loops(fn, am):
+    loops = list(am.get(loop_forest_analysis, fn).values())
+    new_fn, normalized_loops = normalize_shared_loops(fn, loops)
+    new_fn = insert_preheaders(new_fn, normalized_loops)
+    fn["instrs"] = new_fn["instrs"]
+    return set()
+
+
+def run_to_ssa(fn, am):
+    fn["instrs"] = ensure_entry_block_has_no_preds(fn)["instrs"]
+    am.invalidate(fn)
+    fn["instrs"] = convert_to_ssa(fn, am)["instrs"]
+    return set()
+
+
+def run_licm(fn, am):
+    # instructions only move into existing preheaders
+    fn["instrs"] = licm(fn, am)["instrs"]
+    return CFG_SHAPE_ANALYSES
+
+
+def run_constant(fn, am):
+    while True:
+        old_fn = copy.deepcopy(fn)
+        constant.forward_df(fn, constant.f, constant.meet)
+        constant.constant_propagation(fn)
+        if fn == old_fn:
+            break
+    return set()
+
+
+def run_lvn(fn, am):
+    local_value_numbering(fn)
+    return CFG_SHAPE_ANALYSES
+
+
+def cfg_shape(fn):
+    cfg, _ = form_blocks(fn)
+    return {name: block["succs"] for name, block in cfg.items()}
+
+
+def run_dce(fn, am):
+    # emptying an unlabeled block removes it, which renames the blocks
+    # after it and changes its successor's predecessors
+    shape = cfg_shape(fn)
+    liveness_dce.backward_df(
+        fn, liveness_dce.f, liveness_dce.meet, initial_value=set()
+    )
+    liveness_dce.dead_code_elimination(fn)
+    return CFG_SHAPE_ANALYSES if cfg_shape(fn) == shape else set()
+
+
+def run_from_ssa(fn, am):
+    fn["instrs"] = from_ssa(fn, am)["instrs"]
+    return set()
+
+
+PASSES = {
+    "lcm": run_lcm,
+    "normalize_loops": run_normalize_loops,
+    "to_ssa": run_to_ssa,
+    "licm": run_licm,
+    "constant": run_constant,
+    "lvn": run_lvn,
+    "dce": run_dce,
+    "from_ssa": run_from_ssa,
+}
+
+
+if __name__ == "__main__":
+    # usage: python pipeline.py [--stats] PASS...
+    args = sys.argv[1:]
+    show_stats = "--stats" in args
+    names = [arg for arg in args if arg != "--stats"]
+    for name in names:
+        if name not in PASSES:
+            sys.exit(f"unknown pass {name}; expected one of {', '.join(PASSES)}")
+
+    prog = json.load(sys.stdin)
+    am = AnalysisManager()
+    for fn in prog["functions"]:
+        for name in names:
+            am.run(PASSES[name], fn)
+    print(json.dumps(prog, indent=2))
+
+    if show_stats:
+        for analysis, count in am.computed.items():
+            print(f"{analysis.__name__}: {count}", file=sys.stderr)
@@ -2,67 +2,48 @@ from collections import defaultdict
 import json
 import sys
 from utils.cfg import convert_blocks_to_fn, form_blocks
-from utils.loop import get_dominators
+from utils.analysis import (
+    AnalysisManager,
+    cfg_analysis,
+    immediate_dominators_analysis,
+    live_in_analysis,
+)
 
 
-def get_dom_frontier(fn):
-    cfg, blocks = form_blocks(fn)
-    doms = get_dominators(cfg, blocks)  # doms[b] = a list of blocks that dominate b
-    strict_doms = get_dominators(cfg, blocks, strict=True)
-
-    dom_frontiers = {}
-    for target_block in blocks:  # A
-        A = target_block["name"]
-        dom_frontier = []
-        for cur_block in blocks:  # B
-            B = cur_block["name"]
-            if A not in strict_doms[B]:  # A does not strictly dominate B
-                has_A_dom_some_pred_of_B = any(
-                    A in doms[pred] for pred in cfg[B]["preds"]
-                )  # A does dominate some pred of B
-                if has_A_dom_some_pred_of_B:
-                    dom_frontier.append(B)
-
-        dom_frontiers[A] = dom_frontier
-
-    return dom_frontiers
-
-
-def get_dom_tree(fn):
-    cfg, blocks = form_blocks(fn)
-    strict_doms = get_dominators(cfg, blocks, strict=True)
-
+def get_dom_tree(idom):
     dom_tree = {
-        block["name"]: set() for block in blocks
-    }  # key: block name, value: set of blocks that are immediately dominated by the key
-    for target_block in blocks:
-        A = target_block["name"]
-        for cur_block in blocks:
-            B = cur_block["name"]
-            if A in strict_doms[B] and all(  # A strictly dominates B, and
-                A not in strict_doms[C]
-                for C in strict_doms[B]
-                if C != A
-                # A does not strictly dominate any other node that strictly dominates B
-            ):
-                # A immediately dominates B
-                dom_tree[A].add(B)
-
+        block_name: [] for block_name in idom
+    }  # key: block name, value: blocks that are immediately dominated by the key
+    for block_name, parent in idom.items():
+        if parent is not None:
+            dom_tree[parent].append(block_name)
     return dom_tree
 
 
-def get_def_blocks_of_vars(fn):
-    _, blocks = form_blocks(fn)
-    defs, vars = {}, set()
+def get_dom_frontier(cfg, idom):
+    dom_frontiers = {block_name: set() for block_name in idom}
+    for block_name in idom:
+        preds = [pred for pred in cfg[block_name]["preds"] if pred in idom]
+        if len(preds) < 2:
+            continue
+        # walk up from each pred until reaching the block's idom; every block
+        # on the way has the join block in its frontier
+        for pred in preds:
+            runner = pred
+            while runner is not None and runner != idom[block_name]:
+                dom_frontiers[runner].add(block_name)
+                runner = idom[runner]
+    return dom_frontiers
+
+
+def get_def_blocks_of_vars(blocks):
+    defs = {}
     for block in blocks:
         for instr in block["instrs"]:
             dest = instr.get("dest", None)
             if dest is not None:
-                if dest not in defs:
-                    defs[dest] = set()
-                defs[dest].add(block["name"])
-                vars.add(dest)
-    return defs, vars
+                defs.setdefault(dest, set()).add(block["name"])
+    return defs
 
 
 def get_type_of_vars(fn):
@@ -73,72 +54,84 @@ def get_type_of_vars(fn):
     return var_types
 
 
-def get_phis_locations(fn):
-    _, blocks = form_blocks(fn)
-    dom_frontiers = get_dom_frontier(fn)
-    defs, vars = get_def_blocks_of_vars(fn)
+def get_phis_locations(blocks, dom_frontiers, live_in):
+    defs = get_def_blocks_of_vars(blocks)
 
     phis = {
         block["name"]: set() for block in blocks
     }  # key: block name, value: set of variables that needs phis in the block
-    for var in vars:
-        defining_blocks = list(defs[var])
-        for defining_block in defining_blocks:
+    for var, defining_blocks in defs.items():
+        # iterated dominance frontier, pruned to blocks where var is live
+        worklist = [b for b in defining_blocks if b in dom_frontiers]
+        while worklist:
+            defining_block = worklist.pop()
             for df in dom_frontiers[defining_block]:
-                if var not in phis[df]:
-                    phis[df].add(var)
-                    if df not in defs[var]:
-                        defs[var].add(df)
-                        defining_blocks.append(df)
+                if var in phis[df] or var not in live_in[df]:
+                    continue
+                phis[df].add(var)
+                if df not in defining_blocks:
+                    worklist.append(df)
     return phis
 
 
-def convert_to_ssa(fn):
-    cfg, blocks = form_blocks(fn)
+def convert_to_ssa(fn, am=None):
+    if am is None:
+        am = AnalysisManager()
+    cfg, blocks = am.get(cfg_analysis, fn)
+    if len(blocks) == 0:
+        return fn
     var_types = get_type_of_vars(fn)
-    phis = get_phis_locations(fn)
+    idom = am.get(immediate_dominators_analysis, fn)
+    dom_frontiers = get_dom_frontier(cfg, idom)
+    phis = get_phis_locations(blocks, dom_frontiers, am.get(live_in_analysis, fn))
     phi_args = {b["name"]: {p: [] for p in phis[b["name"]]} for b in blocks}
     phi_dests = {b["name"]: {p: None for p in phis[b["name"]]} for b in blocks}
-    dom_tree = get_dom_tree(fn)
+    dom_tree = get_dom_tree(idom)
     fn_args = {arg["name"] for arg in fn["args"]} if "args" in fn else set()
     stack = defaultdict(list, {v: [v] for v in fn_args})
     counters = defaultdict(int)
 
-    def fresh_name(var):
+    def fresh_name(var, pushed):
         fresh = f"{var}.{counters[var]}"
         counters[var] += 1
-        stack[var].insert(0, fresh)
+        stack[var].append(fresh)
+        pushed.append(var)
         return fresh
 
-    def rename_phi(block):
-        old_stack = {k: list(v) for k, v in stack.items()}
-
+    def rename_phi(block, pushed):
         for phi in phis[block["name"]]:
-            phi_dests[block["name"]][phi] = fresh_name(phi)
+            phi_dests[block["name"]][phi] = fresh_name(phi, pushed)
 
         for inst in block["instrs"]:
             if "args" in inst:
-                new_args = [stack[arg][0] for arg in inst["args"]]
+                new_args = [stack[arg][-1] if stack[arg] else arg for arg in inst["args"]]
                 inst["args"] = new_args
 
             if "dest" in inst:
-                fresh = fresh_name(inst["dest"])
+                fresh = fresh_name(inst["dest"], pushed)
                 inst["dest"] = fresh
 
         for succ in block["succs"]:
             for phi in phis[succ]:
                 if stack[phi]:
-                    phi_args[succ][phi].append((block["name"], stack[phi][0]))
+                    phi_args[succ][phi].append((block["name"], stack[phi][-1]))
                 else:
                     phi_args[succ][phi].append((block["name"], "__undefined"))
 
-        for child in dom_tree[block["name"]]:
-            rename_phi(cfg[child])
-
-        stack.clear()
-        stack.update(old_stack)
-
-    rename_phi(cfg[blocks[0]["name"]])
+    # walk the dom tree with an explicit stack; each block is visited once
+    # on the way down and once on the way up to pop the names it pushed
+    walk = [(blocks[0]["name"], None)]
+    while walk:
+        block_name, pushed = walk.pop()
+        if pushed is not None:
+            for var in pushed:
+                stack[var].pop()
+            continue
+        pushed = []
+        rename_phi(cfg[block_name], pushed)
+        walk.append((block_name, pushed))
+        for child in reversed(dom_tree[block_name]):
+            walk.append((child, None))
 
     for block in cfg.values():
         block_name = block["name"]
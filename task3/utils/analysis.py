@@ -0,0 +1,122 @@
+from collections import defaultdict
+
+from utils.cfg import form_blocks
+from utils.loop import get_dominators, get_immediate_dominators, get_loop_forest
+
+# returned by a pass that did not change the function
+PRESERVE_ALL = "all"
+
+
+def get_live_in(cfg, blocks):
+    uses, defs = {}, {}
+    for block in blocks:
+        use, define = set(), set()
+        for instr in block["instrs"]:
+            for arg in instr.get("args", []):
+                if arg not in define:
+                    use.add(arg)
+            if "dest" in instr:
+                define.add(instr["dest"])
+        uses[block["name"]], defs[block["name"]] = use, define
+
+    live_in = {block["name"]: set() for block in blocks}
+    worklist = [block["name"] for block in blocks]
+    queued = set(worklist)
+    while worklist:
+        block_name = worklist.pop()
+        queued.discard(block_name)
+        live_out = set()
+        for succ in cfg[block_name]["succs"]:
+            live_out |= live_in[succ]
+        new_live_in = uses[block_name] | (live_out - defs[block_name])
+        if new_live_in != live_in[block_name]:
+            live_in[block_name] = new_live_in
+            for pred in cfg[block_name]["preds"]:
+                if pred not in queued:
+                    queued.add(pred)
+                    worklist.append(pred)
+    return live_in
+
+
+# Analyses take the function and the manager, so they can ask it for the
+# analyses they are built on.
+
+
+def cfg_analysis(fn, am):
+    return form_blocks(fn)
+
+
+def dominators_analysis(fn, am):
+    cfg, blocks = am.get(cfg_analysis, fn)
+    return get_dominators(cfg, blocks)
+
+
+def immediate_dominators_analysis(fn, am):
+    cfg, blocks = am.get(cfg_analysis, fn)
+    return get_immediate_dominators(cfg, blocks)
+
+
+def loop_forest_analysis(fn, am):
+    cfg, blocks = am.get(cfg_analysis, fn)
+    return get_loop_forest(cfg, blocks, am.get(dominators_analysis, fn))
+
+
+def live_in_analysis(fn, am):
+    cfg, blocks = am.get(cfg_analysis, fn)
+    return get_live_in(cfg, blocks)
+
+
+# Analyses that only depend on the shape of the CFG, which passes that move
+# or rewrite instructions inside blocks can preserve.
+CFG_SHAPE_ANALYSES = {
+    dominators_analysis,
+    immediate_dominators_analysis,
+    loop_forest_analysis,
+}
+
+
+class AnalysisManager:
+    """
+    Caches analysis results per function. Every function has a version,
+    bumped by `invalidate` whenever a pass changes it; a cached result is
+    only returned for the version it was computed on, unless the pass that
+    changed the function declared the analysis preserved.
+
+    Results are shared, so callers that modify them (e.g. the blocks of
+    `cfg_analysis`) must not declare that analysis preserved.
+    """
+
+    def __init__(self):
+        self.versions = defaultdict(int)  # key: function name
+        self.cache = {}  # key: (analysis, function name), value: (version, result)
+        self.computed = defaultdict(int)  # key: analysis, value: times computed
+
+    def get(self, analysis, fn):
+        key = (analysis, fn["name"])
+        version = self.versions[fn["name"]]
+        if key in self.cache and self.cache[key][0] == version:
+            return self.cache[key][1]
+        result = analysis(fn, self)
+        self.computed[analysis] += 1
+        self.cache[key] = (version, result)
+        return result
+
+    def invalidate(self, fn, preserved=frozenset()):
+        if preserved == PRESERVE_ALL:
+            return
+        name = fn["name"]
+        self.versions[name] += 1
+        for key, (_, result) in list(self.cache.items()):
+            if key[1] != name:
+                continue
+            if key[0] in preserved:
+                self.cache[key] = (self.versions[name], result)
+            else:
+                del self.cache[key]
+
+    def run(self, pass_fn, fn):
+        """
+        Run a pass on fn. The pass takes (fn, manager), changes fn in place
+        and returns the set of analyses it preserves.
+        """
+        self.invalidate(fn, pass_fn(fn, self))
@@ -4,7 +4,65 @@ import uuid
 TERMINATORS = {"br", "jmp", "ret"}
 
 
-def form_blocks(fn):
+def get_successor_labels(blocks, i):
+    last_instr = blocks[i]["instrs"][-1]
+    if "op" in last_instr and last_instr["op"] in ["jmp", "br"]:
+        return last_instr["labels"]
+    if "op" in last_instr and last_instr["op"] == "ret":
+        return []
+    return [blocks[i + 1]["label"]] if i + 1 < len(blocks) else []
+
+
+def insert_empty_blocks(blocks):
+    """
+    Put an empty block on every edge that enters a block with more than one
+    predecessor. This splits all critical edges, so code can be inserted on
+    any edge by inserting it at the start of a block.
+    """
+    labels = {block["label"] for block in blocks}
+    pred_counts = {}
+    for i in range(len(blocks)):
+        for label in set(get_successor_labels(blocks, i)):
+            pred_counts[label] = pred_counts.get(label, 0) + 1
+
+    new_blocks = []
+    for i, block in enumerate(blocks):
+        new_blocks.append(block)
+        empty_blocks = {}  # key: successor label, value: empty block label
+        for label in get_successor_labels(blocks, i):
+            if pred_counts[label] < 2 or label in empty_blocks:
+                continue
+            count = 0
+            empty_label = f"{label}.split{count}"
+            while empty_label in labels:
+                count += 1
+                empty_label = f"{label}.split{count}"
+            labels.add(empty_label)
+            empty_blocks[label] = empty_label
+
+        if not empty_blocks:
+            continue
+        last_instr = block["instrs"][-1]
+        if "op" in last_instr and last_instr["op"] in ["jmp", "br"]:
+            block["instrs"][-1] = {
+                **last_instr,
+                "labels": [empty_blocks.get(l, l) for l in last_instr["labels"]],
+            }
+        # placed right after the block, so a fall-through lands in it too
+        for label, empty_label in empty_blocks.items():
+            new_blocks.append(
+                {
+                    "label": empty_label,
+                    "instrs": [
+                        {"label": empty_label},
+                        {"op": "jmp", "labels": [label]},
+                    ],
+                }
+            )
+    return new_blocks
+
+
+def form_blocks(fn, add_empty_blocks=False):
     blocks = []
     cur_instrs = []
     label = str(uuid.uuid4())
@@ -37,7 +95,10 @@ def form_blocks(fn):
                 "instrs": cur_instrs,
             }
         )
-    
+
+    if add_empty_blocks:
+        blocks = insert_empty_blocks(blocks)
+
     for i, block in enumerate(blocks):
         block["id"] = i
         block['predecessors'] = []
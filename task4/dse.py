@@ -3,33 +3,38 @@ import sys
 
 from utils.alias import alias_analysis
 from utils.legacy.dataflow import backward_df
+from utils.modref import get_summaries
 
 
-all_memory_locations = set()
+alias = None
 
 
 def liveness_meet(succ_ins):
     if len(succ_ins) == 0:
-        return all_memory_locations.copy()
-    return succ_ins[0].union(*succ_ins[1:])
+        return alias.all
+    result = 0
+    for succ_in in succ_ins:
+        result |= succ_in
+    return result
 
 
-def liveness_f(block, out_state: set):
-    in_state = out_state.copy()
+def liveness_f(block, out_state: int):
+    in_state = out_state
     instrs = block["instrs"]
     for instr in reversed(instrs):
-        instr["live_mem"] = in_state.copy()
+        instr["live_mem"] = in_state
         if "op" not in instr:
             continue
         if instr["op"] == "load":
             p = instr["args"][0]
-            pts_p = instr["alias"].get(p, all_memory_locations)
-            in_state.update(pts_p)
+            in_state |= alias.points_to(p, instr)
         elif instr["op"] == "store":
             p = instr["args"][0]
-            pts_p = instr["alias"].get(p, all_memory_locations)
-            if len(pts_p) == 1:
-                in_state.difference_update(pts_p)
+            l = alias.unique_location(p, instr)
+            if l is not None:
+                in_state &= ~(1 << l)
+        elif instr["op"] == "call":
+            in_state |= alias.call_reach(instr, "reads")
     return in_state
 
 
@@ -41,23 +46,29 @@ def dead_store_elimination(fn):
             continue
         if instr["op"] == "store":
             p = instr["args"][0]
-            pts_p = instr["alias"].get(p, all_memory_locations)
+            pts_p = alias.points_to(p, instr)
             live_mem = instr["live_mem"]
             # If the intersection is empty, the store is dead
-            if pts_p.isdisjoint(live_mem):
+            if pts_p & live_mem == 0:
                 # Eliminate the store
+                alias.remove(instr)
                 continue
         new_instrs.append(instr)
     fn["instrs"] = new_instrs
 
 
+def run_dse(fn, alias_info):
+    global alias
+    alias = alias_info
+    backward_df(fn, liveness_f, liveness_meet, initial_value=0)
+    dead_store_elimination(fn)
+    for instr in fn["instrs"]:
+        instr.pop("live_mem", None)
+
+
 if __name__ == "__main__":
     prog = json.load(sys.stdin)
+    summaries = get_summaries(prog)
     for fn in prog["functions"]:
-        all_memory_locations = alias_analysis(fn)
-        backward_df(fn, liveness_f, liveness_meet, initial_value=set())
-        dead_store_elimination(fn)
-        for instr in fn["instrs"]:
-            del instr["live_mem"]
-            del instr["alias"]
+        run_dse(fn, alias_analysis(fn, summaries))
     json.dump(prog, sys.stdout, indent=2)
@@ -0,0 +1,32 @@
+import json
+import sys
+
+from dse import run_dse
+from rle import run_rle
+from store_forwarding import run_store_forwarding
+from utils.alias import alias_analysis
+from utils.modref import get_summaries
+
+
+def memory_optimization(fn, summaries):
+    # rewrites keep the value each instruction computes, so the points-to
+    # facts from one analysis stay valid; each pass hands the facts of a
+    # rewritten instruction to its replacement
+    alias = alias_analysis(fn, summaries)
+    changed = True
+    while changed:
+        old_instrs = fn["instrs"]
+        run_store_forwarding(fn, alias)
+        run_rle(fn, alias)
+        run_dse(fn, alias)
+        changed = len(fn["instrs"]) != len(old_instrs) or any(
+            new is not old for new, old in zip(fn["instrs"], old_instrs)
+        )
+
+
+if __name__ == "__main__":
+    prog = json.load(sys.stdin)
+    summaries = get_summaries(prog)
+    for fn in prog["functions"]:
+        memory_optimization(fn, summaries)
+    json.dump(prog, sys.stdout, indent=2)
@@ -1,15 +1,15 @@
 import json
 import sys
 
-from utils.alias import alias_analysis
+from utils.alias import alias_analysis, iter_bits
 from utils.legacy.dataflow import forward_df
+from utils.modref import get_summaries
 
-all_memory_locations = set()
+alias = None
 
 def redundant_load_elimination_f(block, in_state):
     out_state = in_state.copy()
     for instr in block["instrs"]:
-        instr["load_map"] = out_state.copy()
         if "op" not in instr:
             continue
         op = instr["op"]
@@ -23,33 +23,26 @@ def redundant_load_elimination_f(block, in_state):
         if op == "load":
             dest = instr["dest"]
             p = instr["args"][0]
-            pts_p = instr["alias"].get(p, all_memory_locations)
-            # Check if we have a mapping for all memory locations in pts_p
-            can_replace = True
-            previous_vars = set()
-            for l in pts_p:
-                if l in out_state:
-                    previous_vars.add(out_state[l])
-                else:
-                    can_replace = False
-                    break
-            if can_replace and len(previous_vars) == 1:
-                # All memory locations map to the same variable
-                prev_var = next(iter(previous_vars))
-                instr["redundant_load"] = prev_var
-            else:
+            # a location only holds one value if it names a single cell
+            l = alias.unique_location(p, instr)
+            if l is not None and l in out_state:
+                instr["redundant_load"] = out_state[l]
+            elif l is not None:
                 # Update the mapping
-                for l in pts_p:
-                    out_state[l] = dest
+                out_state[l] = dest
         elif op == "store":
             p = instr["args"][0]
-            pts_p = instr["alias"].get(p, all_memory_locations)
-            for l in pts_p:
+            pts_p = alias.points_to(p, instr)
+            for l in iter_bits(pts_p):
                 if l in out_state:
                     del out_state[l]
         elif op == "call":
-            # Invalidate all mappings
-            out_state.clear()
+            # Invalidate the mappings the callee may write or free
+            clobbered = alias.call_reach(instr, "writes") | alias.call_reach(
+                instr, "frees"
+            )
+            for l in iter_bits(clobbered):
+                out_state.pop(l, None)
     return out_state
 
 
@@ -84,19 +77,25 @@ def redundant_load_elimination(fn):
                 "op": "id",
                 "args": [prev_var],
             }
+            alias.replace(instr, new_instr)
             new_instrs.append(new_instr)
             continue
         new_instrs.append(instr)
     fn["instrs"] = new_instrs
 
+
+def run_rle(fn, alias_info):
+    global alias
+    alias = alias_info
+    forward_df(fn, redundant_load_elimination_f, redundant_load_elimination_meet, initial_value={})
+    redundant_load_elimination(fn)
+    for instr in fn["instrs"]:
+        instr.pop("redundant_load", None)
+
+
 if __name__ == "__main__":
     prog = json.load(sys.stdin)
+    summaries = get_summaries(prog)
     for fn in prog["functions"]:
-        all_memory_locations = alias_analysis(fn)
-        forward_df(fn, redundant_load_elimination_f, redundant_load_elimination_meet, initial_value={})
-        redundant_load_elimination(fn)
-        for instr in fn["instrs"]:
-            instr.pop("alias", None)
-            instr.pop("load_map", None)
-            instr.pop("redundant_load", None)
+        run_rle(fn, alias_analysis(fn, summaries))
     json.dump(prog, sys.stdout, indent=2)
@@ -1,10 +1,11 @@
 import json
 import sys
 
-from utils.alias import alias_analysis
+from utils.alias import alias_analysis, iter_bits
 from utils.legacy.dataflow import forward_df
+from utils.modref import get_summaries
 
-all_memory_locations = set()
+alias = None
 
 
 def store_forwarding_f(block, in_state):
@@ -14,21 +15,28 @@ def store_forwarding_f(block, in_state):
         if "op" not in instr:
             continue
         op = instr["op"]
+        if "dest" in instr:
+            # a stored variable that is redefined no longer holds the value
+            for l, v in out_state.items():
+                if v == instr["dest"]:
+                    out_state[l] = None
         if op == "store":
             p = instr["args"][0]
             v = instr["args"][1]
-            pts_p = instr["alias"].get(p, all_memory_locations)
-            if len(pts_p) == 1:
-                l = next(iter(pts_p))
+            l = alias.unique_location(p, instr)
+            if l is not None:
                 out_state[l] = v
             else:
-                for l in pts_p:
+                for l in iter_bits(alias.points_to(p, instr)):
                     out_state[l] = None
         elif op == "load":
             pass
         elif op == "call":
-            # Invalidate all mappings
-            for l in all_memory_locations:
+            # Invalidate the mappings the callee may write or free
+            clobbered = alias.call_reach(instr, "writes") | alias.call_reach(
+                instr, "frees"
+            )
+            for l in iter_bits(clobbered):
                 out_state[l] = None
     return out_state
 
@@ -38,7 +46,7 @@ def store_forwarding_meet(preds):
         return {}
     result = preds[0].copy()
     for pred in preds[1:]:
-        for l in all_memory_locations:
+        for l in iter_bits(alias.all):
             v1 = result.get(l, None)
             v2 = pred.get(l, None)
             if v1 == v2:
@@ -58,13 +66,11 @@ def store_forwarding(fn):
         if op == "load":
             dest = instr["dest"]
             p = instr["args"][0]
-            pts_p = instr["alias"].get(p, all_memory_locations)
             store_map = instr["store_map"]
             # Check if p points to a unique memory location with a known value
-            if len(pts_p) == 1:
-                l = next(iter(pts_p))
+            l = alias.unique_location(p, instr)
+            if l is not None:
                 v = store_map.get(l, None)
-                # what if v gets changed after the store?
                 if v is not None:
                     new_instr = {
                         "dest": dest,
@@ -73,21 +79,25 @@ def store_forwarding(fn):
                         "value": v if isinstance(v, (int, float)) else None,
                         "args": [] if isinstance(v, (int, float)) else [v],
                     }
+                    alias.replace(instr, new_instr)
                     new_instrs.append(new_instr)
                     continue
         new_instrs.append(instr)
     fn["instrs"] = new_instrs
 
 
+def run_store_forwarding(fn, alias_info):
+    global alias
+    alias = alias_info
+    forward_df(fn, store_forwarding_f, store_forwarding_meet, initial_value={})
+    store_forwarding(fn)
+    for instr in fn["instrs"]:
+        instr.pop("store_map", None)
+
+
 if __name__ == "__main__":
     prog = json.load(sys.stdin)
+    summaries = get_summaries(prog)
     for fn in prog["functions"]:
-        all_memory_locations = alias_analysis(fn)
-
-        forward_df(fn, store_forwarding_f, store_forwarding_meet, initial_value={})
-        store_forwarding(fn)
-
-        for instr in fn["instrs"]:
-            if "alias" in instr:
-                del instr["alias"]
+        run_store_forwarding(fn, alias_analysis(fn, summaries))
     json.dump(prog, sys.stdout, indent=2)
@@ -2,107 +2,253 @@ import json
 import sys
 
 from utils.legacy.form_blocks import form_blocks
-from utils.legacy.dataflow import forward_df
 
-all_memory_locations = set()
-ext_memory_locations = {}
-
-
-def memory_locations_from_args(fn):
-    mem_locs = {}
-    for arg in fn.get("args", []):
-        if "ptr" in arg["type"]:
-            arg_name = arg["name"]
-            mem_locs[arg_name] = set([f"unknown_{fn['name']}_{arg_name}"])
-    return mem_locs
-
-
-def collect_memory_locations(fn):
-    blocks = form_blocks(fn)
-
-    memory_locations = set()
-    ext_mem_locs = memory_locations_from_args(fn)
-    for _, mem_locs in ext_mem_locs.items():
-        memory_locations.update(mem_locs)
-
-    for block in blocks:
-        for i, instr in enumerate(block["instrs"]):
-            if "op" in instr:
-                op = instr["op"]
+# how far outside a function the memory touched by an operation may lie:
+# nowhere (only memory the function allocates), memory passed in through
+# pointer arguments, or anywhere
+NONE, ARGS, ANY = 0, 1, 2
+
+
+def iter_bits(bits):
+    # yields the index of every set bit, lowest first
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+class Locations:
+    """Interns abstract memory locations to bit positions."""
+
+    def __init__(self):
+        self.names = []
+        self.name2id = {}
+
+    def intern(self, name):
+        if name not in self.name2id:
+            self.name2id[name] = len(self.names)
+            self.names.append(name)
+        return 1 << self.name2id[name]
+
+    def all(self):
+        return (1 << len(self.names)) - 1
+
+    def names_of(self, bits):
+        return {self.names[i] for i in iter_bits(bits)}
+
+
+class AliasInfo:
+    """
+    Flow-sensitive points-to sets for one function. A points-to set is an
+    int whose bits index `locations`; a pointer with no entry in a state may
+    point anywhere.
+    """
+
+    def __init__(self, fn, summaries=None):
+        self.locations = Locations()
+        self.blocks = form_blocks(fn)
+        self.summaries = summaries or {}
+        # memory reached through pointers loaded from memory or returned by
+        # unknown calls
+        self.unknown = self.locations.intern("unknown")
+        self.entry = self.memory_locations_from_args(fn)
+        self.args = 0
+        for bits in self.entry.values():
+            self.args |= bits
+        # alloc sites that run at most once per call of the function, the
+        # only locations that name one cell
+        self.allocs = 0
+        self.collect_memory_locations(fn)
+        self.all = self.locations.all()
+
+        self.ins, self.outs = self.solve()
+
+        # pointer args seen by each instruction, and a flow-insensitive
+        # summary of every pointer variable
+        self.before = {}
+        self.summary = dict(self.entry)
+        for block in self.blocks:
+            self.transfer(block, self.ins[block["id"]], record=True)
+
+    def memory_locations_from_args(self, fn):
+        # pointer arguments may alias each other, so they share one location
+        mem_locs = {}
+        for arg in fn.get("args", []):
+            if "ptr" in arg["type"]:
+                mem_locs[arg["name"]] = self.locations.intern(
+                    f"unknown_{fn['name']}_args"
+                )
+        return mem_locs
+
+    def site(self, kind, block, i):
+        return self.locations.intern(f"{kind}_{block['id']}_{i}")
+
+    def blocks_in_loops(self):
+        # blocks that can reach themselves, which may run more than once
+        in_loops = set()
+        for block in self.blocks:
+            seen = set()
+            worklist = list(block["successors"])
+            while worklist:
+                succ = worklist.pop()
+                if succ == block["id"]:
+                    in_loops.add(succ)
+                    break
+                if succ not in seen:
+                    seen.add(succ)
+                    worklist.extend(self.blocks[succ]["successors"])
+        return in_loops
+
+    def collect_memory_locations(self, fn):
+        # without a summary the function may be recursive
+        recursive = self.summaries.get(fn["name"], {}).get("recursive", True)
+        in_loops = self.blocks_in_loops()
+        for block in self.blocks:
+            for i, instr in enumerate(block["instrs"]):
+                op = instr.get("op")
                 if op == "alloc":
-                    alloc_site = f"alloc_{block['id']}_{i}"
-                    memory_locations.add(alloc_site)
+                    site = self.site("alloc", block, i)
+                    if not recursive and block["id"] not in in_loops:
+                        self.allocs |= site
                 elif op == "ptradd":
-                    unknown_loc = f"unknown_{block['id']}_{i}"
-                    memory_locations.add(unknown_loc)
-                elif op == "call" and "type" in instr and "ptr" in instr["type"]:
-                    new_location = f"unknown_{block['id']}_{i}"
-                    memory_locations.add(new_location)
-    return memory_locations
-
-
-def alias_meet(pred_outs):
-    if len(pred_outs) == 0:
-        return ext_memory_locations.copy()
-
-    result = pred_outs[0].copy()
-    for pred in pred_outs[1:]:
-        for var, locations in pred.items():
-            if var in result:
-                result[var] = result[var].union(locations)
-            else:
-                result[var] = locations.copy()
-    return result
-
-
-def alias_f(block, in_state):
-    out = in_state.copy()
-    for i, instr in enumerate(block["instrs"]):
-        instr["alias"] = out.copy()
-        if "dest" in instr:
+                    self.site("unknown", block, i)
+                elif op == "call" and "ptr" in instr.get("type", ""):
+                    self.site("unknown", block, i)
+
+    def meet(self, pred_outs):
+        if len(pred_outs) == 0:
+            return dict(self.entry)
+
+        result = dict(pred_outs[0])
+        for pred in pred_outs[1:]:
+            for var, bits in pred.items():
+                result[var] = result.get(var, 0) | bits
+        return result
+
+    def transfer(self, block, in_state, record=False):
+        out = dict(in_state)
+        for i, instr in enumerate(block["instrs"]):
+            if record:
+                self.before[id(instr)] = (
+                    instr,
+                    {arg: out[arg] for arg in instr.get("args", []) if arg in out},
+                )
+            if "dest" not in instr:
+                continue
             dest = instr["dest"]
             op = instr["op"]
             if op == "alloc":
-                alloc_site = f"alloc_{block['id']}_{i}"
-                out[dest] = {alloc_site}
+                out[dest] = self.site("alloc", block, i)
             elif op == "id" and "ptr" in instr["type"]:
-                src = instr["args"][0]
-                out[dest] = out.get(src, all_memory_locations).copy()
+                out[dest] = out.get(instr["args"][0], self.all)
             elif op == "ptradd":
-                base_ptr = instr["args"][0]
-                base_pts = out.get(base_ptr, all_memory_locations).copy()
-                # Since we don't know the offset, conservatively assume dest may point
-                # to base_ptr's locations and also to new locations.
-                new_location = f"unknown_{block['id']}_{i}"
-                out[dest] = base_pts.union({new_location})
+                # the offset is unknown, so dest may point to the base
+                # pointer's locations and also to a new location
+                base = out.get(instr["args"][0], self.all)
+                out[dest] = base | self.site("unknown", block, i)
             elif op == "call" and "ptr" in instr["type"]:
-                new_location = f"unknown_{block['id']}_{i}"
-                out[dest] = all_memory_locations.union({new_location})
+                site = self.site("unknown", block, i)
+                out[dest] = site | self.call_reach(instr, "returns", out)
             elif op == "load" and "ptr" in instr["type"]:
-                out[dest] = all_memory_locations.copy()
-    return out
-
-
-def dead_store_elimination(fn):
-    new_instrs = []
-    for instr in fn["instrs"]:
-        if "op" not in instr:
-            new_instrs.append(instr)
-            continue
-        if instr["op"] == "store":
-            p = instr["args"][0]
-            pts_p = instr["alias"].get(p, all_memory_locations)
-            live_mem = instr["live_mem"]
-            # If the intersection is empty, the store is dead
-            if pts_p.isdisjoint(live_mem):
-                # Eliminate the store
+                out[dest] = self.all
+            else:
                 continue
-        new_instrs.append(instr)
-    fn["instrs"] = new_instrs
-
-
-def alias_analysis(fn):
-    all_memory_locations = collect_memory_locations(fn)
-    ext_memory_locations = memory_locations_from_args(fn)
-    forward_df(fn, alias_f, alias_meet, initial_value={})
-    return all_memory_locations
+            if record:
+                self.summary[dest] = self.summary.get(dest, 0) | out[dest]
+        return out
+
+    def solve(self):
+        ins = [{} for _ in self.blocks]
+        outs = [{} for _ in self.blocks]
+        worklist = list(reversed(range(len(self.blocks))))
+        queued = set(worklist)
+        while worklist:
+            i = worklist.pop()
+            queued.discard(i)
+            block = self.blocks[i]
+            ins[i] = self.meet([outs[p] for p in block["predecessors"]])
+            out = self.transfer(block, ins[i])
+            if out != outs[i]:
+                outs[i] = out
+                for succ in block["successors"]:
+                    if succ not in queued:
+                        queued.add(succ)
+                        worklist.append(succ)
+        return ins, outs
+
+    def call_reach(self, instr, effect, state=None):
+        """
+        Locations a call may touch for `effect` ("reads", "writes", "frees"
+        or "returns"), according to the callee's mod/ref summary.
+        """
+        summary = self.summaries.get(instr["funcs"][0])
+        if summary is None or summary[effect] == ANY:
+            return self.all
+        if summary[effect] == NONE:
+            return 0
+        if state is None:
+            state = self.state_before(instr)
+        bits = 0
+        for i in summary["ptr_args"]:
+            bits |= state.get(instr["args"][i], self.all)
+        return bits
+
+    def classify(self, bits):
+        if bits & self.unknown:
+            return ANY
+        if bits & self.args:
+            return ARGS
+        return NONE
+
+    def state_before(self, instr):
+        # instructions are keyed by id, so check it is still the same object
+        recorded, state = self.before.get(id(instr), (None, {}))
+        return state if recorded is instr else {}
+
+    def replace(self, old, new):
+        # `new` computes the same value as `old`, so it keeps its facts
+        state = self.state_before(old)
+        self.before.pop(id(old), None)
+        self.before[id(new)] = (new, state)
+
+    def remove(self, instr):
+        if self.before.get(id(instr), (None,))[0] is instr:
+            del self.before[id(instr)]
+
+    def points_to(self, p, instr=None):
+        """
+        Locations `p` may point to right before `instr`, or anywhere in the
+        function if no instruction is given.
+        """
+        if instr is None:
+            return self.summary.get(p, self.all)
+        return self.state_before(instr).get(p, self.all)
+
+    def may_alias(self, p, q, instr=None):
+        return self.points_to(p, instr) & self.points_to(q, instr) != 0
+
+    def unique_location(self, p, instr=None):
+        """
+        The location `p` must point to, if it can only point to the one
+        cell named by an alloc site that runs at most once per call (outside
+        any loop, in a function that isn't recursive); None otherwise. An
+        alloc that runs repeatedly names many cells, so stores through it
+        are never strong updates.
+        """
+        bits = self.points_to(p, instr)
+        if bits & (bits - 1) == 0 and bits & self.allocs:
+            return bits.bit_length() - 1
+        return None
+
+
+def alias_analysis(fn, summaries=None):
+    return AliasInfo(fn, summaries)
+
+
+if __name__ == "__main__":
+    prog = json.load(sys.stdin)
+    for fn in prog["functions"]:
+        alias = alias_analysis(fn)
+        print(f"{fn['name']}:")
+        for var, bits in sorted(alias.summary.items()):
+            print(f"  {var}: {sorted(alias.locations.names_of(bits))}")
@@ -0,0 +1,51 @@
+import unittest
+from utils.alias import alias_analysis
+from utils.modref import get_summaries
+
+
+def function(name, instrs):
+    return {"name": name, "instrs": instrs}
+
+
+ALLOC_ONCE = [
+    {"op": "const", "dest": "one", "type": "int", "value": 1},
+    {"op": "alloc", "dest": "p", "type": {"ptr": "int"}, "args": ["one"]},
+    {"op": "store", "args": ["p", "one"]},
+]
+ALLOC_IN_LOOP = [
+    {"op": "const", "dest": "one", "type": "int", "value": 1},
+    {"label": "loop"},
+    {"op": "alloc", "dest": "p", "type": {"ptr": "int"}, "args": ["one"]},
+    {"op": "store", "args": ["p", "one"]},
+    {"op": "jmp", "labels": ["loop"]},
+]
+
+
+class TestUniqueLocation(unittest.TestCase):
+    def unique_location(self, prog):
+        main = prog["functions"][0]
+        alias = alias_analysis(main, get_summaries(prog))
+        store = next(instr for instr in main["instrs"] if instr.get("op") == "store")
+        return alias.unique_location("p", store)
+
+    def test_alloc_once(self):
+        prog = {"functions": [function("main", ALLOC_ONCE)]}
+        self.assertIsNotNone(self.unique_location(prog))
+
+    def test_alloc_in_loop(self):
+        prog = {"functions": [function("main", ALLOC_IN_LOOP)]}
+        self.assertIsNone(self.unique_location(prog))
+
+    def test_alloc_in_recursive_function(self):
+        instrs = ALLOC_ONCE + [{"op": "call", "funcs": ["main"]}]
+        prog = {"functions": [function("main", instrs)]}
+        self.assertIsNone(self.unique_location(prog))
+
+    def test_no_summaries(self):
+        main = function("main", ALLOC_ONCE)
+        alias = alias_analysis(main)
+        self.assertIsNone(alias.unique_location("p", main["instrs"][2]))
+
+
+if __name__ == "__main__":
+    unittest.main()
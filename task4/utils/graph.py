@@ -0,0 +1,90 @@
+from typing import Dict, List, Set, Tuple
+
+
+def form_call_graph(prog: Dict) -> Tuple[Dict, List[Tuple[str, str]]]:
+    nodes = {}
+    edges = []
+    for fn in prog["functions"]:
+        name = fn["name"]
+        nodes[name] = {
+            "name": name,
+            "edges": [],
+        }
+        for instr in fn["instrs"]:
+            if "op" in instr and instr["op"] == "call":
+                callee = instr["funcs"][0]
+                nodes[name]["edges"].append(callee)
+    # Deduplicate edges
+    for name, data in nodes.items():
+        data["edges"] = list(set(data["edges"]))
+        for e in data["edges"]:
+            edges.append((name, e))
+
+    edges = list(set(edges))
+    return nodes, edges
+
+
+def find_sccs(nodes: Dict) -> List[List[str]]:
+    # Tarjan's algorithm, with an explicit stack so that long call chains
+    # don't hit the recursion limit. SCCs come out callees first, so
+    # walking the list in order visits every function after the functions
+    # it calls.
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    sccs = []
+
+    for root in nodes:
+        if root in index:
+            continue
+        # each frame is a node and the iterator over its remaining callees
+        frames = []
+
+        def visit(node):
+            index[node] = lowlink[node] = len(index)
+            stack.append(node)
+            on_stack.add(node)
+            frames.append((node, iter(sorted(nodes[node]["edges"]))))
+
+        visit(root)
+        while frames:
+            node, neighbors = frames[-1]
+            for neighbor in neighbors:
+                if neighbor not in nodes:
+                    continue
+                if neighbor not in index:
+                    visit(neighbor)
+                    break
+                elif neighbor in on_stack:
+                    lowlink[node] = min(lowlink[node], index[neighbor])
+            else:
+                frames.pop()
+                if frames:
+                    parent = frames[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    scc = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.remove(member)
+                        scc.append(member)
+                        if member == node:
+                            break
+                    sccs.append(scc)
+
+    return sccs
+
+
+def find_recursive_functions(edges: List[tuple]) -> Set[str]:
+    """The functions on a cycle of calls, including self-recursive ones."""
+    nodes = {}
+    for src, dest in edges:
+        nodes.setdefault(src, {"edges": []})["edges"].append(dest)
+        nodes.setdefault(dest, {"edges": []})
+
+    recursive = set()
+    for scc in find_sccs(nodes):
+        if len(scc) > 1 or scc[0] in nodes[scc[0]]["edges"]:
+            recursive.update(scc)
+    return recursive
@@ -0,0 +1,53 @@
+import unittest
+from utils.graph import find_recursive_functions, find_sccs, form_call_graph
+from utils.modref import get_summaries
+
+
+def chain(n):
+    # main calls f0, f0 calls f1, ..., f<n-1> calls f<n>
+    functions = [{"name": "main", "instrs": [{"op": "call", "funcs": ["f0"]}]}]
+    for i in range(n):
+        functions.append(
+            {"name": f"f{i}", "instrs": [{"op": "call", "funcs": [f"f{i + 1}"]}]}
+        )
+    functions.append({"name": f"f{n}", "instrs": []})
+    return {"functions": functions}
+
+
+class TestFindSccs(unittest.TestCase):
+    def test_callees_come_first(self):
+        # A calls B, B calls C, C calls A and W
+        nodes = {
+            "A": {"edges": ["B"]},
+            "B": {"edges": ["C"]},
+            "C": {"edges": ["A", "W"]},
+            "W": {"edges": []},
+        }
+        sccs = find_sccs(nodes)
+        self.assertEqual([sorted(scc) for scc in sccs], [["W"], ["A", "B", "C"]])
+
+    def test_long_chain(self):
+        # deeper than the recursion limit
+        n = 5000
+        nodes, _ = form_call_graph(chain(n))
+        sccs = find_sccs(nodes)
+        self.assertEqual(sccs[0], [f"f{n}"])
+        self.assertEqual(sccs[-1], ["main"])
+        self.assertEqual(len(sccs), n + 2)
+
+
+class TestFindRecursiveFunctions(unittest.TestCase):
+    def test_whole_cycle_is_recursive(self):
+        edges = [("main", "A"), ("A", "B"), ("B", "A"), ("B", "C"), ("D", "D")]
+        self.assertEqual(find_recursive_functions(edges), {"A", "B", "D"})
+
+
+class TestSummaries(unittest.TestCase):
+    def test_long_chain(self):
+        prog = chain(1500)
+        summaries = get_summaries(prog)
+        self.assertEqual(len(summaries), 1502)
+
+
+if __name__ == "__main__":
+    unittest.main()
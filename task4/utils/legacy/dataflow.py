@@ -1,3 +1,5 @@
+from copy import copy
+
 from utils.legacy.form_blocks import form_blocks
 
 
@@ -23,7 +25,7 @@ def forward_df(fn, f, meet, initial_value={}, print_result=False):
         id = q.pop()
         block = blocks[id]
         ins[id] = meet([outs[p] for p in block["predecessors"]])
-        original_outs = outs[id].copy()
+        original_outs = copy(outs[id])
         outs[id] = f(block, ins[id])
         if outs[id] != original_outs:
             for succ in block["successors"]:
@@ -46,7 +48,7 @@ def backward_df(fn, f, meet, initial_value={}, print_result=False):
         id = q.pop()
         block = blocks[id]
         outs[id] = meet([ins[p] for p in block["successors"]])
-        original_ins = ins[id].copy()
+        original_ins = copy(ins[id])
         ins[id] = f(block, outs[id])
         if ins[id] != original_ins:
             for pred in block["predecessors"]:
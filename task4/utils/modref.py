@@ -0,0 +1,79 @@
+import json
+import sys
+
+from utils.alias import ANY, ARGS, NONE, AliasInfo
+from utils.graph import find_recursive_functions, find_sccs, form_call_graph
+
+EFFECTS = {"load": "reads", "store": "writes", "free": "frees"}
+
+
+def empty_summary(fn):
+    return {
+        "reads": NONE,
+        "writes": NONE,
+        "frees": NONE,
+        "returns": NONE,
+        "ptr_args": [
+            i for i, arg in enumerate(fn.get("args", [])) if "ptr" in arg["type"]
+        ],
+    }
+
+
+def summarize(fn, summaries):
+    """
+    Which memory a call to fn may read, write or free, and where a pointer
+    it returns may point. "returns" is NONE when the pointer can only point
+    to memory allocated during the call.
+    """
+    alias = AliasInfo(fn, summaries)
+    summary = empty_summary(fn)
+    for block in alias.blocks:
+        for instr in block["instrs"]:
+            op = instr.get("op")
+            if op in EFFECTS:
+                bits = alias.points_to(instr["args"][0], instr)
+                effect = EFFECTS[op]
+                summary[effect] = max(summary[effect], alias.classify(bits))
+            elif op == "call":
+                for effect in EFFECTS.values():
+                    bits = alias.call_reach(instr, effect)
+                    summary[effect] = max(summary[effect], alias.classify(bits))
+            elif op == "ret" and instr.get("args") and "ptr" in fn.get("type", ""):
+                bits = alias.points_to(instr["args"][0], instr)
+                summary["returns"] = max(summary["returns"], alias.classify(bits))
+    return summary
+
+
+def get_summaries(prog):
+    # bottom-up over the call graph; functions in a cycle are iterated
+    # together, starting from no effects, until their summaries are stable
+    fns = {fn["name"]: fn for fn in prog["functions"]}
+    nodes, edges = form_call_graph(prog)
+    recursive = find_recursive_functions(edges)
+    summaries = {}
+    for scc in find_sccs(nodes):
+        for name in scc:
+            summaries[name] = empty_summary(fns[name])
+            # a recursive function's allocs may run more than once a call
+            summaries[name]["recursive"] = name in recursive
+        changed = True
+        while changed:
+            changed = False
+            for name in scc:
+                summary = summarize(fns[name], summaries)
+                summary["recursive"] = name in recursive
+                if summary != summaries[name]:
+                    summaries[name] = summary
+                    changed = True
+    return summaries
+
+
+if __name__ == "__main__":
+    prog = json.load(sys.stdin)
+    names = {NONE: "none", ARGS: "args", ANY: "any"}
+    for name, summary in get_summaries(prog).items():
+        effects = ", ".join(
+            f"{effect}: {names[summary[effect]]}"
+            for effect in ["reads", "writes", "frees", "returns"]
+        )
+        print(f"{name}: {effects}")
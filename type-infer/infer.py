@@ -1,8 +1,9 @@
 """Type inference for Bril
 """
+import heapq
 import json
 import sys
-import copy
+from collections import defaultdict
 
 ARITHMETIC_OPS = ["add", "mul", "sub", "div"]
 COMPARISON_OPS = ["eq", "lt", "gt", "le", "ge"]
@@ -20,76 +21,86 @@ def type_var(gamma, var, expected_type, i):
     gamma[var] = expected_type
 
 
-# Runtime is O(n^2) where n is the number of instructions, because of
-# main {
-#   jmp l2;
-# l1:
-#   a = id b;
-#   b = id c;
-#   c = id d;
-#   ...
-#   y = id z;
-#   ret;
-# l2:
-#   z = const 0;
-# }
 def infer_types_func(func):
+    """Infer the type of every variable assigned in `func`.
+
+    Instructions are visited once, in order. An `id` whose argument has no
+    type yet waits for it and runs once the argument is typed, so the
+    whole inference is O(n log n) instead of re-scanning the function
+    until nothing changes.
+
+    Waiting `id`s run in the same order those re-scans would have run
+    them, so errors name the same statement: a type found at statement i
+    during scan k lets a waiting `id` at statement j run in scan k if
+    j > i, and in scan k + 1 otherwise.
+    """
     gamma = {}
-    typed_func = copy.deepcopy(func)
-    # Keep track of whether or not any type was inferred.
-    # If so, then we need to try type checking again, because for `id` ops,
-    # e.g. "x = id y", we need to know the type of `y` first, which may not
-    # happen until later in the program because we're going sequentially
-    # through the instructions
-    old_gamma_size = -1
-    while len(gamma) != old_gamma_size:
-        old_gamma_size = len(gamma)
-        for i, instr in enumerate(typed_func["instrs"]):
-            # Continue if we have a label
-            if "op" not in instr:
-                continue
-
-            # Handle constants
-            if instr["op"] == "const":
-                if instr["value"] is True or instr["value"] is False:
-                    type_var(gamma, instr["dest"], "bool", i)
-                else:
-                    type_var(gamma, instr["dest"], "int", i)
-
-            # Handle effect operations
-            if instr["op"] == "ret" or instr["op"] == "jmp":
-                continue
-
-            # Handle value operations
-            elif instr["op"] in ARITHMETIC_OPS:
-                for arg in instr["args"]:
-                    type_var(gamma, arg, "int", i)
-                type_var(gamma, instr["dest"], "int", i)
-
-            elif instr["op"] in COMPARISON_OPS:
-                for arg in instr["args"]:
-                    type_var(gamma, arg, "int", i)
-                type_var(gamma, instr["dest"], "bool", i)
-
-            elif instr["op"] in LOGIC_OPS:
-                for arg in instr["args"]:
-                    type_var(gamma, arg, "bool", i)
-                type_var(gamma, instr["dest"], "bool", i)
-
-            elif instr["op"] == "br":
-                type_var(gamma, instr["args"][0], "bool", i)
-
-            # Handle misc. operations
-            elif instr["op"] == "print" or instr["op"] == "nop":
-                continue
-            elif instr["op"] == "id" and instr["args"][0] in gamma:
-                type_var(gamma, instr["dest"], gamma[instr["args"][0]], i)
-
-            # Set the type for this instruction to be whatever we've inferred
-            if "dest" in instr and instr["dest"] in gamma:
-                typed_func["instrs"][i]["type"] = gamma[instr["dest"]]
-        # end for over instructions
-    # end while
+    waiting = defaultdict(list)  # var -> statements of `id`s waiting on it
+    ready = []  # heap of (scan, statement) of `id`s whose argument is typed
+    instrs = func["instrs"]
+
+    def assign(var, expected_type, scan, i):
+        is_new = var not in gamma
+        type_var(gamma, var, expected_type, i)
+        if is_new:
+            for j in waiting.pop(var, []):
+                heapq.heappush(ready, (scan if j > i else scan + 1, j))
+
+    for i, instr in enumerate(instrs):
+        # Continue if we have a label
+        if "op" not in instr:
+            continue
+
+        # Handle constants
+        if instr["op"] == "const":
+            if instr["value"] is True or instr["value"] is False:
+                assign(instr["dest"], "bool", 1, i)
+            else:
+                assign(instr["dest"], "int", 1, i)
+
+        # Handle value operations
+        elif instr["op"] in ARITHMETIC_OPS:
+            for arg in instr["args"]:
+                assign(arg, "int", 1, i)
+            assign(instr["dest"], "int", 1, i)
+
+        elif instr["op"] in COMPARISON_OPS:
+            for arg in instr["args"]:
+                assign(arg, "int", 1, i)
+            assign(instr["dest"], "bool", 1, i)
+
+        elif instr["op"] in LOGIC_OPS:
+            for arg in instr["args"]:
+                assign(arg, "bool", 1, i)
+            assign(instr["dest"], "bool", 1, i)
+
+        elif instr["op"] == "br":
+            assign(instr["args"][0], "bool", 1, i)
+
+        # Handle misc. operations
+        elif instr["op"] == "id":
+            if instr["args"][0] in gamma:
+                assign(instr["dest"], gamma[instr["args"][0]], 1, i)
+            else:
+                waiting[instr["args"][0]].append(i)
+
+    while ready:
+        scan, i = heapq.heappop(ready)
+        instr = instrs[i]
+        assign(instr["dest"], gamma[instr["args"][0]], scan, i)
+
+    # Set the type for each instruction to be whatever we've inferred
+    typed_func = dict(func)
+    typed_func["instrs"] = []
+    for instr in instrs:
+        typed_instr = dict(instr)
+        if (
+            "dest" in instr
+            and instr["dest"] in gamma
+            and instr["op"] not in ("ret", "jmp", "print", "nop")
+        ):
+            typed_instr["type"] = gamma[instr["dest"]]
+        typed_func["instrs"].append(typed_instr)
     return typed_func
 
 def infer_types(bril):